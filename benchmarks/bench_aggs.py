@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pandagg.tree.aggs import Aggs
+
+from benchmarks.generators import deep_aggs, scale
+
+
+class AggsBuilding:
+    def setup(self):
+        self.depth = scale()["aggs_depth"]
+        self.clause = deep_aggs(self.depth)
+        self.aggs = Aggs(self.clause)
+
+    def time_deserialize_deep(self):
+        Aggs(self.clause)
+
+    def time_groupby(self):
+        Aggs().groupby(
+            [
+                {"level_%d" % i: {"terms": {"field": "field_%d" % i}}}
+                for i in range(self.depth)
+            ]
+        )
+
+    def time_chained_groupby(self):
+        aggs = Aggs()
+        for i in range(self.depth):
+            aggs = aggs.groupby({"level_%d" % i: {"terms": {"field": "field_%d" % i}}})
+
+    def time_to_dict_after_update(self):
+        self.aggs.aggs(
+            {"max_metric": {"max": {"field": "metric"}}}, insert_below="level_0"
+        ).to_dict()
+
+    def time_parse_plan(self):
+        Aggs(self.clause).parse_plan()
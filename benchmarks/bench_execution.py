@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Client-side overhead of execution paths, against an in-process cluster without latency."""
+
+from pandagg.search import MultiSearch, Search
+from pandagg.testing import InMemoryCluster
+from tests.testing_samples.mapping_example import MAPPING
+
+from benchmarks.generators import scale
+
+NB_DOCUMENTS = 2000
+
+
+class Execution:
+    def setup(self):
+        cluster = InMemoryCluster(aggs_cardinality=scale()["response_buckets"] // 100)
+        cluster.create_index("classifications", mapping=MAPPING)
+        cluster.index_documents(
+            "classifications",
+            [
+                {
+                    "classification_type": ["multiclass", "multilabel"][i % 2],
+                    "language": ["en", "fr", "de"][i % 3],
+                    "global_metrics": {"dataset": {"nb_classes": i % 50}},
+                }
+                for i in range(NB_DOCUMENTS)
+            ],
+        )
+        self.search = Search(
+            using=cluster.client(), index="classifications", mapping=MAPPING
+        )
+
+    def time_execute_hits(self):
+        response = self.search.filter("term", language="fr").size(100).execute()
+        response.hits.to_dataframe()
+
+    def time_execute_aggs(self):
+        response = (
+            self.search.size(0).groupby(["classification_type", "language"]).execute()
+        )
+        response.aggregations.serialize_as_tabular()
+
+    def time_count(self):
+        self.search.filter(
+            "range", global_metrics__dataset__nb_classes={"gte": 10}
+        ).count()
+
+    def time_scan(self):
+        for _ in self.search.params(size=500).scan():
+            pass
+
+    def time_multisearch(self):
+        ms = MultiSearch(using=self.search._using)
+        for language in ("en", "fr", "de"):
+            ms = ms.add(self.search.filter("term", language=language).size(10))
+        ms.execute()
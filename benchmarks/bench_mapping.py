@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pandagg.search import Search
+from pandagg.tree.mapping import Mapping, MappingRegistry
+
+from benchmarks.generators import large_mapping, scale
+
+
+class MappingParsing:
+    def setup(self):
+        self.raw_mapping = large_mapping(scale()["mapping_fields"])
+        self.mapping = Mapping(self.raw_mapping)
+        self.paths = [
+            self.mapping.node_path(nid)
+            for nid in self.mapping.expand_tree()
+            if nid != self.mapping.root
+        ]
+
+    def time_parse(self):
+        Mapping(self.raw_mapping)
+
+    def time_resolve_paths(self):
+        for path in self.paths:
+            self.mapping.list_nesteds_at_field(path)
+
+    def time_registry_get(self):
+        # parsed once, then shared
+        registry = MappingRegistry()
+        for _ in range(10):
+            registry.get(self.raw_mapping, index="my_index")
+
+    def time_search_with_mapping(self):
+        Search(index="my_index", mapping=self.raw_mapping).filter(
+            "term", object_0__classification_type="multiclass"
+        ).to_dict()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from benchmarks.node_memory import NODE_FACTORIES, memory_per_node
+
+
+class NodeMemory:
+    unit = "bytes"
+
+    def _track(self, name):
+        return memory_per_node(dict(NODE_FACTORIES)[name], size=20000)
+
+    def track_bucket(self):
+        return self._track("Bucket")
+
+    def track_agg_node(self):
+        return self._track("Terms (AggNode)")
+
+    def track_query_clause(self):
+        return self._track("Term (QueryClause)")
+
+    def track_field(self):
+        return self._track("Keyword (Field)")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pandagg.search import Search
+from pandagg.tree.query import Query
+
+from benchmarks.generators import deep_aggs, scale, wide_bool_query
+
+
+class QueryBuilding:
+    def setup(self):
+        self.width = scale()["query_width"]
+        self.clause = wide_bool_query(self.width)
+        self.query = Query(self.clause)
+
+    def time_deserialize_wide_bool(self):
+        Query(self.clause)
+
+    def time_chained_filters(self):
+        # each step inserts a clause in existing bool query (`Query._insert_into`)
+        q = Query()
+        for i in range(self.width):
+            q = q.filter("term", **{"field_%d" % i: i})
+
+    def time_to_dict_after_update(self):
+        self.query.filter("term", user="kimchy").to_dict()
+
+    def time_normalized(self):
+        Query(self.clause).normalized()
+
+
+class SearchSerialization:
+    def setup(self):
+        s = scale()
+        self.search = (
+            Search(index="my_index")
+            .query(wide_bool_query(s["query_width"]))
+            .aggs(deep_aggs(s["aggs_depth"]))
+        )
+
+    def time_to_dict(self):
+        self.search.to_dict()
+
+    def time_to_dict_after_filter(self):
+        self.search.filter("term", user="kimchy").to_dict()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+
+from pandagg.response import Aggregations
+from pandagg.synthetic import AggsResponseGenerator
+from pandagg.tree.aggs import Aggs
+from tests.testing_samples.mapping_example import MAPPING
+
+from benchmarks.generators import large_agg_response, scale
+
+
+class ResponseParsing:
+    def setup(self):
+        aggs_clause, self.data = large_agg_response(scale()["response_buckets"])
+        self.aggs = Aggs(aggs_clause, mapping=MAPPING)
+
+    def _aggregations(self):
+        return Aggregations(
+            data=self.data, aggs=self.aggs, query=None, index=None, client=None
+        )
+
+    def time_serialize_as_dataframe(self):
+        self._aggregations().serialize_as_dataframe()
+
+    def time_serialize_as_tabular(self):
+        self._aggregations().serialize_as_tabular()
+
+    def time_serialize_as_normalized(self):
+        self._aggregations().serialize_as_normalized()
+
+    def time_serialize_as_tree(self):
+        self._aggregations().serialize_as_tree()
+
+    def time_serialize_as_columnar_tree(self):
+        self._aggregations().serialize_as_tree(columnar=True)
+
+
+class GeneratedResponseParsing:
+    """Parsing of a generated response of three terms levels, read from disk."""
+
+    def setup(self):
+        self.aggs = Aggs(mapping=MAPPING).groupby(
+            ["classification_type", "global_metrics.field.name", "language"]
+        )
+        # approximately `response_buckets` buckets over the three levels
+        cardinality = max(int(scale()["response_buckets"] ** (1 / 3.0)), 1)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "response.json")
+        AggsResponseGenerator(self.aggs, cardinality=cardinality, seed=0).write(
+            self.path
+        )
+
+    def teardown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def time_parse_as_tabular(self):
+        with open(self.path) as f:
+            data = json.load(f)["aggregations"]
+        Aggregations(
+            data=data, aggs=self.aggs, query=None, index=None, client=None
+        ).serialize_as_tabular()
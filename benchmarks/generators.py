@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Synthetic inputs of benchmarks. Sizes depend on the ``PANDAGG_BENCHMARK_SCALE`` environment variable: "small"
+(default, quick enough to run on each change) or "full" (4k fields mappings, 1M buckets responses).
+"""
+
+import os
+
+from tests.testing_samples.data_sample import EXPECTED_AGG_QUERY
+from tests.testing_samples.mapping_example import MAPPING
+
+SCALES = {
+    "small": {
+        "aggs_depth": 20,
+        "query_width": 200,
+        "mapping_fields": 1000,
+        "response_buckets": 20000,
+    },
+    "full": {
+        "aggs_depth": 50,
+        "query_width": 1000,
+        "mapping_fields": 4000,
+        "response_buckets": 1000000,
+    },
+}
+
+
+def scale():
+    name = os.environ.get("PANDAGG_BENCHMARK_SCALE", "small")
+    if name not in SCALES:
+        raise ValueError(
+            "Unknown benchmark scale <%s>, must be one of %s" % (name, sorted(SCALES))
+        )
+    return SCALES[name]
+
+
+def deep_aggs(depth):
+    """Return aggregations clause of `depth` nested terms aggregations, each having an average metric."""
+    aggs = {"avg_%d" % depth: {"avg": {"field": "metric_%d" % depth}}}
+    for level in range(depth - 1, -1, -1):
+        aggs = {
+            "level_%d" % level: {
+                "terms": {"field": "field_%d" % level},
+                "aggs": dict(
+                    aggs, **{"avg_%d" % level: {"avg": {"field": "metric_%d" % level}}}
+                ),
+            }
+        }
+    return aggs
+
+
+def wide_bool_query(width):
+    """Return bool query clause with `width` filter, should and must_not clauses."""
+    return {
+        "bool": {
+            "filter": [
+                {"term": {"field_%d" % i: {"value": "value_%d" % i}}}
+                for i in range(width)
+            ],
+            "should": [
+                {"range": {"metric_%d" % i: {"gte": i}}} for i in range(width)
+            ],
+            "must_not": [{"exists": {"field": "missing_%d" % i}} for i in range(width)],
+            "minimum_should_match": 1,
+        }
+    }
+
+
+def large_mapping(nb_fields):
+    """Return mapping of approximately `nb_fields` fields, built by replicating sample mapping of
+    `tests.testing_samples` under objects and nested fields."""
+    sample_properties = MAPPING["properties"]
+    properties = {}
+    nb_sample_fields = _count_fields(sample_properties)
+    for i in range(max(nb_fields // (nb_sample_fields + 1), 1)):
+        properties["object_%d" % i] = {
+            "type": "nested" if i % 4 == 0 else "object",
+            "properties": sample_properties,
+        }
+    return {"dynamic": False, "properties": properties}
+
+
+def _count_fields(properties):
+    return sum(
+        1 + _count_fields(field.get("properties", {})) + len(field.get("fields", {}))
+        for field in properties.values()
+    )
+
+
+def large_agg_response(nb_buckets):
+    """Return aggregations clause of `tests.testing_samples` (two terms levels with two average metrics each) and
+    a matching response of approximately `nb_buckets` buckets (metrics included)."""
+    # each second-level bucket holds two metrics buckets
+    nb_first_level = max(int((nb_buckets / 3.0) ** 0.5), 1)
+    nb_second_level = max(nb_buckets // (3 * nb_first_level), 1)
+    response = {
+        "classification_type": {
+            "buckets": [
+                {
+                    "key": "type_%d" % i,
+                    "doc_count": nb_second_level * 10,
+                    "global_metrics.field.name": {
+                        "buckets": [
+                            {
+                                "key": "field_%d" % j,
+                                "doc_count": 10,
+                                "avg_f1_micro": {"value": (i + j) % 100 / 100.0},
+                                "avg_nb_classes": {"value": float(i + j)},
+                            }
+                            for j in range(nb_second_level)
+                        ]
+                    },
+                }
+                for i in range(nb_first_level)
+            ]
+        }
+    }
+    return EXPECTED_AGG_QUERY, response
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure memory allocated per node instance, for each kind of node::
+
+    python benchmarks/node_memory.py
+
+Nodes all keep an instance ``__dict__``, lighttree's base ``Node`` declaring no ``__slots__``: slotted nodes (as
+``Bucket``) only leave it empty.
+"""
+
+from __future__ import print_function
+
+import gc
+import tracemalloc
+
+from pandagg.node.aggs.bucket import Terms
+from pandagg.node.mapping.field_datatypes import Keyword
+from pandagg.node.query.term_level import Term
+from pandagg.node.response.bucket import Bucket
+
+NODE_FACTORIES = [
+    ("Bucket", lambda i: Bucket(value=i, key="key_%d" % i, level="terms_agg")),
+    ("Terms (AggNode)", lambda i: Terms("terms_agg", field="field")),
+    ("Term (QueryClause)", lambda i: Term(user="value")),
+    ("Keyword (Field)", lambda i: Keyword("field")),
+]
+
+
+def memory_per_node(factory, size=100000):
+    """Return average number of bytes allocated per node, node attributes included."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        nodes = [factory(i) for i in range(size)]
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del nodes
+    # exclude pointer of list holding nodes
+    return (current - baseline) / float(size) - 8
+
+
+def main():
+    for name, factory in NODE_FACTORIES:
+        print("%-20s %8.1f bytes/node" % (name, memory_per_node(factory)))
+
+
+if __name__ == "__main__":
+    main()
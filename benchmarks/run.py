@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Offline benchmarks runner, not requiring asv nor any cluster::
+
+    python -m benchmarks.run                    # run all benchmarks, compare to tracked baselines
+    python -m benchmarks.run -k response        # only benchmarks whose name contains "response"
+    python -m benchmarks.run --save             # update tracked baselines with current results
+
+Benchmarks follow asv conventions, so that they can also be run with asv (see ``asv.conf.json``): classes of
+`bench_*` modules, with optional `setup` and `teardown` methods, whose `time_*` methods are timed and `track_*`
+methods return the tracked value.
+
+Exits with status 1 if a benchmark result exceeds its baseline by more than given threshold.
+"""
+
+from __future__ import print_function
+
+import argparse
+import importlib
+import inspect
+import json
+import os
+import pkgutil
+import sys
+import timeit
+
+import benchmarks
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+def iter_benchmarks(pattern=None):
+    """Yield (name, kind, class, method name) of benchmarks, name being <module>.<class>.<method>."""
+    for module_info in pkgutil.iter_modules(benchmarks.__path__):
+        module_name = module_info[1]
+        if not module_name.startswith("bench_"):
+            continue
+        module = importlib.import_module("benchmarks.%s" % module_name)
+        for class_name, class_ in inspect.getmembers(module, inspect.isclass):
+            if class_.__module__ != module.__name__:
+                continue
+            for method_name in sorted(dir(class_)):
+                kind = method_name.split("_", 1)[0]
+                if kind not in ("time", "track"):
+                    continue
+                name = "%s.%s.%s" % (module_name, class_name, method_name)
+                if pattern is None or pattern in name:
+                    yield name, kind, class_, method_name
+
+
+def run_benchmark(kind, class_, method_name, repeat):
+    """Return best time in seconds of `repeat` runs for time benchmarks, tracked value for track benchmarks."""
+    instance = class_()
+    if hasattr(instance, "setup"):
+        instance.setup()
+    method = getattr(instance, method_name)
+    try:
+        if kind == "track":
+            return method()
+        return min(timeit.repeat(method, number=1, repeat=repeat))
+    finally:
+        if hasattr(instance, "teardown"):
+            instance.teardown()
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, path=BASELINES_PATH):
+    baselines = load_baselines(path)
+    baselines.update(results)
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run pandagg benchmarks offline.")
+    parser.add_argument("-k", dest="pattern", help="only run matching benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=2.0,
+        help="ratio to baseline above which a result is reported as a regression",
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="save results as tracked baselines"
+    )
+    args = parser.parse_args(argv)
+
+    scale = os.environ.get("PANDAGG_BENCHMARK_SCALE", "small")
+    baselines = load_baselines().get(scale, {})
+    results = {}
+    regressions = []
+    for name, kind, class_, method_name in iter_benchmarks(args.pattern):
+        result = run_benchmark(kind, class_, method_name, args.repeat)
+        results[name] = result
+        baseline = baselines.get(name)
+        ratio = result / baseline if baseline else None
+        status = ""
+        if ratio is not None and ratio > args.threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        print(
+            "%-65s %12.4g %12s %6s %s"
+            % (
+                name,
+                result,
+                "%.4g" % baseline if baseline else "-",
+                "%.2f" % ratio if ratio is not None else "-",
+                status,
+            )
+        )
+
+    if args.save:
+        save_baselines(
+            {
+                scale: dict(
+                    baselines, **{k: float("%.4g" % v) for k, v in results.items()}
+                )
+            }
+        )
+    if regressions:
+        print(
+            "\n%d regression(s) above x%s threshold."
+            % (len(regressions), args.threshold)
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
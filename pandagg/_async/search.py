@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# asyncio syntax is kept apart from pandagg.search so that the rest of the package can still be imported on python
+# versions not supporting it
+
+import asyncio
+
+from pandagg.connections import get_async_connection
+from pandagg.response import Response
+from pandagg.tracing import ExecutionTrace, hooks, instrument_client, tracing
+
+
+class AsyncSearchMixin(object):
+    """Asynchronous counterparts of ``Search`` execution methods, relying on an ``AsyncElasticsearch`` client."""
+
+    async def count_async(self):
+        """
+        Return the number of hits matching the query and filters. Note that
+        only the actual number is returned.
+        """
+        es = instrument_client(get_async_connection(self._using))
+        trace = ExecutionTrace(operation="count", index=self._index)
+        with tracing(trace):
+            with trace.phase("to_dict"):
+                d = self.to_dict(count=True)
+            trace.body = d
+            with trace.phase("transport"):
+                count = (await es.count(index=self._index, body=d))["count"]
+        trace.counts["hits"] = count
+        hooks.emit("execute", trace)
+        return count
+
+    async def execute_async(self):
+        """
+        Execute the search and return an instance of ``Response`` wrapping all
+        the data.
+
+        Durations of execution phases are recorded on ``Response.trace`` and
+        passed to ``pandagg.tracing.hooks``.
+        """
+        es = instrument_client(get_async_connection(self._using))
+        trace = ExecutionTrace(operation="search", index=self._index)
+        with tracing(trace):
+            with trace.phase("to_dict"):
+                body = self.to_dict()
+            trace.body = body
+            with trace.phase("transport"):
+                data = await es.search(index=self._index, body=body)
+            with trace.phase("response"):
+                response = Response(data, search=self, trace=trace)
+        trace.counts["hits"] = len(response.hits)
+        hooks.emit("execute", trace)
+        return response
+
+    async def scan_async(self):
+        """
+        Turn the search into a scan search and return an asynchronous generator
+        that will iterate over all the documents matching the query::
+
+            async for hit in s.scan_async():
+                ...
+
+        Relies on the ``async_scan`` helper from ``elasticsearch-py`` -
+        https://elasticsearch-py.readthedocs.io/en/master/async.html#async-helpers
+        """
+        from elasticsearch.helpers import async_scan
+
+        es = get_async_connection(self._using)
+
+        async for hit in async_scan(es, query=self.to_dict(), index=self._index):
+            yield hit
+
+
+class AsyncMultiSearchMixin(object):
+    """Asynchronous counterparts of ``MultiSearch`` execution methods."""
+
+    async def execute_async(
+        self, batch_size=None, max_concurrent=None, raise_on_error=True
+    ):
+        """
+        Execute the multi search request and return a list of ``Response``
+        objects, one per search, in the same order as searches were added.
+
+        :arg batch_size: maximum number of searches per ``msearch`` request, by
+            default all searches are sent in a single request
+        :arg max_concurrent: maximum number of ``msearch`` requests running
+            concurrently, by default all batches run concurrently
+        :arg raise_on_error: if False, failed searches results are None
+            instead of raising a ``TransportError``
+        """
+        es = instrument_client(get_async_connection(self._using))
+        trace = ExecutionTrace(operation="msearch", index=self._index)
+        with tracing(trace):
+            with trace.phase("to_dict"):
+                bodies = [self._to_dict(batch) for batch in self._batches(batch_size)]
+            trace.body = [line for body in bodies for line in body]
+            semaphore = asyncio.Semaphore(max_concurrent or max(len(bodies), 1))
+            concurrent = len(bodies) > 1
+
+            async def msearch(body):
+                # phases of concurrent requests can't be nested in trace: their encoding and decoding are counted
+                # in transport phase
+                with tracing(None if concurrent else trace):
+                    async with semaphore:
+                        response = await es.msearch(
+                            index=self._index, body=body, **self._params
+                        )
+                return response["responses"]
+
+            with trace.phase("transport"):
+                batches_results = await asyncio.gather(*(msearch(b) for b in bodies))
+            with trace.phase("response"):
+                responses = self._responses(
+                    batches_results, raise_on_error=raise_on_error
+                )
+        trace.counts["hits"] = sum(len(r.hits) for r in responses if r is not None)
+        hooks.emit("execute", trace)
+        return responses
+        return self._responses(batches_results, raise_on_error=raise_on_error)
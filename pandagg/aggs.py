@@ -12,6 +12,7 @@ from pandagg.node.aggs.bucket import (
     ReverseNested,
     Range,
     Missing,
+    Composite,
 )
 
 from pandagg.node.aggs.metric import (
@@ -58,6 +59,7 @@ __all__ = [
     "Global",
     "Filter",
     "Missing",
+    "Composite",
     "Nested",
     "ReverseNested",
     "Avg",
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Client-side caches of elasticsearch responses, to be attached to a ``Search`` using ``Search.cache``::
+
+    cache = MemoryCache(max_entries=256, ttl=60)
+    s = Search(index="my_index").cache(cache)
+    s.execute()  # hits cluster
+    s.execute()  # served from cache
+    cache.invalidate(index="my_index")
+"""
+
+import fnmatch
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from future.utils import string_types
+
+from pandagg.utils import canonical_dumps, fingerprint, freeze, FrozenDict, FrozenList
+
+
+def client_identity(client):
+    """Return identity of the cluster targeted by an elasticsearch client: its sorted hosts, so that identical
+    requests sent to different clusters don't share cache entries. Hosts being stable across processes, on-disk
+    entries remain shared by processes targeting the same cluster.
+    """
+    hosts = getattr(getattr(client, "transport", None), "hosts", None)
+    if not isinstance(hosts, (list, tuple)):
+        # client without known hosts, only identified in current process
+        return "%s@%x" % (type(client).__name__, id(client))
+    return sorted(canonical_dumps(host) for host in hosts)
+
+
+def cache_key(operation, index, body, params=None, client=None):
+    """Return canonical hash of a request.
+
+    :param operation: kind of request ("search", "count")
+    :param index: index, or list of indices, targeted by request
+    :param body: request body
+    :param params: request query parameters
+    :param client: identity of targeted cluster, see ``client_identity``
+    """
+    if isinstance(index, string_types):
+        index = [index]
+    return fingerprint(
+        [operation, sorted(index) if index else None, body, params or {}, client]
+    )
+
+
+def _matches_index(entry_indices, index):
+    """Whether an entry requested on `entry_indices` (None meaning all indices) involves `index`. Both can be
+    patterns."""
+    if not entry_indices:
+        return True
+    for entry_index in entry_indices:
+        if fnmatch.fnmatch(index, entry_index) or fnmatch.fnmatch(entry_index, index):
+            return True
+    return False
+
+
+class BaseCache(object):
+    """Cache of responses, keyed by ``cache_key``, each entry being tagged with the indices it was requested on
+    so that it can be invalidated when those are updated.
+    """
+
+    def __init__(self, ttl=None):
+        """
+        :param ttl: entries time to live in seconds, no expiration if None
+        """
+        self.ttl = ttl
+
+    def _is_expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key):
+        """Return cached value, or None if absent or expired."""
+        raise NotImplementedError()
+
+    def set(self, key, value, index=None):
+        """Store JSON-serializable value.
+
+        :param index: index, or list of indices, the value was requested on
+        """
+        raise NotImplementedError()
+
+    def invalidate(self, index=None):
+        """Drop entries involving given index (pattern), or all entries if index is None."""
+        raise NotImplementedError()
+
+    def clear(self):
+        self.invalidate()
+
+
+class MemoryCache(BaseCache):
+    """In-memory LRU cache, with optional expiration and size-based eviction. Values are stored as read-only
+    copies (see ``pandagg.utils.FrozenDict``), and returned as shallow copies whose nested structures are shared
+    with the entry: neither callers modifying returned values nor values modified after being stored alter cached
+    entries."""
+
+    def __init__(self, max_entries=1024, ttl=None, max_size=None):
+        """
+        :param max_entries: maximum number of entries, least recently used ones being evicted first
+        :param ttl: entries time to live in seconds, no expiration if None
+        :param max_size: maximum cumulated size, in bytes of serialized JSON, of stored values
+        """
+        super(MemoryCache, self).__init__(ttl=ttl)
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        # key -> (read-only value, indices, created_at, size)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, _, created_at, _ = entry
+            if self._is_expired(created_at):
+                self._pop(key)
+                return None
+            # mark as most recently used
+            self._entries[key] = self._entries.pop(key)
+        if isinstance(value, (FrozenDict, FrozenList)):
+            return value.copy()
+        return value
+
+    def set(self, key, value, index=None):
+        size = 0
+        if self.max_size is not None:
+            size = len(json.dumps(value, default=str))
+        if self.max_size is not None and size > self.max_size:
+            # would evict all other entries
+            return
+        if isinstance(index, string_types):
+            index = [index]
+        value = freeze(value)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, index, time.time(), size)
+            self.size += size
+            while len(self._entries) > self.max_entries or (
+                self.max_size is not None and self.size > self.max_size
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        _, _, _, size = self._entries.pop(key)
+        self.size -= size
+
+    def invalidate(self, index=None):
+        with self._lock:
+            if index is None:
+                self._entries.clear()
+                self.size = 0
+                return
+            for key in [
+                k
+                for k, (_, indices, _, _) in self._entries.items()
+                if _matches_index(indices, index)
+            ]:
+                self._pop(key)
+
+
+class DiskCache(BaseCache):
+    """On-disk cache, storing each entry in a JSON file of given directory, so that it can be shared between
+    processes."""
+
+    def __init__(self, directory, ttl=None):
+        super(DiskCache, self).__init__(ttl=ttl)
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, "%s.json" % key)
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def get(self, key):
+        entry = self._read(self._path(key))
+        if entry is None:
+            return None
+        if self._is_expired(entry["created_at"]):
+            self._remove(self._path(key))
+            return None
+        return entry["value"]
+
+    def set(self, key, value, index=None):
+        if isinstance(index, string_types):
+            index = [index]
+        path = self._path(key)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"value": value, "index": index, "created_at": time.time()},
+                f,
+                default=str,
+            )
+        # atomic on posix, so that concurrent readers never read partial files
+        os.rename(tmp_path, path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def invalidate(self, index=None):
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, filename)
+            if index is not None:
+                entry = self._read(path)
+                if entry is not None and not _matches_index(entry["index"], index):
+                    continue
+            self._remove(path)
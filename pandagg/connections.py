@@ -3,6 +3,12 @@ from six import string_types
 
 from elasticsearch import Elasticsearch
 
+try:
+    # asyncio client is only available on python 3.6+, with elasticsearch>=7.8 and aiohttp installed
+    from elasticsearch import AsyncElasticsearch
+except ImportError:
+    AsyncElasticsearch = None
+
 
 class Connections(object):
     """
@@ -10,9 +16,10 @@ class Connections(object):
     singleton in this module.
     """
 
-    def __init__(self):
+    def __init__(self, elasticsearch_class=Elasticsearch):
         self._kwargs = {}
         self._conns = {}
+        self._elasticsearch_class = elasticsearch_class
 
     def configure(self, **kwargs):
         """
@@ -60,10 +67,16 @@ class Connections(object):
 
     def create_connection(self, alias="default", **kwargs):
         """
-        Construct an instance of ``elasticsearch.Elasticsearch`` and register
-        it under given alias.
+        Construct an instance of ``elasticsearch.Elasticsearch`` (or of the
+        client class this registry was built with) and register it under given
+        alias.
         """
-        conn = self._conns[alias] = Elasticsearch(**kwargs)
+        if self._elasticsearch_class is None:
+            raise ImportError(
+                "Using async connections requires elasticsearch>=7.8.0 with async support. Please install "
+                '"elasticsearch[async]".'
+            )
+        conn = self._conns[alias] = self._elasticsearch_class(**kwargs)
         return conn
 
     def get_connection(self, alias="default"):
@@ -100,3 +113,10 @@ add_connection = connections.add_connection
 remove_connection = connections.remove_connection
 create_connection = connections.create_connection
 get_connection = connections.get_connection
+
+async_connections = Connections(elasticsearch_class=AsyncElasticsearch)
+configure_async = async_connections.configure
+add_async_connection = async_connections.add_connection
+remove_async_connection = async_connections.remove_connection
+create_async_connection = async_connections.create_connection
+get_async_connection = async_connections.get_connection
@@ -2,45 +2,111 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from concurrent.futures import ThreadPoolExecutor
+
 from future.utils import iteritems, python_2_unicode_compatible
 from lighttree.interactive import Obj
 
 from pandagg.interactive.mapping import IMapping
 from pandagg.search import Search
+from pandagg.tree.mapping import mappings
 
 
-def discover(using, index="*"):
+def discover(using, index="*", prefetch=False, batch_size=100, max_concurrent=4):
     """
+    List indices, with their aliases. Mappings and settings are only fetched (and parsed) when first accessed on
+    an index, unless `prefetch` is set.
+
     :param using: Elasticsearch client
     :param index: Comma-separated list or wildcard expression of index names used to limit the request.
+    :param prefetch: if True, fetch mappings and settings of all indices upfront
+    :param batch_size: number of indices per request when prefetching
+    :param max_concurrent: maximum number of concurrent requests when prefetching
     """
     indices = Indices()
-    for index_name, index_detail in iteritems(using.indices.get(index=index)):
+    index_list = []
+    for index_name, index_detail in iteritems(using.indices.get_alias(index=index)):
         indices[index_name] = Index(
-            client=using,
-            name=index_name,
-            mapping=index_detail["mappings"],
-            settings=index_detail["settings"],
-            aliases=index_detail["aliases"],
+            client=using, name=index_name, aliases=index_detail["aliases"]
+        )
+        index_list.append(indices[index_name])
+    if prefetch:
+        _fetch_details(
+            using, index_list, batch_size=batch_size, max_concurrent=max_concurrent
         )
     return indices
 
 
+def _fetch_details(using, indices, batch_size=100, max_concurrent=4):
+    """Fetch mappings and settings of indices not yet loaded, by batches of concurrent requests."""
+    indices = [i for i in indices if not i.loaded]
+    batches = [
+        indices[i : i + batch_size] for i in range(0, len(indices), batch_size)
+    ]
+    if not batches:
+        return
+
+    def fetch(batch):
+        details = using.indices.get(index=",".join(i.name for i in batch))
+        for index in batch:
+            index._set_details(details[index.name])
+
+    workers = min(max_concurrent or len(batches), len(batches))
+    if workers <= 1:
+        for batch in batches:
+            fetch(batch)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, batches))
+
+
 # until Proper Index class is written
 
 
 @python_2_unicode_compatible
 class Index:
-    def __init__(self, name, settings, mapping, aliases, client=None):
+    def __init__(self, name, settings=None, mapping=None, aliases=None, client=None):
+        """
+        If mapping and settings aren't provided, they are fetched with given client on first access.
+        """
         super(Index, self).__init__()
         self.client = client
         self.name = name
-        self.settings = settings
-        self._mapping = mapping
-        self.mapping = IMapping(mapping, client=client, index=name)
         self.aliases = aliases
+        self._settings = None
+        self._mapping = None
+        self._imapping = None
+        if mapping is not None or settings is not None:
+            self._set_details({"mappings": mapping, "settings": settings})
+
+    @property
+    def loaded(self):
+        return self._imapping is not None
+
+    def _set_details(self, detail):
+        self._settings = detail["settings"]
+        # shared frozen mapping, parsed once per index and mapping version
+        self._mapping = mappings.get(detail["mappings"], index=self.name)
+        self._imapping = IMapping(self._mapping, client=self.client, index=self.name)
+        if self.aliases is None and "aliases" in detail:
+            self.aliases = detail["aliases"]
+
+    def _load(self):
+        if not self.loaded and self.client is not None:
+            self._set_details(self.client.indices.get(index=self.name)[self.name])
+
+    @property
+    def settings(self):
+        self._load()
+        return self._settings
+
+    @property
+    def mapping(self):
+        self._load()
+        return self._imapping
 
     def search(self):
+        self._load()
         return Search(using=self.client, mapping=self._mapping, index=self.name)
 
     def __repr__(self):
@@ -3,7 +3,7 @@
 
 from lighttree import TreeBasedObj
 from pandagg.interactive._field_agg_factory import field_classes_per_name
-from pandagg.tree.mapping import Mapping
+from pandagg.tree.mapping import Mapping, mappings
 
 
 class IMapping(TreeBasedObj):
@@ -18,7 +18,10 @@ class IMapping(TreeBasedObj):
         root_path = kwargs.pop("root_path", None)
         depth = kwargs.pop("depth", 1)
         initial_tree = kwargs.pop("initial_tree", None)
-        tree = Mapping(*args, **kwargs)
+        if len(args) == 1 and not kwargs:
+            tree = mappings.get(args[0], index=self._index)
+        else:
+            tree = Mapping(*args, **kwargs)
         super(IMapping, self).__init__(
             tree=tree, root_path=root_path, depth=depth, initial_tree=initial_tree
         )
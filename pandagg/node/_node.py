@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 from builtins import str as text
 
+import itertools
 import uuid
 from future.utils import iteritems
 
@@ -12,21 +13,34 @@ from six import add_metaclass
 
 from pandagg.utils import DslMeta
 
+# process-wide sequence of crafted identifiers, unique per process hence per tree
+_ids = itertools.count()
+# random token of current process, so that crafted identifiers are also unique across processes (and pickles)
+_PROCESS_TOKEN = uuid.uuid4().hex[:8]
+# "." can't be part of a field name (it denotes a path of object fields), so that crafted identifiers never
+# collide with field names
+ID_SEPARATOR = "."
+
 
 @add_metaclass(DslMeta)
 class Node(OriginalNode):
 
+    # attributes set by base node are stored in slots. lighttree's Node declares no `__slots__`, so instances
+    # still have a `__dict__`: it is only left empty for subclasses declaring `__slots__` for all their attributes
+    __slots__ = ("identifier", "_children")
+
     KEY = None
     _type_name = None
     _children_prefix = None
 
-    NID_SIZE = 8
-
     def __init__(self, identifier=None, _children=None):
         if identifier is None:
             identifier = self._craft_identifier()
         super(Node, self).__init__(
-            identifier=identifier, _children=self._deserialize_children(_children)
+            identifier=identifier,
+            _children=self._deserialize_children(_children)
+            if _children is not None
+            else None,
         )
 
     @property
@@ -34,7 +48,13 @@ class Node(OriginalNode):
         return ""
 
     def _craft_identifier(self):
-        return "%s%s" % (self._identifier_prefix, text(uuid.uuid4())[: self.NID_SIZE])
+        return "%s%s%s%s%d" % (
+            self._identifier_prefix,
+            ID_SEPARATOR,
+            _PROCESS_TOKEN,
+            ID_SEPARATOR,
+            next(_ids),
+        )
 
     @classmethod
     def get_dsl_class(cls, name, prefix=None):
@@ -242,7 +242,7 @@ class BucketAggNode(AggNode):
                 else:
                     result_aggs.append(atomized_agg)
             elif isinstance(atomized_agg, ShadowRoot):
-                result_aggs.extend(atomized_agg._children)
+                result_aggs.extend(atomized_agg._children or [])
             else:
                 result_aggs.append(self._type_deserializer(atomized_agg))
         super(BucketAggNode, self).__init__(
@@ -11,6 +11,8 @@
 
 from builtins import str as text
 
+from future.utils import iteritems, string_types
+
 from pandagg.node.query.compound import Bool
 from pandagg.tree.query import Query
 from pandagg.node.types import NUMERIC_TYPES
@@ -324,3 +326,100 @@ class DateRange(Range):
         super(DateRange, self).__init__(
             name=name, field=field, keyed=True, meta=meta, aggs=aggs, **body
         )
+
+
+class Composite(MultipleBucketAgg):
+    """Composite aggregation, whose buckets can be paginated using the returned ``after_key``.
+
+    Each bucket key is a dict of source name -> source key.
+    """
+
+    KEY = "composite"
+    VALUE_ATTRS = ["doc_count"]
+    # body parameters accepted by composite sources, per source type
+    SOURCE_PARAMS = {
+        "terms": ["field", "script", "missing_bucket", "order", "value_type"],
+        "histogram": [
+            "field",
+            "script",
+            "interval",
+            "missing_bucket",
+            "order",
+            "value_type",
+        ],
+        "date_histogram": [
+            "field",
+            "script",
+            "interval",
+            "calendar_interval",
+            "fixed_interval",
+            "format",
+            "time_zone",
+            "offset",
+            "missing_bucket",
+            "order",
+            "value_type",
+        ],
+    }
+
+    def __init__(
+        self, name, sources, size=None, after=None, meta=None, aggs=None, **body
+    ):
+        """
+        :param sources: list of sources, each being in the form {"<source_name>": {"<source_type>": {...}}}
+        :param size: number of composite buckets returned per page
+        :param after: key of the last bucket of previous page, used to request next page
+        """
+        self.sources = sources
+        self.size = size
+        self.after = after
+        # source name -> bucket aggregation node, used to build bucket filters
+        self._source_nodes = [
+            self._type_deserializer({source_name: source_body})
+            for source in sources
+            for source_name, source_body in iteritems(source)
+        ]
+        body_kwargs = dict(body)
+        if size is not None:
+            body_kwargs["size"] = size
+        if after is not None:
+            body_kwargs["after"] = after
+        super(Composite, self).__init__(
+            name=name, sources=sources, meta=meta, aggs=aggs, **body_kwargs
+        )
+
+    @property
+    def source_names(self):
+        return [source_node.name for source_node in self._source_nodes]
+
+    @classmethod
+    def source_from_agg_node(cls, agg_node):
+        """Convert a bucket aggregation node into a composite source, discarding parameters not supported by
+        composite sources (for instance the terms ``size``, since composite buckets are paginated instead).
+        """
+        if agg_node.KEY not in cls.SOURCE_PARAMS:
+            raise ValueError(
+                "Aggregation <%s> of type <%s> cannot be used as composite source."
+                % (agg_node.name, agg_node.KEY)
+            )
+        params = cls.SOURCE_PARAMS[agg_node.KEY]
+        source_body = {
+            k: v
+            for k, v in iteritems(agg_node.body)
+            if k in params and not (k == "order" and not isinstance(v, string_types))
+        }
+        return {agg_node.name: {agg_node.KEY: source_body}}
+
+    def get_filter(self, key):
+        """Provide filter to get documents belonging to document of given key."""
+        conditions = []
+        for source_node in self._source_nodes:
+            source_key = key[source_node.name]
+            if source_key is None:
+                # missing_bucket
+                conditions.append(
+                    {"bool": {"must_not": {"exists": {"field": source_node.field}}}}
+                )
+            else:
+                conditions.append(source_node.get_filter(source_key))
+        return {"bool": {"filter": conditions}}
@@ -95,7 +95,7 @@ class QueryClause(Node):
 
     @property
     def _identifier_prefix(self):
-        return "%s_" % self.KEY
+        return self.KEY
 
     def serialize(self, with_name=True):
         b = self.body.copy()
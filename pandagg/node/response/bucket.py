@@ -7,6 +7,10 @@ from pandagg.node._node import Node
 
 class Bucket(Node):
 
+    # response trees can hold millions of buckets: attributes are stored in slots, leaving instance `__dict__`
+    # (inherited from lighttree's Node) empty
+    __slots__ = ("value", "level", "key")
+
     ROOT_NAME = "root"
 
     def __init__(self, value, key=None, level=None):
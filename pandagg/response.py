@@ -4,32 +4,96 @@
 from __future__ import unicode_literals
 
 from builtins import str as text
+import functools
+import itertools
+import logging
+from collections import OrderedDict
 
-from future.utils import iterkeys
+from future.utils import iterkeys, iteritems, itervalues
 
+from pandagg.connections import get_connection
+from pandagg.exceptions import AbsentMappingFieldError
 from pandagg.interactive.response import IResponse
-from pandagg.node.aggs.abstract import UniqueBucketAgg, MetricAgg, ShadowRoot
-from pandagg.tree.response import AggsResponseTree
+from pandagg.node.aggs.abstract import (
+    UniqueBucketAgg,
+    MetricAgg,
+    MultipleBucketAgg,
+    ShadowRoot,
+)
+from pandagg.node.aggs.bucket import Composite
+from pandagg.node.mapping.abstract import ComplexField
+from pandagg.tracing import hooks
+from pandagg.tree.aggs import Aggs
+from pandagg.tree.response import AggsResponseTree, ColumnarAggsResponseTree
+
+logger = logging.getLogger(__name__)
 
 
 class Response:
-    def __init__(self, data, search):
+    def __init__(self, data, search, raw=None, trace=None):
+        """
+        :param data: elasticsearch search response
+        :param raw: elasticsearch search response as raw JSON string or bytes. If provided, `data` is ignored and
+            the response is parsed incrementally: all parts except aggregations are parsed right away, whereas
+            aggregations are only parsed on serialization, bucket after bucket (requires ijson)
+        :param trace: ``pandagg.tracing.ExecutionTrace`` of execution, on which aggregations serializations are
+            recorded
+        """
+        if isinstance(raw, text):
+            raw = raw.encode("utf-8")
+        if raw is not None:
+            data = _parse_raw_envelope(raw)
         self.data = data
         self.__search = search
+        self.trace = trace
 
         self.took = data["took"]
+        if trace is not None:
+            trace.took = self.took
         self.timed_out = data["timed_out"]
         self._shards = data["_shards"]
-        self.hits = Hits(data["hits"])
+        self.hits = Hits(data["hits"], mapping=self.__search._mapping)
         self.aggregations = Aggregations(
-            data.get("aggregations", {}),
+            data.get("aggregations", {}) if raw is None else None,
             aggs=self.__search._aggs,
             index=self.__search._index,
             query=self.__search._query,
             client=self.__search._using,
+            raw=raw,
+            trace=trace,
+            search=self.__search,
         )
         self.profile = data.get("profile")
 
+    @property
+    def round_trip_ms(self):
+        """Client-observed request time in milliseconds (encoding, transport and decoding), to compare with `took`
+        server-side execution time. None if execution wasn't traced."""
+        if self.trace is None:
+            return None
+        return self.trace.round_trip * 1000
+
+    @property
+    def overhead_ms(self):
+        """Request time in milliseconds not spent on cluster: network, client-side encoding and decoding. None if
+        execution wasn't traced, or if response was served from cache (`took` isn't related to this request)."""
+        if self.trace is None or self.trace.cached:
+            return None
+        return self.round_trip_ms - self.took
+
+    @property
+    def decode_ms(self):
+        if self.trace is None:
+            return None
+        return self.trace.durations.get("decode", 0.0) * 1000
+
+    @property
+    def serialization_ms(self):
+        """Time spent serializing aggregations so far, in milliseconds."""
+        if self.trace is None:
+            return None
+        return self.trace.serialization * 1000
+
     @property
     def success(self):
         return (
@@ -46,15 +110,164 @@ class Response:
         )
 
 
-class Hits:
-    def __init__(self, hits):
+class Hits(object):
+    """Sequence of search hits: ``Hit`` objects are only built on access, raw hits being available through
+    `data`, and through bulk accessors `sources`, `ids`.
+    """
+
+    def __init__(self, hits, mapping=None):
+        """
+        :param hits: hits part of elasticsearch response
+        :param mapping: ``Mapping`` of searched index, used to plan tabular serialization of hits
+        """
         self.data = hits
         self.total = hits["total"]
-        self.hits = [Hit(hit) for hit in hits.get("hits", [])]
         self.max_score = hits["max_score"]
+        self._raw_hits = hits.get("hits", [])
+        self._hits = None
+        self._mapping = mapping
+
+    @property
+    def hits(self):
+        """List of ``Hit`` objects, built on first access."""
+        if self._hits is None:
+            self._hits = [Hit(hit) for hit in self._raw_hits]
+        return self._hits
+
+    def sources(self):
+        """Return list of hits ``_source``, without building ``Hit`` objects."""
+        return [hit.get("_source") for hit in self._raw_hits]
+
+    def ids(self):
+        """Return list of hits ``_id``, without building ``Hit`` objects."""
+        return [hit.get("_id") for hit in self._raw_hits]
+
+    def _columns_plan(self, fields):
+        """Return list of (path, mapping type) of `_source` leaf fields to serialize, planned from mapping,
+        or None if columns have to be discovered from documents (no mapping and no `fields`).
+        """
+        if not self._mapping:
+            if fields is None:
+                return None
+            return [(path, None) for path in fields]
+        mapping = self._mapping
+        plan = []
+        for path in fields or [None]:
+            nid = mapping.root if path is None else mapping.resolve_path_to_id(path)
+            if nid not in mapping:
+                raise AbsentMappingFieldError(
+                    u"<%s field is not present in mapping>" % path
+                )
+            for field_nid in mapping.expand_tree(nid):
+                field = mapping.get(field_nid)
+                # subfields (multi-fields) are not present in documents sources
+                if field.is_subfield or isinstance(field, ComplexField):
+                    continue
+                plan.append((mapping.node_path(field_nid), field.KEY))
+        return plan
+
+    def to_dataframe(self, fields=None, explode_nested=None):
+        """Serialize hits `_source` as a dataframe, indexed by hits `_id`, with one column per (flattened) leaf
+        field.
+
+        Columns and their types are planned once from the mapping, if available (else discovered from documents),
+        then filled in a single pass over hits. Multi-valued fields (arrays, fields below an array of objects)
+        are serialized as lists.
+
+        :param fields: list of fields paths to serialize (an object field selects all fields below it), by default
+            all fields
+        :param explode_nested: path of a nested field: one row per nested document is generated, with values of
+            fields below it taken from this nested document
+        """
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError(
+                'Using dataframe output format requires to install pandas. Please install "pandas" or '
+                "use another output format."
+            )
+        plan = self._columns_plan(fields)
+        if explode_nested is not None and self._mapping:
+            if self._mapping.mapping_type_of_field(explode_nested) != "nested":
+                raise ValueError("<%s> is not a nested field" % explode_nested)
+
+        explode_prefix = None if explode_nested is None else explode_nested + "."
+        explode_parts = None if explode_nested is None else explode_nested.split(".")
+        ids = []
+        columns = OrderedDict()
+        if plan is not None:
+            column_parts = []
+            for path, _ in plan:
+                columns[path] = []
+                if explode_prefix is not None and path.startswith(explode_prefix):
+                    # relatively to nested document
+                    relative_path = path[len(explode_prefix) :]
+                    column_parts.append((columns[path], True, relative_path.split(".")))
+                else:
+                    column_parts.append((columns[path], False, path.split(".")))
+
+        for hit in self._raw_hits:
+            source = hit.get("_source") or {}
+            if explode_nested is None:
+                nested_docs = [None]
+            else:
+                nested_docs = _extract_source_value(source, explode_parts)
+                if isinstance(nested_docs, dict):
+                    nested_docs = [nested_docs]
+                nested_docs = nested_docs or [None]
+            for nested_doc in nested_docs:
+                if plan is None:
+                    _append_discovered_values(
+                        columns, len(ids), source, nested_doc, explode_nested
+                    )
+                else:
+                    for column, is_nested, parts in column_parts:
+                        if is_nested:
+                            column.append(_extract_source_value(nested_doc, parts))
+                        else:
+                            column.append(_extract_source_value(source, parts))
+                ids.append(hit.get("_id"))
+
+        index = pd.Index(ids, name="_id")
+        if plan is None:
+            return pd.DataFrame(columns, index=index)
+        return pd.DataFrame(
+            OrderedDict(
+                (path, _typed_series(pd, columns[path], type_, index))
+                for path, type_ in plan
+            ),
+            index=index,
+        )
+
+    def to_arrow(self, fields=None, explode_nested=None):
+        """Serialize hits `_source` as a ``pyarrow.Table``, with same columns as `to_dataframe`, and hits `_id` as
+        "_id" column.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                'Using arrow output format requires to install pyarrow. Please install "pyarrow" or '
+                "use another output format."
+            )
+        return pa.Table.from_pandas(
+            self.to_dataframe(fields=fields, explode_nested=explode_nested)
+        )
 
     def __len__(self):
-        return len(self.hits)
+        return len(self._raw_hits)
+
+    def __iter__(self):
+        if self._hits is not None:
+            return iter(self._hits)
+        return (Hit(hit) for hit in self._raw_hits)
+
+    def __getitem__(self, key):
+        if self._hits is not None:
+            return self._hits[key]
+        if isinstance(key, slice):
+            return [Hit(hit) for hit in self._raw_hits[key]]
+        return Hit(self._raw_hits[key])
 
     def _total_repr(self):
         if not isinstance(self.total, dict):
@@ -74,90 +287,127 @@ class Hits:
             total_repr = ">%d" % self.total["value"]
         else:
             raise ValueError("Invalid total %s" % self.total)
-        return "<Hits> total: %s, contains %d hits" % (total_repr, len(self.hits))
+        return "<Hits> total: %s, contains %d hits" % (total_repr, len(self))
+
 
+class Hit(object):
+    __slots__ = ("data",)
 
-class Hit:
     def __init__(self, data):
         self.data = data
-        self._source = data.get("_source")
-        self._score = data.get("_score")
-        self._id = data.get("_id")
-        self._type = data.get("_type")
-        self._index = data.get("_index")
+
+    @property
+    def _source(self):
+        return self.data.get("_source")
+
+    @property
+    def _score(self):
+        return self.data.get("_score")
+
+    @property
+    def _id(self):
+        return self.data.get("_id")
+
+    @property
+    def _type(self):
+        return self.data.get("_type")
+
+    @property
+    def _index(self):
+        return self.data.get("_index")
 
     def __repr__(self):
         return "<Hit %s> score=%.2f" % (self._id, self._score)
 
 
+def _serialized_size(result):
+    """Return number of rows (or buckets for trees) of serialized aggregations, None if not applicable."""
+    if isinstance(result, tuple):
+        return len(result[1])
+    if isinstance(result, dict):
+        return None
+    if hasattr(result, "num_rows"):
+        return result.num_rows
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def _traced_serialization(func):
+    """Record serialization duration and size on aggregations trace, if any."""
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        trace = self._trace
+        # nested serializations are part of the outer one
+        if trace is None or trace._running:
+            return func(self, *args, **kwargs)
+        with trace.phase(func.__name__):
+            result = func(self, *args, **kwargs)
+        size = _serialized_size(result)
+        if size is not None:
+            trace.counts["buckets"] = size
+        hooks.emit("serialize", trace)
+        return result
+
+    return wrapper
+
+
 class Aggregations:
-    def __init__(self, data, aggs, query, index, client):
-        self.data = data
+    # maximum number of composite aggregation pages fetched on serialization
+    max_pages = 10000
+
+    def __init__(
+        self, data, aggs, query, index, client, raw=None, trace=None, search=None
+    ):
+        """
+        :param data: aggregations part of elasticsearch response
+        :param raw: whole elasticsearch search response, as raw JSON string or bytes. If provided instead of
+            `data`, the response is parsed incrementally on serialization (requires ijson), without building it
+            entirely in memory
+        :param trace: ``pandagg.tracing.ExecutionTrace`` on which serializations durations are recorded
+        :param search: ``pandagg.search.Search`` that returned this response, from which following composite
+            aggregation pages are requested (so that its cache, params and post_filter apply to them)
+        """
+        if isinstance(raw, text):
+            raw = raw.encode("utf-8")
+        self.__data = data
+        self.__raw = raw
         self.__aggs = aggs
         self.__index = index
         self.__query = query
         self.__client = client
+        self.__search = search
+        self._trace = trace
+
+    @property
+    def _is_streamed(self):
+        return self.__data is None and self.__raw is not None
+
+    @property
+    def data(self):
+        if self._is_streamed:
+            self.__data = next(
+                _ijson().items(self.__raw, "aggregations", use_float=True), {}
+            )
+        return self.__data
 
     def keys(self):
+        if self._is_streamed:
+            # avoid materializing whole response
+            if self.__aggs.root is None:
+                return []
+            if isinstance(self.__aggs.get(self.__aggs.root), ShadowRoot):
+                return self.__aggs.children(self.__aggs.root)
+            return [self.__aggs.root]
         return self.data.keys()
 
     def get(self, key):
         return self.data[key]
 
-    def _parse_group_by(
-        self,
-        response,
-        row=None,
-        agg_name=None,
-        until=None,
-        row_as_tuple=False,
-        with_single_bucket_groups=False,
-    ):
-        """Recursive parsing of succession of unique child bucket aggregations.
-
-        Yields each row for which last bucket aggregation generated buckets.
-        """
-        if not row:
-            row = [] if row_as_tuple else {}
-        agg_name = self.__aggs.root if agg_name is None else agg_name
-        if agg_name in response:
-            agg_node = self.__aggs.get(agg_name)
-            for key, raw_bucket in agg_node.extract_buckets(response[agg_name]):
-                child_name = next(
-                    (
-                        child.name
-                        for child in self.__aggs.children(agg_name, id_only=False)
-                    ),
-                    None,
-                )
-                sub_row = row.copy()
-                # aggs generating a single bucket don't require to be listed in grouping keys
-                if (
-                    not isinstance(agg_node, UniqueBucketAgg)
-                    or with_single_bucket_groups
-                ):
-                    if row_as_tuple:
-                        sub_row.append(key)
-                    else:
-                        sub_row[agg_name] = key
-                if child_name and agg_name != until:
-                    # yield children
-                    for sub_row, sub_raw_bucket in self._parse_group_by(
-                        row=sub_row,
-                        response=raw_bucket,
-                        agg_name=child_name,
-                        until=until,
-                        row_as_tuple=row_as_tuple,
-                    ):
-                        yield sub_row, sub_raw_bucket
-                else:
-                    # end real yield
-                    if row_as_tuple:
-                        sub_row = tuple(sub_row)
-                    yield sub_row, raw_bucket
-
     def _normalize_buckets(self, agg_response, agg_name=None):
-        """Recursive function to parse aggregation response as a normalized entities.
+        """Parse aggregation response as a normalized entities.
         Each response bucket is represented as a dict with keys (key, level, value, children)::
 
             {
@@ -168,26 +418,111 @@ class Aggregations:
                 ]
             }
         """
+        plan = self.__aggs.parse_plan()
         agg_name = agg_name or self.__aggs.root
-        agg_node = self.__aggs.get(agg_name)
-        agg_children = self.__aggs.children(agg_node.name, id_only=False)
-        for key, raw_bucket in agg_node.extract_buckets(agg_response[agg_name]):
+        _, agg_children, extract_buckets, extract_bucket_value = plan[agg_name]
+        for key, raw_bucket in extract_buckets(agg_response[agg_name]):
             result = {
                 "level": agg_name,
                 "key": key,
-                "value": agg_node.extract_bucket_value(raw_bucket),
+                "value": extract_bucket_value(raw_bucket),
             }
-            normalized_children = [
-                normalized_child
-                for child in agg_children
-                for normalized_child in self._normalize_buckets(
-                    agg_name=child.name, agg_response=raw_bucket
-                )
-            ]
-            if normalized_children:
-                result["children"] = normalized_children
+            # explicit stack of (normalized bucket, iterator over its children buckets)
+            stack = [(result, _iter_children_buckets(plan, agg_children, raw_bucket))]
+            while stack:
+                parent, children_buckets = stack[-1]
+                child_bucket = next(children_buckets, None)
+                if child_bucket is None:
+                    stack.pop()
+                    continue
+                child_name, child_key, child_raw_bucket = child_bucket
+                _, sub_children, _, child_extract_bucket_value = plan[child_name]
+                normalized_child = {
+                    "level": child_name,
+                    "key": child_key,
+                    "value": child_extract_bucket_value(child_raw_bucket),
+                }
+                parent.setdefault("children", []).append(normalized_child)
+                if sub_children:
+                    stack.append(
+                        (
+                            normalized_child,
+                            _iter_children_buckets(
+                                plan, sub_children, child_raw_bucket
+                            ),
+                        )
+                    )
             yield result
 
+    def _next_page(
+        self, grouping_agg, agg_response, previous_after_key=None, nb_pages=1
+    ):
+        """Return next aggregations response page if grouping aggregation is a root composite aggregation whose
+        buckets are not all fetched yet, else None.
+
+        Pagination stops if the returned ``after_key`` is the one of previous page (it would never end), or once
+        `max_pages` pages are fetched.
+
+        :param agg_response: grouping aggregation response of current page
+        :param previous_after_key: ``after_key`` of the page preceding current one
+        :param nb_pages: number of pages fetched so far
+        """
+        if not isinstance(grouping_agg, Composite):
+            return None
+        if self.__search is None and self.__client is None:
+            return None
+        if grouping_agg.name != self.__aggs.root:
+            return None
+        after_key = agg_response.get("after_key")
+        if not agg_response.get("buckets") or after_key is None:
+            return None
+        if previous_after_key is not None and after_key == previous_after_key:
+            logger.warning(
+                "Composite aggregation <%s> returned same after_key twice, stopping pagination.",
+                grouping_agg.name,
+            )
+            return None
+        if nb_pages >= self.max_pages:
+            logger.warning(
+                "Composite aggregation <%s> pagination stopped after %d pages.",
+                grouping_agg.name,
+                nb_pages,
+            )
+            return None
+        aggs = self.__aggs.to_dict()
+        composite = aggs[grouping_agg.name].copy()
+        composite[Composite.KEY] = dict(composite[Composite.KEY], after=after_key)
+        aggs[grouping_agg.name] = composite
+        if self.__search is not None:
+            search = self.__search.size(0)
+            search._aggs = Aggs(aggs, mapping=self.__aggs.mapping)
+            return search.execute().aggregations.data
+        body = {"size": 0, "aggs": aggs}
+        if self.__query:
+            body["query"] = self.__query.to_dict()
+        return (
+            get_connection(self.__client)
+            .search(index=self.__index, body=body)
+            .get("aggregations", {})
+        )
+
+    def _iter_pages(self, grouping_agg, data, previous_after_key=None, nb_pages=0):
+        """Yield aggregations response pages starting from `data`: only this one, unless grouping aggregation is a
+        root composite aggregation, in which case following pages are requested using the returned ``after_key``
+        until all buckets are fetched (see `_next_page`).
+
+        :param previous_after_key: ``after_key`` of the page preceding `data`, if already consumed
+        :param nb_pages: number of pages already consumed before `data`
+        """
+        while data is not None:
+            yield data
+            nb_pages += 1
+            agg_response = data.get(grouping_agg.name, {})
+            data = self._next_page(
+                grouping_agg, agg_response, previous_after_key, nb_pages
+            )
+            previous_after_key = agg_response.get("after_key")
+
     def _grouping_agg(self, name=None):
         """Return aggregation node that used as grouping node."""
         # if provided
@@ -207,6 +542,307 @@ class Aggregations:
             return None
         return self.__aggs.get(name)
 
+    def _grouping_chain(self, grouping_agg):
+        """Return aggregation nodes from root until grouping aggregation included."""
+        return self.__aggs.ancestors(
+            grouping_agg.name, id_only=False, from_root=True
+        ) + [grouping_agg]
+
+    def _grouping_index_names(self, grouping_agg, with_single_bucket_groups):
+        """Return names of grouping levels, from root until grouping aggregation included."""
+        index_names = []
+        for a in self._grouping_chain(grouping_agg):
+            if isinstance(a, Composite):
+                index_names.extend(a.source_names)
+            elif not isinstance(a, UniqueBucketAgg) or with_single_bucket_groups:
+                index_names.append(a.name)
+        return index_names
+
+    @staticmethod
+    def _set_grouping_keys(keys, depth, agg_node, key, with_single_bucket_groups):
+        """Write in `keys` list, from `depth` position, grouping keys of bucket of given aggregation."""
+        del keys[depth:]
+        if isinstance(agg_node, Composite):
+            # each composite source is a grouping level
+            keys.extend(key[source_name] for source_name in agg_node.source_names)
+        # aggs generating a single bucket don't require to be listed in grouping keys
+        elif not isinstance(agg_node, UniqueBucketAgg) or with_single_bucket_groups:
+            keys.append(key)
+
+    def _iter_grouping_buckets(
+        self, response, chain, keys, with_single_bucket_groups, level=0
+    ):
+        """Yield raw buckets of last aggregation level of `chain`, walking the response once with an explicit stack.
+
+        Instead of building a row per bucket, grouping keys of the yielded bucket are written in-place in the shared
+        `keys` list, so that the caller can read them at yield time.
+        """
+        last_level = len(chain) - 1
+        initial_depth = len(keys)
+        # stack of (level, keys depth at this level, iterator over level buckets)
+        stack = []
+        if chain[level].name in response:
+            stack.append(
+                (
+                    level,
+                    initial_depth,
+                    iter(chain[level].extract_buckets(response[chain[level].name])),
+                )
+            )
+        while stack:
+            current_level, depth, buckets = stack[-1]
+            bucket = next(buckets, None)
+            if bucket is None:
+                stack.pop()
+                continue
+            key, raw_bucket = bucket
+            agg_node = chain[current_level]
+            self._set_grouping_keys(
+                keys, depth, agg_node, key, with_single_bucket_groups
+            )
+            if current_level == last_level:
+                yield raw_bucket
+                continue
+            sub_agg_node = chain[current_level + 1]
+            if sub_agg_node.name in raw_bucket:
+                sub_buckets = sub_agg_node.extract_buckets(
+                    raw_bucket[sub_agg_node.name]
+                )
+                stack.append((current_level + 1, len(keys), iter(sub_buckets)))
+        del keys[initial_depth:]
+
+    def _iter_all_grouping_buckets(self, grouping_agg, keys, with_single_bucket_groups):
+        """Yield raw buckets of grouping aggregation level, through all response pages (see `_iter_pages`), and
+        parsing response incrementally if it is streamed. Grouping keys are written in-place in `keys`.
+        """
+        chain = self._grouping_chain(grouping_agg)
+        if self._is_streamed:
+            first_agg_response = {}
+            for raw_bucket in self._iter_streamed_grouping_buckets(
+                chain, keys, with_single_bucket_groups, first_agg_response
+            ):
+                yield raw_bucket
+            data = self._next_page(grouping_agg, first_agg_response)
+            pages = self._iter_pages(
+                grouping_agg,
+                data,
+                previous_after_key=first_agg_response.get("after_key"),
+                nb_pages=1,
+            )
+        else:
+            pages = self._iter_pages(grouping_agg, self.data)
+        for page in pages:
+            for raw_bucket in self._iter_grouping_buckets(
+                page, chain, keys, with_single_bucket_groups
+            ):
+                yield raw_bucket
+
+    def _iter_streamed_grouping_buckets(
+        self, chain, keys, with_single_bucket_groups, first_agg_response
+    ):
+        """Streaming counterpart of `_iter_grouping_buckets`, parsing raw response JSON events: only buckets of
+        grouping level are built in memory, one at a time, as well as the scalar properties of their ancestors
+        buckets.
+
+        :param first_agg_response: dict filled with root aggregation properties (except buckets), and with a
+            "buckets" boolean telling whether it returned buckets
+        """
+        events = _ijson().basic_parse(self.__raw, use_float=True)
+        event, _ = next(events)
+        if event != "start_map":
+            return
+        for event, value in events:
+            if event == "end_map":
+                return
+            # map_key
+            value_event, value_value = next(events)
+            if value != "aggregations":
+                _skip_json_value(events, value_event)
+                continue
+            for aggs_event, agg_name in events:
+                if aggs_event == "end_map":
+                    return
+                agg_event, agg_value = next(events)
+                if agg_name != chain[0].name:
+                    _skip_json_value(events, agg_event)
+                    continue
+                for raw_bucket in self._iter_streamed_agg_buckets(
+                    events,
+                    chain,
+                    keys,
+                    with_single_bucket_groups,
+                    agg_response=first_agg_response,
+                ):
+                    yield raw_bucket
+
+    def _iter_streamed_agg_buckets(
+        self, events, chain, keys, with_single_bucket_groups, level=0, agg_response=None
+    ):
+        """Parse aggregation response events of `chain[level]` aggregation (its opening event being already
+        consumed), and yield grouping buckets found below it.
+        """
+        agg_node = chain[level]
+        depth = len(keys)
+        if isinstance(agg_node, UniqueBucketAgg):
+            # aggregation response is the bucket itself
+            for raw_bucket in self._iter_streamed_bucket(
+                events, chain, keys, with_single_bucket_groups, level, depth
+            ):
+                yield raw_bucket
+            del keys[depth:]
+            return
+        for event, value in events:
+            if event == "end_map":
+                break
+            # map_key
+            value_event, value_value = next(events)
+            if value != "buckets":
+                if agg_response is None:
+                    _skip_json_value(events, value_event)
+                else:
+                    agg_response[value] = _build_json_value(
+                        events, value_event, value_value
+                    )
+                continue
+            if value_event != "start_array":
+                # keyed buckets are sorted by key, hence need to be all built first
+                buckets = _build_json_value(events, value_event, value_value)
+                for raw_bucket in self._iter_grouping_buckets(
+                    {agg_node.name: {"buckets": buckets}},
+                    chain,
+                    keys,
+                    with_single_bucket_groups,
+                    level=level,
+                ):
+                    yield raw_bucket
+                continue
+            for bucket_event, _ in events:
+                if bucket_event == "end_array":
+                    break
+                if agg_response is not None:
+                    agg_response["buckets"] = True
+                for raw_bucket in self._iter_streamed_bucket(
+                    events, chain, keys, with_single_bucket_groups, level, depth
+                ):
+                    yield raw_bucket
+        del keys[depth:]
+
+    def _iter_streamed_bucket(
+        self, events, chain, keys, with_single_bucket_groups, level, depth
+    ):
+        """Parse bucket events (its opening event being already consumed) of `chain[level]` aggregation."""
+        agg_node = chain[level]
+        if level == len(chain) - 1:
+            raw_bucket = _build_json_value(events, "start_map", None)
+            self._set_grouping_keys(
+                keys,
+                depth,
+                agg_node,
+                _streamed_bucket_key(agg_node, raw_bucket, complete=True),
+                with_single_bucket_groups,
+            )
+            yield raw_bucket
+            return
+        # ancestor bucket: only build its properties until child aggregation is reached
+        child_name = chain[level + 1].name
+        partial_bucket = {}
+        for event, value in events:
+            if event == "end_map":
+                break
+            # map_key
+            value_event, value_value = next(events)
+            key = _streamed_bucket_key(agg_node, partial_bucket)
+            if value != child_name or key is _MISSING_KEY:
+                partial_bucket[value] = _build_json_value(
+                    events, value_event, value_value
+                )
+                continue
+            self._set_grouping_keys(
+                keys, depth, agg_node, key, with_single_bucket_groups
+            )
+            for raw_bucket in self._iter_streamed_agg_buckets(
+                events, chain, keys, with_single_bucket_groups, level=level + 1
+            ):
+                yield raw_bucket
+        if child_name not in partial_bucket:
+            return
+        # bucket key was only found after child aggregation, which was hence built entirely
+        self._set_grouping_keys(
+            keys,
+            depth,
+            agg_node,
+            _streamed_bucket_key(agg_node, partial_bucket, complete=True),
+            with_single_bucket_groups,
+        )
+        for raw_bucket in self._iter_grouping_buckets(
+            partial_bucket, chain, keys, with_single_bucket_groups, level=level + 1
+        ):
+            yield raw_bucket
+
+    def _serialize_as_columns(
+        self, grouped_by, normalize, expand_sep, with_single_bucket_groups
+    ):
+        """Columnar counterpart of `serialize_as_tabular` (with expanded columns): walk response buckets once,
+        and append grouping keys and values directly in per-column lists, without building intermediary rows.
+
+        :return: index_names, index_columns, value_columns (OrderedDict column name -> list), nb_rows
+        """
+        grouping_agg = self._grouping_agg(grouped_by)
+        if grouping_agg is None:
+            index_names = []
+            raw_buckets = iter([self.data])
+            keys = []
+            children = self._grouping_children(None)
+        else:
+            index_names = self._grouping_index_names(
+                grouping_agg, with_single_bucket_groups
+            )
+            keys = []
+            raw_buckets = self._iter_all_grouping_buckets(
+                grouping_agg, keys, with_single_bucket_groups
+            )
+            children = self._grouping_children(grouping_agg)
+
+        index_columns = [[] for _ in index_names]
+        value_columns = OrderedDict()
+        total_column = None
+        if grouping_agg is not None and not isinstance(grouping_agg, ShadowRoot):
+            total_column = value_columns[grouping_agg.VALUE_ATTRS[0]] = []
+        # expanded columns are not known in advance, and can be absent from some rows
+        expanded_columns = []
+        nb_rows = 0
+        for raw_bucket in raw_buckets:
+            for index_column, key in zip(index_columns, keys):
+                index_column.append(key)
+            if total_column is not None:
+                total_column.append(grouping_agg.extract_bucket_value(raw_bucket))
+            for child in children:
+                if isinstance(child, (UniqueBucketAgg, MetricAgg)):
+                    value = child.extract_bucket_value(raw_bucket[child.name])
+                elif expand_sep is not None:
+                    for key, bucket in child.extract_buckets(raw_bucket[child.name]):
+                        column_name = "%s%s%s" % (child.name, expand_sep, key)
+                        column = value_columns.get(column_name)
+                        if column is None:
+                            column = value_columns[column_name] = [None] * nb_rows
+                            expanded_columns.append(column)
+                        column.append(child.extract_bucket_value(bucket))
+                    continue
+                elif normalize:
+                    value = next(self._normalize_buckets(raw_bucket, child.name), None)
+                else:
+                    value = raw_bucket[child.name]
+                column = value_columns.get(child.name)
+                if column is None:
+                    column = value_columns[child.name] = []
+                column.append(value)
+            nb_rows += 1
+            for column in expanded_columns:
+                if len(column) < nb_rows:
+                    column.append(None)
+        return index_names, index_columns, value_columns, nb_rows
+
+    @_traced_serialization
     def serialize_as_tabular(
         self,
         row_as_tuple=False,
@@ -244,25 +880,22 @@ class Aggregations:
             index_values = [(tuple() if row_as_tuple else dict(), self.data)]
             index_names = []
         else:
-            index_names = [
-                a.name
-                for a in self.__aggs.ancestors(
-                    grouping_agg.name, id_only=False, from_root=True
+            index_names = self._grouping_index_names(
+                grouping_agg, with_single_bucket_groups
+            )
+            keys = []
+            # lazily evaluated, so that each bucket is serialized as soon as it is parsed
+            index_values = (
+                (
+                    tuple(keys) if row_as_tuple else dict(zip(index_names, keys)),
+                    raw_bucket,
                 )
-                + [grouping_agg]
-                if not isinstance(a, UniqueBucketAgg) or with_single_bucket_groups
-            ]
-            index_values = list(
-                self._parse_group_by(
-                    response=self.data,
-                    row_as_tuple=row_as_tuple,
-                    until=grouping_agg.name,
-                    with_single_bucket_groups=with_single_bucket_groups,
+                for raw_bucket in self._iter_all_grouping_buckets(
+                    grouping_agg, keys, with_single_bucket_groups
                 )
             )
-            if not index_values:
-                return [], []
 
+        children = self._grouping_children(grouping_agg)
         rows = [
             (
                 row_index,
@@ -272,29 +905,45 @@ class Aggregations:
                     total_agg=grouping_agg,
                     expand_columns=expand_columns,
                     expand_sep=expand_sep,
+                    children=children,
                 ),
             )
             for row_index, row_values in index_values
         ]
+        if not rows:
+            return [], []
         return index_names, rows
 
+    def _grouping_children(self, grouping_agg):
+        """Return children aggregation nodes of grouping aggregation (or of root if None), used as columns."""
+        plan = self.__aggs.parse_plan()
+        if not plan:
+            return ()
+        if grouping_agg is None:
+            return plan[self.__aggs.root][1]
+        return plan[grouping_agg.name][1]
+
     def serialize_columns(
-        self, row_data, normalize, expand_columns, expand_sep, total_agg=None
+        self,
+        row_data,
+        normalize,
+        expand_columns,
+        expand_sep,
+        total_agg=None,
+        children=None,
     ):
+        """
+        :param children: children aggregation nodes of `total_agg` (or of root), computed if not provided
+        """
         # extract value (usually 'doc_count') of grouping agg node
         result = {}
         if total_agg is not None and not isinstance(total_agg, ShadowRoot):
             result[total_agg.VALUE_ATTRS[0]] = total_agg.extract_bucket_value(row_data)
-            grouping_agg_children = self.__aggs.children(
-                total_agg.identifier, id_only=False
-            )
-        else:
-            grouping_agg_children = self.__aggs.children(
-                self.__aggs.root, id_only=False
-            )
+        if children is None:
+            children = self._grouping_children(total_agg)
 
         # extract values of children, one columns per child
-        for child in grouping_agg_children:
+        for child in children:
             if isinstance(child, (UniqueBucketAgg, MetricAgg)):
                 result[child.name] = child.extract_bucket_value(row_data[child.name])
             elif expand_columns:
@@ -310,6 +959,7 @@ class Aggregations:
                 result[child.name] = row_data[child.name]
         return result
 
+    @_traced_serialization
     def serialize_as_dataframe(
         self, grouped_by=None, normalize_children=True, with_single_bucket_groups=False
     ):
@@ -320,21 +970,69 @@ class Aggregations:
                 'Using dataframe output format requires to install pandas. Please install "pandas" or '
                 "use another output format."
             )
-        index_names, index_values = self.serialize_as_tabular(
-            row_as_tuple=True,
+        index_names, index_columns, value_columns, nb_rows = self._serialize_as_columns(
             grouped_by=grouped_by,
             normalize=normalize_children,
+            expand_sep="|",
             with_single_bucket_groups=with_single_bucket_groups,
         )
-        index, values = zip(*index_values)
-        if not index:
+        if not nb_rows:
             return pd.DataFrame()
-        if len(index[0]) == 0:
-            index = (None,) * len(index)
+        if not index_names:
+            index = (None,) * nb_rows
         else:
-            index = pd.MultiIndex.from_tuples(index, names=index_names)
-        return pd.DataFrame(index=index, data=values)
+            index = pd.MultiIndex.from_arrays(index_columns, names=index_names)
+        return pd.DataFrame(index=index, data=value_columns)
+
+    @_traced_serialization
+    def serialize_as_arrow(self, grouped_by=None, with_single_bucket_groups=False):
+        """Build a ``pyarrow.Table`` directly from response buckets, without intermediary dataframe: grouping keys
+        are dictionary-encoded columns, and values are typed columns (children bucket aggregations are expanded in
+        one column per bucket key, as in dataframe format).
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                'Using arrow output format requires to install pyarrow. Please install "pyarrow" or '
+                "use another output format."
+            )
+        index_names, index_columns, value_columns, _ = self._serialize_as_columns(
+            grouped_by=grouped_by,
+            normalize=False,
+            expand_sep="|",
+            with_single_bucket_groups=with_single_bucket_groups,
+        )
+        arrays = [pa.array(column).dictionary_encode() for column in index_columns]
+        arrays.extend(pa.array(column) for column in value_columns.values())
+        return pa.Table.from_arrays(
+            arrays, names=index_names + [text(name) for name in value_columns.keys()]
+        )
+
+    def to_parquet(
+        self, path, grouped_by=None, with_single_bucket_groups=False, **kwargs
+    ):
+        """Write aggregations response as a parquet file, see `serialize_as_arrow`.
+
+        :param path: file path or writable file-like object
+        :param kwargs: passed to ``pyarrow.parquet.write_table``
+        """
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                'Using parquet output format requires to install pyarrow. Please install "pyarrow".'
+            )
+        pq.write_table(
+            self.serialize_as_arrow(
+                grouped_by=grouped_by,
+                with_single_bucket_groups=with_single_bucket_groups,
+            ),
+            path,
+            **kwargs
+        )
 
+    @_traced_serialization
     def serialize_as_normalized(self):
         children = []
         for k in sorted(iterkeys(self.data)):
@@ -342,7 +1040,15 @@ class Aggregations:
                 children.append(child)
         return {"level": "root", "key": None, "value": None, "children": children}
 
-    def serialize_as_tree(self):
+    @_traced_serialization
+    def serialize_as_tree(self, columnar=False):
+        """
+        :param columnar: if True, return a ColumnarAggsResponseTree, better suited for large responses
+        """
+        if columnar:
+            return ColumnarAggsResponseTree(aggs=self.__aggs, index=self.__index).parse(
+                self.data
+            )
         return AggsResponseTree(aggs=self.__aggs, index=self.__index).parse(self.data)
 
     def serialize_as_interactive_tree(self):
@@ -356,14 +1062,14 @@ class Aggregations:
 
     def serialize(self, output="dataframe", **kwargs):
         """
-        :param output: output format, one of "raw", "tree", "normalized_tree", "dict_rows", "dataframe"
+        :param output: output format, one of "raw", "tree", "normalized_tree", "dict_rows", "dataframe", "arrow"
         :param kwargs: serialization kwargs
         :return:
         """
         if output == "raw":
             return self.data
         elif output == "tree":
-            return self.serialize_as_tree()
+            return self.serialize_as_tree(**kwargs)
         elif output == "interactive_tree":
             return self.serialize_as_interactive_tree()
         elif output == "normalized_tree":
@@ -372,6 +1078,8 @@ class Aggregations:
             return self.serialize_as_tabular(**kwargs)
         elif output == "dataframe":
             return self.serialize_as_dataframe(**kwargs)
+        elif output == "arrow":
+            return self.serialize_as_arrow(**kwargs)
         else:
             raise NotImplementedError("Unkown %s output format." % output)
 
@@ -379,3 +1087,180 @@ class Aggregations:
         if not self.keys():
             return "<Aggregations> empty"
         return "<Aggregations> %s" % list(map(text, self.keys()))
+
+
+# pandas dtypes of mapping types that can be typed without ambiguity (nullable dtypes, as fields can be missing)
+_FIELD_DTYPES = {
+    "long": "Int64",
+    "integer": "Int64",
+    "short": "Int64",
+    "byte": "Int64",
+    "double": "float64",
+    "float": "float64",
+    "half_float": "float64",
+    "scaled_float": "float64",
+    "boolean": "boolean",
+}
+
+
+def _typed_series(pd, values, type_, index):
+    dtype = _FIELD_DTYPES.get(type_)
+    if dtype is not None:
+        try:
+            return pd.Series(values, index=index, dtype=dtype)
+        except (TypeError, ValueError):
+            # multi-valued field
+            pass
+    return pd.Series(values, index=index, dtype=object)
+
+
+def _extract_source_value(source, parts):
+    """Return value at path in document source, as a list if path crosses an array."""
+    value = source
+    for i, part in enumerate(parts):
+        if isinstance(value, list):
+            values = []
+            for item in value:
+                item_value = _extract_source_value(item, parts[i:])
+                if isinstance(item_value, list):
+                    values.extend(item_value)
+                elif item_value is not None:
+                    values.append(item_value)
+            return values or None
+        if not isinstance(value, dict):
+            return None
+        if part not in value:
+            # source can contain dotted keys
+            remaining_path = ".".join(parts[i:])
+            return value.get(remaining_path)
+        value = value[part]
+    return value
+
+
+def _flatten_source(source, prefix=""):
+    """Yield (path, value) of document leaf fields, arrays being considered as leaves."""
+    for key, value in iteritems(source):
+        if isinstance(value, dict):
+            for path, sub_value in _flatten_source(value, prefix + key + "."):
+                yield path, sub_value
+        else:
+            yield prefix + key, value
+
+
+def _append_discovered_values(columns, nb_rows, source, nested_doc, explode_nested):
+    """Append row values in `columns`, adding columns (padded with None) for fields not seen before."""
+    values = _flatten_source(source)
+    if explode_nested is not None:
+        values = itertools.chain(
+            (
+                (path, value)
+                for path, value in values
+                if path != explode_nested and not path.startswith(explode_nested + ".")
+            ),
+            _flatten_source(nested_doc or {}, explode_nested + "."),
+        )
+    for path, value in values:
+        column = columns.get(path)
+        if column is None:
+            column = columns[path] = [None] * nb_rows
+        column.append(value)
+    for column in itervalues(columns):
+        if len(column) <= nb_rows:
+            column.append(None)
+
+
+def _iter_children_buckets(plan, children, raw_bucket):
+    """Yield (aggregation name, key, raw bucket) of buckets of given children aggregations in `raw_bucket`."""
+    for child in children:
+        _, _, extract_buckets, _ = plan[child.name]
+        for key, child_raw_bucket in extract_buckets(raw_bucket[child.name]):
+            yield child.name, key, child_raw_bucket
+
+
+def _ijson():
+    try:
+        import ijson
+    except ImportError:
+        raise ImportError(
+            'Parsing streamed responses requires to install ijson. Please install "ijson".'
+        )
+    return ijson
+
+
+def _parse_raw_envelope(raw):
+    """Parse all members of raw search response, except aggregations."""
+    events = _ijson().basic_parse(raw, use_float=True)
+    data = {}
+    event, _ = next(events)
+    if event != "start_map":
+        raise ValueError("Invalid search response, expected a JSON object.")
+    for event, key in _until_end(events):
+        value_event, value = next(events)
+        if key == "aggregations":
+            _skip_json_value(events, value_event)
+            continue
+        data[key] = _build_json_value(events, value_event, value)
+    return data
+
+
+def _until_end(events):
+    """Yield map_key events of a JSON object, until its end."""
+    for event, value in events:
+        if event == "end_map":
+            return
+        yield event, value
+
+
+def _skip_json_value(events, event):
+    """Consume events of a JSON value whose first event is `event`."""
+    if event not in ("start_map", "start_array"):
+        return
+    depth = 1
+    for event, _ in events:
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def _build_json_value(events, event, value):
+    """Build JSON value whose first event is `event` from following events."""
+    if event not in ("start_map", "start_array"):
+        return value
+    from ijson.common import ObjectBuilder
+
+    builder = ObjectBuilder()
+    builder.event(event, value)
+    depth = 1
+    for event, value in events:
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+            if depth == 0:
+                break
+    return builder.value
+
+
+_MISSING_KEY = object()
+
+
+def _streamed_bucket_key(agg_node, raw_bucket, complete=False):
+    """Return key of bucket, or `_MISSING_KEY` if it cannot be known yet from its parsed properties.
+
+    :param complete: whether bucket is entirely parsed
+    """
+    if isinstance(agg_node, UniqueBucketAgg):
+        return None
+    if complete:
+        return agg_node._extract_bucket_key(raw_bucket)
+    if (
+        type(agg_node)._extract_bucket_key is not MultipleBucketAgg._extract_bucket_key
+        or agg_node.key_path not in raw_bucket
+    ):
+        # key can be computed from multiple bucket properties: wait for whole bucket
+        return _MISSING_KEY
+    return agg_node._extract_bucket_key(raw_bucket)
@@ -1,16 +1,49 @@
 # adapted from elasticsearch-dsl/search.py
 import copy
 import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from elasticsearch import TransportError
 from elasticsearch.helpers import scan
 from future.utils import string_types
+from six.moves import queue
 
+from pandagg.cache import cache_key, client_identity
 from pandagg.connections import get_connection
 from pandagg.response import Response
-from pandagg.tree.mapping import Mapping
+from pandagg.tracing import (
+    UNDECODED_RESPONSE_PARAM,
+    ExecutionTrace,
+    hooks,
+    instrument_client,
+    tracing,
+)
+from pandagg.tree.mapping import mappings
 from pandagg.tree.query import Query
 from pandagg.tree.aggs import Aggs
 
+if sys.version_info >= (3, 6):
+    from pandagg._async.search import AsyncSearchMixin, AsyncMultiSearchMixin
+else:
+
+    class AsyncSearchMixin(object):
+        pass
+
+    class AsyncMultiSearchMixin(object):
+        pass
+
+
+_SLICE_DONE = object()
+
+
+class _SliceError(object):
+    """Wraps an exception raised while consuming a sliced scroll, to be re-raised by the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
 
 class Request(object):
     def __init__(self, using, index=None):
@@ -23,6 +56,7 @@ class Request(object):
             self._index = [index]
 
         self._params = {}
+        self._cache = None
 
     def params(self, **kwargs):
         """
@@ -81,13 +115,54 @@ class Request(object):
         s._using = client
         return s
 
+    def cache(self, cache):
+        """
+        Associate the request with a response cache: identical requests (same
+        index, body and params) are then served from the cache. A fresh copy
+        will be returned with current instance remaining unchanged.
+
+        :arg cache: an instance of ``pandagg.cache.BaseCache`` (for instance
+            ``MemoryCache`` or ``DiskCache``), or None to disable caching
+
+        Example::
+
+            s = Search(index='my-index').cache(MemoryCache(ttl=60))
+        """
+        s = self._clone()
+        s._cache = cache
+        return s
+
+    def _cached(self, es, operation, body, func, trace):
+        """Return result of `func` if not cached yet for this request on this client, else cached result.
+
+        Time spent in cache (key hashing, lookup and storage) is recorded in "cache" phase of trace, and time
+        spent running `func` in "transport" phase.
+        """
+        if self._cache is None:
+            with trace.phase("transport"):
+                return func()
+        with trace.phase("cache"):
+            key = cache_key(
+                operation, self._index, body, self._params, client=client_identity(es)
+            )
+            result = self._cache.get(key)
+        if result is not None:
+            trace.cached = True
+            return result
+        with trace.phase("transport"):
+            result = func()
+        with trace.phase("cache"):
+            self._cache.set(key, result, index=self._index)
+        return result
+
     def _clone(self):
         s = self.__class__(using=self._using, index=self._index)
         s._params = self._params.copy()
+        s._cache = self._cache
         return s
 
 
-class Search(Request):
+class Search(AsyncSearchMixin, Request):
     def __init__(self, using=None, index=None, mapping=None):
         """
         Search request to elasticsearch.
@@ -106,7 +181,7 @@ class Search(Request):
         self._highlight_opts = {}
         self._suggest = {}
         self._script_fields = {}
-        mapping = Mapping(mapping)
+        mapping = mappings.get(mapping, index=index)
         self._mapping = mapping
         self._aggs = Aggs(mapping=mapping)
         self._query = Query(mapping=mapping)
@@ -162,6 +237,13 @@ class Search(Request):
 
     groupby.__doc__ = Aggs.groupby.__doc__
 
+    def as_composite(self, *args, **kwargs):
+        s = self._clone()
+        s._aggs = s._aggs.as_composite(*args, **kwargs)
+        return s
+
+    as_composite.__doc__ = Aggs.as_composite.__doc__
+
     def __iter__(self):
         """
         Iterate over the hits.
@@ -240,6 +322,7 @@ class Search(Request):
         """
         s = self.__class__(using=self._using, index=self._index, mapping=self._mapping)
         s._params = self._params.copy()
+        s._cache = self._cache
         s._sort = self._sort[:]
         s._source = copy.copy(self._source) if self._source is not None else None
         s._highlight = self._highlight.copy()
@@ -507,20 +590,70 @@ class Search(Request):
         Return the number of hits matching the query and filters. Note that
         only the actual number is returned.
         """
-        es = get_connection(self._using)
-
-        d = self.to_dict(count=True)
-        return es.count(index=self._index, body=d)["count"]
+        es = instrument_client(get_connection(self._using))
+        trace = ExecutionTrace(operation="count", index=self._index)
+        with tracing(trace):
+            with trace.phase("to_dict"):
+                d = self.to_dict(count=True)
+            trace.body = d
+            count = self._cached(
+                es,
+                "count",
+                d,
+                lambda: es.count(index=self._index, body=d)["count"],
+                trace=trace,
+            )
+        trace.counts["hits"] = count
+        hooks.emit("execute", trace)
+        return count
 
-    def execute(self):
+    def execute(self, stream=False):
         """
         Execute the search and return an instance of ``Response`` wrapping all
         the data.
-        """
-        es = get_connection(self._using)
-        return Response(es.search(index=self._index, body=self.to_dict()), search=self)
 
-    def scan(self):
+        :param stream: if True, the raw response body is not decoded at once, but
+            parsed incrementally: aggregations are only parsed on serialization,
+            one bucket at a time, which bounds memory usage on large
+            aggregations responses (requires ijson).
+            Streamed responses are not cached.
+
+        Durations of execution phases are recorded on ``Response.trace`` and
+        passed to ``pandagg.tracing.hooks``.
+        """
+        es = instrument_client(get_connection(self._using))
+        trace = ExecutionTrace(operation="search", index=self._index)
+        with tracing(trace):
+            with trace.phase("to_dict"):
+                body = self.to_dict()
+            trace.body = body
+            if not stream:
+                data = self._cached(
+                    es,
+                    "search",
+                    body,
+                    lambda: es.search(index=self._index, body=body),
+                    trace=trace,
+                )
+                with trace.phase("response"):
+                    response = Response(data, search=self, trace=trace)
+            else:
+                # body is left undecoded by instrumented client, for this request only
+                with trace.phase("transport"):
+                    undecoded = es.search(
+                        index=self._index,
+                        body=body,
+                        params={UNDECODED_RESPONSE_PARAM: True},
+                    )
+                with trace.phase("response"):
+                    response = Response(
+                        None, search=self, raw=undecoded.raw, trace=trace
+                    )
+        trace.counts["hits"] = len(response.hits)
+        hooks.emit("execute", trace)
+        return response
+
+    def scan(self, slices=None, workers=None, buffer_size=1000):
         """
         Turn the search into a scan search and return a generator that will
         iterate over all the documents matching the query.
@@ -529,12 +662,138 @@ class Search(Request):
         pass to the underlying ``scan`` helper from ``elasticsearch-py`` -
         https://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.scan
 
+        If ``slices`` is provided, the scroll is split in as many sliced scrolls,
+        consumed concurrently and merged into this single generator - see
+        https://www.elastic.co/guide/en/elasticsearch/reference/current/paginate-search-results.html#slice-scroll
+        Hits order is then not deterministic.
+
+        :arg slices: number of sliced scrolls, usually the number of shards of
+            targeted indices
+        :arg workers: number of slices consumed at the same time, defaults to
+            ``slices``
+        :arg buffer_size: maximum number of hits buffered per running slice
+            waiting to be consumed
         """
         es = get_connection(self._using)
 
-        for hit in scan(es, query=self.to_dict(), index=self._index):
+        if not slices or slices == 1:
+            for hit in scan(es, query=self.to_dict(), index=self._index):
+                yield hit
+            return
+
+        for hit in self._sliced_scan(
+            es, slices=slices, workers=workers or slices, buffer_size=buffer_size
+        ):
             yield hit
 
+    def _sliced_scan(self, es, slices, workers, buffer_size):
+        body = self.to_dict()
+        hits_queue = queue.Queue(maxsize=workers * buffer_size)
+        stop = threading.Event()
+
+        def put(item):
+            # don't block forever if the consumer stopped iterating
+            while not stop.is_set():
+                try:
+                    hits_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scan_slice(slice_id):
+            # consumer may have stopped while this slice was waiting for a worker:
+            # don't open a scroll context that would be left behind
+            if stop.is_set():
+                put(_SLICE_DONE)
+                return
+            slice_body = dict(body, slice={"id": slice_id, "max": slices})
+            slice_hits = scan(es, query=slice_body, index=self._index)
+            try:
+                for hit in slice_hits:
+                    if stop.is_set() or not put(hit):
+                        break
+            except Exception as e:
+                put(_SliceError(e))
+            finally:
+                slice_hits.close()
+                put(_SLICE_DONE)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for slice_id in range(slices):
+                executor.submit(scan_slice, slice_id)
+            remaining_slices = slices
+            while remaining_slices:
+                item = hits_queue.get()
+                if item is _SLICE_DONE:
+                    remaining_slices -= 1
+                elif isinstance(item, _SliceError):
+                    raise item.error
+                else:
+                    yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)
+
+    def iterate(self, page_size=1000, pit_keep_alive="1m", prefetch=True):
+        """
+        Return a generator iterating over all the documents matching the query,
+        using a point in time and ``search_after`` pagination - see
+        https://www.elastic.co/guide/en/elasticsearch/reference/current/paginate-search-results.html#search-after
+
+        Contrary to ``scan``, no scroll context is kept open on the cluster
+        between two pages, and documents are returned according to the search
+        sort. A ``_shard_doc`` tiebreaker is appended to sort (requires
+        elasticsearch>=7.12). Aggregations are not computed.
+
+        :arg page_size: number of hits fetched per request
+        :arg pit_keep_alive: time to keep the point in time alive between two
+            pages
+        :arg prefetch: if True, next page is requested while the current one
+            is being consumed
+        """
+        es = get_connection(self._using)
+
+        body = self.to_dict()
+        body.pop("from", None)
+        body.pop("aggs", None)
+        body["size"] = page_size
+        body["sort"] = list(body.get("sort", [])) + [{"_shard_doc": "asc"}]
+        body.setdefault("track_total_hits", False)
+
+        def fetch_page(pit_id, search_after):
+            page_body = dict(body, pit={"id": pit_id, "keep_alive": pit_keep_alive})
+            if search_after is not None:
+                page_body["search_after"] = search_after
+            return es.search(body=page_body)
+
+        pit = es.open_point_in_time(index=self._index, keep_alive=pit_keep_alive)
+        pit_id = pit["id"]
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            response = fetch_page(pit_id, None)
+            while True:
+                # point in time id may change between requests
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                is_last_page = len(hits) < page_size
+                next_page = None
+                if not is_last_page and executor is not None:
+                    next_page = executor.submit(fetch_page, pit_id, hits[-1]["sort"])
+                for hit in hits:
+                    yield hit
+                if is_last_page:
+                    return
+                if next_page is not None:
+                    response = next_page.result()
+                else:
+                    response = fetch_page(pit_id, hits[-1]["sort"])
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            es.close_point_in_time(body={"id": pit_id})
+
     def delete(self):
         """
         delete() executes the query by delegating to delete_by_query()
@@ -548,7 +807,7 @@ class Search(Request):
         return json.dumps(self.to_dict(), indent=2)
 
 
-class MultiSearch(Request):
+class MultiSearch(AsyncMultiSearchMixin, Request):
     """
     Combine multiple :class:`~elasticsearch_dsl.Search` objects into a single
     request.
@@ -582,8 +841,12 @@ class MultiSearch(Request):
         return ms
 
     def to_dict(self):
+        return self._to_dict(self._searches)
+
+    @staticmethod
+    def _to_dict(searches):
         out = []
-        for s in self._searches:
+        for s in searches:
             meta = {}
             if s._index:
                 meta["index"] = s._index
@@ -594,12 +857,69 @@ class MultiSearch(Request):
 
         return out
 
-    def execute(self):
-        """
-        Execute the multi search request and return a list of search results.
-        """
-        es = get_connection(self._using)
-        return es.msearch(index=self._index, body=self.to_dict(), **self._params)
+    def _batches(self, batch_size=None):
+        """Split searches in batches of at most `batch_size` searches, each one sent in a ``msearch`` request."""
+        searches = self._searches
+        batch_size = batch_size or max(len(searches), 1)
+        return [
+            searches[i : i + batch_size] for i in range(0, len(searches), batch_size)
+        ]
+
+    def _responses(self, batches_results, raise_on_error=True):
+        """Build ``Response`` objects from ``msearch`` responses of all batches."""
+        responses = []
+        for s, result in zip(
+            self._searches, (r for results in batches_results for r in results)
+        ):
+            if "error" in result:
+                if raise_on_error:
+                    raise TransportError(
+                        "N/A", result["error"]["type"], result["error"]
+                    )
+                responses.append(None)
+                continue
+            responses.append(Response(result, search=s))
+        return responses
+
+    def execute(self, batch_size=None, max_concurrent=None, raise_on_error=True):
+        """
+        Execute the multi search request and return a list of ``Response``
+        objects, one per search, in the same order as searches were added.
+
+        :arg batch_size: maximum number of searches per ``msearch`` request, by
+            default all searches are sent in a single request
+        :arg max_concurrent: maximum number of ``msearch`` requests running
+            concurrently, by default all batches run concurrently
+        :arg raise_on_error: if False, failed searches results are None
+            instead of raising a ``TransportError``
+        """
+        es = instrument_client(get_connection(self._using))
+        trace = ExecutionTrace(operation="msearch", index=self._index)
+        with tracing(trace):
+            with trace.phase("to_dict"):
+                bodies = [self._to_dict(batch) for batch in self._batches(batch_size)]
+            trace.body = [line for body in bodies for line in body]
+
+            def msearch(body):
+                response = es.msearch(index=self._index, body=body, **self._params)
+                return response["responses"]
+
+            workers = min(max_concurrent or len(bodies), len(bodies))
+            with trace.phase("transport"):
+                if workers <= 1:
+                    batches_results = [msearch(body) for body in bodies]
+                else:
+                    # requests running in other threads are out of trace context: their encoding and decoding
+                    # are counted in transport phase
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        batches_results = list(executor.map(msearch, bodies))
+            with trace.phase("response"):
+                responses = self._responses(
+                    batches_results, raise_on_error=raise_on_error
+                )
+        trace.counts["hits"] = sum(len(r.hits) for r in responses if r is not None)
+        hooks.emit("execute", trace)
+        return responses
 
     def __repr__(self):
         return json.dumps(self.to_dict(), indent=2)
@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Generation of synthetic, yet structurally valid, elasticsearch aggregations responses, to measure parsing
+performance without any cluster::
+
+    aggs = Aggs(mapping=MAPPING).groupby(["classification_type", "global_metrics.field.name"])
+    generator = AggsResponseGenerator(aggs, cardinality={"classification_type": 1000}, seed=0)
+    generator.generate()  # aggregations part of response, as dict
+    generator.write("/tmp/response.json")  # whole search response, streamed to disk
+"""
+
+from __future__ import unicode_literals
+
+import datetime
+import io
+import json
+import random
+import re
+
+from future.utils import string_types
+
+from pandagg.exceptions import AbsentMappingFieldError
+from pandagg.node.aggs.abstract import (
+    MetricAgg,
+    Pipeline,
+    ShadowRoot,
+    UniqueBucketAgg,
+)
+from pandagg.node.aggs.bucket import (
+    Composite,
+    DateHistogram,
+    DateRange,
+    Filters,
+    Histogram,
+    Range,
+)
+from pandagg.tree.aggs import Aggs
+from pandagg.tree.mapping import mappings
+
+EPOCH = datetime.datetime(1970, 1, 1)
+# first date bucket of generated date histograms
+START_DATE = datetime.datetime(2020, 1, 1)
+
+_DAY_MS = 24 * 3600 * 1000
+# approximate duration in milliseconds of intervals units
+_INTERVAL_UNITS_MS = {
+    "ms": 1,
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 3600 * 1000,
+    "d": _DAY_MS,
+    "w": 7 * _DAY_MS,
+    "M": 30 * _DAY_MS,
+    "q": 91 * _DAY_MS,
+    "y": 365 * _DAY_MS,
+}
+_CALENDAR_INTERVALS = {
+    "minute": "1m",
+    "hour": "1h",
+    "day": "1d",
+    "week": "1w",
+    "month": "1M",
+    "quarter": "1q",
+    "year": "1y",
+}
+_INTERVAL_PATTERN = re.compile(r"^(\d+)(ms|s|m|h|d|w|M|q|y)$")
+
+# number of composite buckets per page if not specified, as in elasticsearch
+COMPOSITE_DEFAULT_SIZE = 10
+
+_INTEGER_TYPES = ("long", "integer", "short", "byte", "unsigned_long")
+_FLOAT_TYPES = ("double", "float", "half_float", "scaled_float")
+
+
+def interval_ms(interval):
+    """Return approximate duration in milliseconds of a date histogram interval (days if not parsable)."""
+    interval = _CALENDAR_INTERVALS.get(interval, interval)
+    match = _INTERVAL_PATTERN.match(interval or "")
+    if match is None:
+        return _DAY_MS
+    return int(match.group(1)) * _INTERVAL_UNITS_MS[match.group(2)]
+
+
+def _date_as_string(epoch_ms):
+    date = EPOCH + datetime.timedelta(milliseconds=epoch_ms)
+    return date.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (date.microsecond // 1000)
+
+
+class AggsResponseGenerator(object):
+    """Generate raw responses of an aggregations clause, with configurable number of buckets per aggregation.
+
+    Bucket keys are typed after the mapping type of aggregated fields when mapping is available, and doc counts
+    are consistent: buckets are sorted by decreasing doc count, and don't exceed their parent bucket doc count.
+    Composite aggregations are paginated according to their ``size`` and ``after`` parameters.
+
+    Responses are generated as a stream of JSON chunks, bucket by bucket, so that responses of any size can be
+    written to disk without being built in memory.
+    """
+
+    def __init__(self, aggs, mapping=None, cardinality=10, doc_count=100000, seed=None):
+        """
+        :param aggs: aggregations clause, as ``Aggs`` instance or dict
+        :param mapping: mapping used to type bucket keys, defaults to `aggs` mapping
+        :param cardinality: number of buckets generated per multi-bucket aggregation, either an int applied to all
+            aggregations, or a dict of aggregation name -> number of buckets (others having 10 buckets)
+        :param doc_count: number of documents matched by the query
+        :param seed: random seed, so that generated responses are reproducible
+        """
+        if not isinstance(aggs, Aggs):
+            aggs = Aggs(aggs, mapping=mapping)
+        self.aggs = aggs
+        self.mapping = mappings.get(mapping) if mapping is not None else aggs.mapping
+        self.cardinality = cardinality
+        self.doc_count = doc_count
+        self.seed = seed
+        self._random = random.Random(seed)
+        # number of buckets -> sum of their doc counts weights
+        self._total_weights = {}
+
+    def _cardinality(self, agg_node):
+        if isinstance(self.cardinality, dict):
+            return self.cardinality.get(agg_node.name, 10)
+        return self.cardinality
+
+    def _field_type(self, agg_node):
+        field = getattr(agg_node, "field", None)
+        if not field or not self.mapping:
+            return None
+        try:
+            return self.mapping.mapping_type_of_field(field)
+        except AbsentMappingFieldError:
+            return None
+
+    def _iter_doc_counts(self, nb, parent_doc_count, start=0, stop=None):
+        """Yield decreasing doc counts of buckets from position `start` to `stop` (excluded) out of `nb` buckets,
+        whose sum doesn't exceed parent doc count. Doc counts follow a jittered harmonic distribution, so that they
+        are generated one at a time.
+        """
+        total = self._total_weights.get(nb)
+        if total is None:
+            total = self._total_weights[nb] = (
+                sum(1.0 / (i + 1) for i in range(nb)) or 1.0
+            )
+        stop = nb if stop is None else min(stop, nb)
+        for i in range(start, stop):
+            # weight in ]1/(i+2), 1/(i+1)], so that weights are decreasing
+            high, low = 1.0 / (i + 1), 1.0 / (i + 2)
+            weight = low + (high - low) * (1.0 - self._random.random())
+            yield max(
+                int(parent_doc_count * weight / total),
+                0 if parent_doc_count == 0 else 1,
+            )
+
+    def _terms_key(self, agg_node, position):
+        """Return (key, key_as_string) of bucket at `position` of a terms-like aggregation."""
+        field_type = self._field_type(agg_node)
+        if field_type in _INTEGER_TYPES:
+            return position, None
+        if field_type in _FLOAT_TYPES:
+            return position + 0.5, None
+        if field_type == "boolean":
+            return position % 2, "true" if position % 2 else "false"
+        if field_type in ("date", "date_nanos"):
+            key = int(
+                (START_DATE - EPOCH).total_seconds() * 1000 + position * _DAY_MS
+            )
+            return key, _date_as_string(key)
+        if field_type == "ip":
+            return "10.0.%d.%d" % (position // 256 % 256, position % 256), None
+        return "%s_%d" % (agg_node.name, position), None
+
+    def _terms_position(self, agg_node, key):
+        """Return position of bucket of given key in a terms-like aggregation (inverse of `_terms_key`), or None
+        if it can't be told from key."""
+        field_type = self._field_type(agg_node)
+        try:
+            if field_type in _INTEGER_TYPES:
+                return int(key)
+            if field_type in _FLOAT_TYPES:
+                return int(key - 0.5)
+            if field_type == "boolean":
+                return None
+            if field_type in ("date", "date_nanos"):
+                start = (START_DATE - EPOCH).total_seconds() * 1000
+                return int((key - start) // _DAY_MS)
+            if field_type == "ip":
+                high, low = key.split(".")[-2:]
+                return int(high) * 256 + int(low)
+            prefix = "%s_" % agg_node.name
+            if key.startswith(prefix):
+                return int(key[len(prefix) :])
+        except (AttributeError, TypeError, ValueError):
+            pass
+        return None
+
+    def _composite_key(self, agg_node, position):
+        return {
+            source_node.name: self._terms_key(source_node, position)[0]
+            for source_node in agg_node._source_nodes
+        }
+
+    def _composite_start(self, agg_node, nb):
+        """Return position of first bucket of requested composite aggregation page: the one following `after`
+        key if provided."""
+        after = agg_node.after
+        if not after:
+            return 0
+        source_node = agg_node._source_nodes[0]
+        position = self._terms_position(source_node, after.get(source_node.name))
+        if position is None or self._composite_key(agg_node, position) != after:
+            # not invertible: look for it
+            position = next(
+                (p for p in range(nb) if self._composite_key(agg_node, p) == after),
+                nb,
+            )
+        return position + 1
+
+    def _metric_value(self, agg_node, doc_count):
+        """Return raw response of a metric (or pipeline) aggregation."""
+        attrs = agg_node.VALUE_ATTRS or ["value"]
+        if isinstance(attrs, string_types):
+            attrs = [attrs]
+        # consistent statistics: min <= avg <= max, sum = avg * count
+        low, high = sorted(round(self._random.random() * 100, 4) for _ in range(2))
+        avg = round(low + (high - low) * self._random.random(), 4)
+        stats = {"min": low, "max": high, "avg": avg, "sum": round(avg * doc_count, 4)}
+        value = {}
+        for attr in attrs:
+            if attr == "hits":
+                value[attr] = {
+                    "total": {"value": doc_count, "relation": "eq"},
+                    "max_score": None,
+                    "hits": [],
+                }
+            elif attr == "values":
+                percents = agg_node.body.get("percents") or agg_node.body.get(
+                    "values", [1.0, 5.0, 25.0, 50.0, 75.0, 95.0, 99.0]
+                )
+                values = sorted(
+                    round(self._random.random() * 100, 4) for _ in percents
+                )
+                value[attr] = {
+                    "%s" % float(p): v for p, v in zip(sorted(percents), values)
+                }
+            elif attr == "bounds":
+                value[attr] = {
+                    "top_left": {"lat": 48.86, "lon": 2.32},
+                    "bottom_right": {"lat": 48.84, "lon": 2.36},
+                }
+            elif attr == "location":
+                value[attr] = {"lat": 48.85, "lon": 2.34}
+                value["count"] = doc_count
+            elif attr == "count":
+                value[attr] = doc_count
+            elif attr in stats:
+                value[attr] = stats[attr]
+            else:
+                value[attr] = round(self._random.random() * 100, 4)
+        return value
+
+    def _iter_buckets(self, agg_node, doc_count):
+        """Yield (key for keyed response or None, bucket properties) of a multi-bucket aggregation, one bucket at
+        a time."""
+        if isinstance(agg_node, Filters):
+            names = sorted(agg_node.filters.keys())
+            if agg_node.other_bucket:
+                names.append(agg_node.other_bucket_key or agg_node.DEFAULT_OTHER_KEY)
+            doc_counts = self._iter_doc_counts(len(names), doc_count)
+            for name, count in zip(names, doc_counts):
+                yield name, {"doc_count": count}
+            return
+
+        if isinstance(agg_node, Range):
+            doc_counts = self._iter_doc_counts(len(agg_node.ranges), doc_count)
+            for range_, count in zip(agg_node.ranges, doc_counts):
+                bucket = {}
+                for bound in ("from", "to"):
+                    if bound in range_:
+                        bucket[bound] = range_[bound]
+                        if isinstance(agg_node, DateRange) or agg_node.keyed:
+                            bucket["%s_as_string" % bound] = "%s" % range_[bound]
+                key = range_.get("key") or agg_node._extract_bucket_key(bucket)
+                bucket["key"] = key
+                bucket["doc_count"] = count
+                yield key, bucket
+            return
+
+        nb = self._cardinality(agg_node)
+        start, stop = 0, nb
+        if isinstance(agg_node, Composite):
+            start = self._composite_start(agg_node, nb)
+            stop = start + (agg_node.size or COMPOSITE_DEFAULT_SIZE)
+        doc_counts = self._iter_doc_counts(nb, doc_count, start=start, stop=stop)
+        for position, count in enumerate(doc_counts, start):
+            if isinstance(agg_node, Composite):
+                key = self._composite_key(agg_node, position)
+                bucket = {"key": key, "doc_count": count}
+            elif isinstance(agg_node, DateHistogram):
+                key = int(
+                    (START_DATE - EPOCH).total_seconds() * 1000
+                    + position * interval_ms(agg_node.interval)
+                )
+                bucket = {
+                    "key_as_string": _date_as_string(key),
+                    "key": key,
+                    "doc_count": count,
+                }
+            elif isinstance(agg_node, Histogram):
+                bucket = {
+                    "key": float(position * agg_node.interval),
+                    "doc_count": count,
+                }
+            else:
+                key, key_as_string = self._terms_key(agg_node, position)
+                bucket = {"key": key}
+                if key_as_string is not None:
+                    bucket["key_as_string"] = key_as_string
+                bucket["doc_count"] = count
+            response_key = None
+            if agg_node.keyed:
+                response_key = bucket.get("key_as_string", "%s" % bucket["key"])
+            yield response_key, bucket
+
+    def _iter_agg_json(self, agg_node, doc_count):
+        """Yield JSON chunks of raw response of given aggregation."""
+        if isinstance(agg_node, MetricAgg) or (
+            agg_node.VALUE_ATTRS is not None
+            and "doc_count" not in agg_node.VALUE_ATTRS
+        ):
+            yield json.dumps(self._metric_value(agg_node, doc_count))
+            return
+
+        if isinstance(agg_node, UniqueBucketAgg):
+            count = next(self._iter_doc_counts(1, doc_count))
+            for chunk in self._iter_bucket_json(agg_node, {"doc_count": count}):
+                yield chunk
+            return
+
+        if agg_node.KEY == "terms":
+            yield '{"doc_count_error_upper_bound": 0, "sum_other_doc_count": 0, '
+        else:
+            yield "{"
+        yield '"buckets": '
+        yield "{" if agg_node.keyed else "["
+        bucket = None
+        for i, (response_key, bucket) in enumerate(
+            self._iter_buckets(agg_node, doc_count)
+        ):
+            if i:
+                yield ", "
+            if agg_node.keyed:
+                yield "%s: " % json.dumps(response_key)
+            for chunk in self._iter_bucket_json(agg_node, bucket):
+                yield chunk
+        yield "}" if agg_node.keyed else "]"
+        if isinstance(agg_node, Composite) and bucket is not None:
+            # last page is followed by an empty one, without after_key
+            yield ', "after_key": %s' % json.dumps(bucket["key"])
+        yield "}"
+
+    def _iter_bucket_json(self, agg_node, bucket):
+        """Yield JSON chunks of bucket, with its children aggregations responses."""
+        # drop closing brace of bucket properties to append children aggregations
+        yield json.dumps(bucket)[:-1]
+        for child in self.aggs.children(agg_node.name, id_only=False):
+            if isinstance(child, Pipeline) and child.VALUE_ATTRS is None:
+                # bucket_selector, bucket_sort: no response of their own
+                continue
+            yield ", %s: " % json.dumps(child.name)
+            for chunk in self._iter_agg_json(child, bucket["doc_count"]):
+                yield chunk
+        yield "}"
+
+    def iter_json(self):
+        """Yield JSON chunks of aggregations part of response."""
+        self._random.seed(self.seed)
+        if self.aggs.root is None:
+            yield "{}"
+            return
+        root = self.aggs.get(self.aggs.root)
+        if isinstance(root, ShadowRoot):
+            agg_nodes = self.aggs.children(root.name, id_only=False)
+        else:
+            agg_nodes = [root]
+        yield "{"
+        for i, agg_node in enumerate(agg_nodes):
+            if i:
+                yield ", "
+            yield "%s: " % json.dumps(agg_node.name)
+            for chunk in self._iter_agg_json(agg_node, self.doc_count):
+                yield chunk
+        yield "}"
+
+    def generate(self):
+        """Return aggregations part of response, as dict."""
+        return json.loads("".join(self.iter_json()))
+
+    def write(self, f, took=10):
+        """Write whole search response (with aggregations, and without hits) in JSON to given file or path,
+        streaming it chunk by chunk.
+
+        :param f: path, or file object opened in text mode
+        """
+        if isinstance(f, string_types):
+            with io.open(f, "w", encoding="utf-8") as fd:
+                return self.write(fd, took=took)
+        f.write(
+            '{"took": %d, "timed_out": false, '
+            '"_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}, '
+            '"hits": {"total": {"value": %d, "relation": "eq"}, "max_score": null, "hits": []}, '
+            '"aggregations": ' % (took, self.doc_count)
+        )
+        for chunk in self.iter_json():
+            f.write(chunk)
+        f.write("}")
+
+
+def generate_aggs_response(aggs, mapping=None, cardinality=10, seed=None):
+    """Return generated aggregations part of response of given aggregations, see ``AggsResponseGenerator``."""
+    return AggsResponseGenerator(
+        aggs, mapping=mapping, cardinality=cardinality, seed=seed
+    ).generate()
@@ -0,0 +1,624 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""In-process stand-in of an elasticsearch cluster, serving requests over in-memory documents, so that execution
+paths (``Search.execute``, ``count``, ``scan``, ``MultiSearch.execute``, ``IResponse.list_documents``...) can be
+tested and benchmarked end to end without any cluster::
+
+    cluster = InMemoryCluster(latency=0.005)
+    cluster.create_index("movies", mapping=MOVIES_MAPPING)
+    cluster.index_documents("movies", documents)
+    client = cluster.client()
+    Search(using=client, index="movies").filter("term", genres="Drama").execute()
+
+Requests go through the whole elasticsearch-py client (serialization, transport, deserialization), only the HTTP
+round-trip being replaced by an ``InMemoryConnection``. ``InMemoryCluster.serve`` also exposes the cluster through
+a local HTTP server, so that network framing is measured as well.
+
+Supported endpoints are ``/``, ``_search`` (with scroll), ``_search/scroll``, ``_count``, ``_msearch``,
+``_mapping``, ``_alias`` and index details. Queries are evaluated on documents sources (``bool``, ``term``,
+``terms``, ``range``, ``exists``, ``ids``, ``prefix``, ``wildcard``, ``match``, ``match_phrase``, ``nested``,
+``constant_score``), without any scoring: all hits have a score of 1. Aggregations responses are synthetic (see
+``pandagg.synthetic``), their top-level doc counts matching the number of hits. Composite aggregations are
+paginated following their ``size`` and ``after`` parameters, out of ``aggs_cardinality`` buckets, the last page
+being followed by an empty one without ``after_key``.
+"""
+
+from __future__ import unicode_literals
+
+import fnmatch
+import json
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from elasticsearch import Connection, Elasticsearch
+from future.utils import iteritems, string_types, text_type
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qsl, unquote, urlparse
+
+from pandagg.synthetic import AggsResponseGenerator
+from pandagg.tree.aggs import Aggs
+
+RESPONSE_HEADERS = {
+    "content-type": "application/json; charset=UTF-8",
+    # required by elasticsearch-py product check
+    "x-elastic-product": "Elasticsearch",
+}
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class RequestError(Exception):
+    """Error returned as elasticsearch error response, with given status."""
+
+    def __init__(self, status, type_, reason):
+        super(RequestError, self).__init__(reason)
+        self.status = status
+        self.type = type_
+        self.reason = reason
+
+    def to_dict(self):
+        error = {"type": self.type, "reason": self.reason}
+        return {
+            "error": dict(error, root_cause=[error]),
+            "status": self.status,
+        }
+
+
+def _load_body(body):
+    if body is None or body == b"" or body == "":
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    if isinstance(body, string_types):
+        return json.loads(body)
+    return body
+
+
+def _iter_ndjson(body):
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    for line in body.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def _as_term(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return text_type(value)
+
+
+def _field_values(source, field):
+    """Return list of values of field (dot-separated path) in document source, arrays being flattened."""
+    values = [source]
+    for part in field.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                child = value[part]
+                next_values.extend(child if isinstance(child, list) else [child])
+            elif isinstance(value, list):
+                next_values.extend(
+                    v[part] for v in value if isinstance(v, dict) and part in v
+                )
+        values = next_values
+    values = [v for v in values if v is not None]
+    if not values and "." in field:
+        # multi-field, as "name.keyword"
+        parent, _ = field.rsplit(".", 1)
+        return [
+            v for v in _field_values(source, parent) if not isinstance(v, dict)
+        ]
+    return values
+
+
+def _field_clause(body, value_key):
+    """Return (field, params) of "<field>: value" or "<field>: {params}" query bodies."""
+    fields = [k for k in body if k not in ("boost", "_name")]
+    if len(fields) != 1:
+        raise RequestError(
+            400, "parsing_exception", "query must target exactly one field"
+        )
+    field = fields[0]
+    params = body[field]
+    if not isinstance(params, dict):
+        params = {value_key: params}
+    return field, params
+
+
+def _compare(value, bound):
+    try:
+        return (value > bound) - (value < bound)
+    except TypeError:
+        try:
+            return (float(value) > float(bound)) - (float(value) < float(bound))
+        except (TypeError, ValueError):
+            return None
+
+
+class QueryMatcher(object):
+    """Evaluate query clauses on documents sources."""
+
+    def match(self, query, doc_id, source):
+        if not query:
+            return True
+        if not isinstance(query, dict) or len(query) != 1:
+            raise RequestError(
+                400, "parsing_exception", "query malformed, expected a single key"
+            )
+        kind, body = next(iter(query.items()))
+        method = getattr(self, "_match_%s" % kind, None)
+        if method is None:
+            raise RequestError(400, "parsing_exception", "unknown query [%s]" % kind)
+        return method(body, doc_id, source)
+
+    def _match_match_all(self, body, doc_id, source):
+        return True
+
+    def _match_match_none(self, body, doc_id, source):
+        return False
+
+    def _match_term(self, body, doc_id, source):
+        field, params = _field_clause(body, "value")
+        term = _as_term(params["value"])
+        return any(_as_term(v) == term for v in _field_values(source, field))
+
+    def _match_terms(self, body, doc_id, source):
+        field, terms = _field_clause(body, "value")
+        terms = {_as_term(t) for t in terms}
+        return any(_as_term(v) in terms for v in _field_values(source, field))
+
+    def _match_range(self, body, doc_id, source):
+        field, params = _field_clause(body, "value")
+        for value in _field_values(source, field):
+            matches = True
+            for operator, accepted in (
+                ("gt", (1,)),
+                ("gte", (0, 1)),
+                ("lt", (-1,)),
+                ("lte", (-1, 0)),
+            ):
+                if operator in params and params[operator] is not None:
+                    if _compare(value, params[operator]) not in accepted:
+                        matches = False
+                        break
+            if matches:
+                return True
+        return False
+
+    def _match_exists(self, body, doc_id, source):
+        return bool(_field_values(source, body["field"]))
+
+    def _match_ids(self, body, doc_id, source):
+        return doc_id in body["values"]
+
+    def _match_prefix(self, body, doc_id, source):
+        field, params = _field_clause(body, "value")
+        prefix = _as_term(params["value"])
+        return any(_as_term(v).startswith(prefix) for v in _field_values(source, field))
+
+    def _match_wildcard(self, body, doc_id, source):
+        field, params = _field_clause(body, "value")
+        pattern = params.get("value", params.get("wildcard"))
+        return any(
+            fnmatch.fnmatchcase(_as_term(v), pattern)
+            for v in _field_values(source, field)
+        )
+
+    def _match_match(self, body, doc_id, source):
+        field, params = _field_clause(body, "query")
+        tokens = set(_TOKEN_PATTERN.findall(_as_term(params["query"]).lower()))
+        doc_tokens = set()
+        for value in _field_values(source, field):
+            doc_tokens.update(_TOKEN_PATTERN.findall(_as_term(value).lower()))
+        if params.get("operator", "or").lower() == "and":
+            return tokens <= doc_tokens
+        return bool(tokens & doc_tokens)
+
+    def _match_match_phrase(self, body, doc_id, source):
+        field, params = _field_clause(body, "query")
+        phrase = _as_term(params["query"]).lower()
+        return any(phrase in _as_term(v).lower() for v in _field_values(source, field))
+
+    def _match_nested(self, body, doc_id, source):
+        # evaluated on whole document: clauses may match distinct nested objects
+        return self.match(body["query"], doc_id, source)
+
+    def _match_constant_score(self, body, doc_id, source):
+        return self.match(body["filter"], doc_id, source)
+
+    def _match_bool(self, body, doc_id, source):
+        def clauses(occurrence):
+            value = body.get(occurrence) or []
+            return value if isinstance(value, list) else [value]
+
+        for occurrence in ("filter", "must"):
+            if not all(self.match(q, doc_id, source) for q in clauses(occurrence)):
+                return False
+        if any(self.match(q, doc_id, source) for q in clauses("must_not")):
+            return False
+        should = clauses("should")
+        if not should:
+            return True
+        default_minimum = 0 if clauses("filter") or clauses("must") else 1
+        minimum = int(body.get("minimum_should_match", default_minimum))
+        return sum(1 for q in should if self.match(q, doc_id, source)) >= minimum
+
+
+class InMemoryCluster(object):
+    """In-memory documents indices, answering elasticsearch REST requests."""
+
+    VERSION = "7.17.0"
+
+    def __init__(self, latency=0.0, aggs_cardinality=10, seed=0):
+        """
+        :param latency: time in seconds spent on each request, simulating network and cluster processing time
+        :param aggs_cardinality: number of buckets of aggregations, see ``AggsResponseGenerator``
+        :param seed: random seed of generated aggregations responses
+        """
+        self.latency = latency
+        self.aggs_cardinality = aggs_cardinality
+        self.seed = seed
+        self.matcher = QueryMatcher()
+        # index name -> {"mappings", "settings", "aliases", "docs": OrderedDict of id -> source}
+        self._indices = OrderedDict()
+        # scroll id -> list of remaining hits
+        self._scrolls = {}
+        self._lock = threading.Lock()
+        self.nb_requests = 0
+
+    def create_index(self, name, mapping=None, settings=None, aliases=None):
+        self._indices[name] = {
+            "mappings": mapping or {},
+            "settings": settings or {"index": {"number_of_shards": "1"}},
+            "aliases": {alias: {} for alias in aliases or []},
+            "docs": OrderedDict(),
+        }
+
+    def index_documents(self, index, documents, ids=None):
+        """Add documents sources to index (created if absent), ids defaulting to their position in index."""
+        if index not in self._indices:
+            self.create_index(index)
+        docs = self._indices[index]["docs"]
+        with self._lock:
+            if ids is None:
+                ids = ("%d" % i for i in range(len(docs), len(docs) + len(documents)))
+            for doc_id, source in zip(ids, documents):
+                docs[doc_id] = source
+
+    def client(self, latency=None, **kwargs):
+        """Return elasticsearch client bound to this cluster through an ``InMemoryConnection``.
+
+        :param latency: overrides cluster latency for requests of this client
+        """
+        return Elasticsearch(
+            connection_class=InMemoryConnection, cluster=self, latency=latency, **kwargs
+        )
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Serve cluster over HTTP in a background thread. Return server, whose ``url`` attribute can be used as
+        client host, and that is stopped with ``shutdown``."""
+        server = _HTTPServer((host, port), _RequestHandler)
+        server.cluster = self
+        server.url = "http://%s:%d" % server.server_address[:2]
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def perform_request(self, method, url, params=None, body=None, latency=None):
+        """Return (status, raw JSON response) of REST request."""
+        start = time.time()
+        self.nb_requests += 1
+        try:
+            status, response = 200, self._dispatch(method, url, params or {}, body)
+        except RequestError as e:
+            status, response = e.status, e.to_dict()
+        if isinstance(response, dict) and "took" in response:
+            response["took"] = int((time.time() - start) * 1000)
+        latency = self.latency if latency is None else latency
+        if latency:
+            time.sleep(latency)
+        return status, json.dumps(response)
+
+    def _dispatch(self, method, url, params, body):
+        parts = [unquote(p) for p in url.split("?")[0].split("/") if p]
+        if not parts:
+            return {
+                "name": "in-memory",
+                "cluster_name": "in-memory",
+                "version": {"number": self.VERSION, "build_flavor": "default"},
+                "tagline": "You Know, for Search",
+            }
+        if parts[:2] == ["_search", "scroll"]:
+            scroll_id = parts[2] if len(parts) > 2 else None
+            if method == "DELETE":
+                return self._clear_scroll(scroll_id, _load_body(body), params)
+            return self._scroll(scroll_id, _load_body(body), params)
+
+        index = None
+        if not parts[0].startswith("_"):
+            index = parts.pop(0)
+        endpoint = parts[0] if parts else None
+        if endpoint == "_search":
+            return self._search(index, _load_body(body), params)
+        if endpoint == "_count":
+            return self._count(index, _load_body(body))
+        if endpoint == "_msearch":
+            return self._msearch(index, body, params)
+        if endpoint == "_mapping":
+            return {
+                name: {"mappings": self._indices[name]["mappings"]}
+                for name in self._resolve(index)
+            }
+        if endpoint in ("_alias", "_aliases"):
+            return {
+                name: {"aliases": self._indices[name]["aliases"]}
+                for name in self._resolve(index)
+            }
+        if endpoint is None and index is not None and method == "GET":
+            return {
+                name: {
+                    "aliases": self._indices[name]["aliases"],
+                    "mappings": self._indices[name]["mappings"],
+                    "settings": self._indices[name]["settings"],
+                }
+                for name in self._resolve(index)
+            }
+        raise RequestError(
+            400,
+            "illegal_argument_exception",
+            "unsupported request [%s %s]" % (method, url),
+        )
+
+    def _resolve(self, index):
+        """Return names of indices targeted by comma-separated list of index names, aliases or patterns."""
+        if index in (None, "", "_all", "*"):
+            return list(self._indices)
+        names = []
+        for expression in index.split(","):
+            matched = [
+                name
+                for name, detail in iteritems(self._indices)
+                if fnmatch.fnmatchcase(name, expression)
+                or any(fnmatch.fnmatchcase(a, expression) for a in detail["aliases"])
+            ]
+            if not matched and "*" not in expression:
+                raise RequestError(
+                    404, "index_not_found_exception", "no such index [%s]" % expression
+                )
+            names.extend(n for n in matched if n not in names)
+        return names
+
+    def _matching_hits(self, index, query, slice_=None):
+        hits = []
+        for name in self._resolve(index):
+            for position, (doc_id, source) in enumerate(
+                iteritems(self._indices[name]["docs"])
+            ):
+                if slice_ and position % slice_["max"] != slice_["id"]:
+                    continue
+                if self.matcher.match(query, doc_id, source):
+                    hits.append(
+                        {
+                            "_index": name,
+                            "_type": "_doc",
+                            "_id": doc_id,
+                            "_score": 1.0,
+                            "_source": source,
+                        }
+                    )
+        return hits
+
+    @staticmethod
+    def _sort(hits, sort):
+        if isinstance(sort, (string_types, dict)):
+            sort = [sort]
+        keys = []
+        for clause in sort:
+            if isinstance(clause, dict):
+                field, order = next(iter(clause.items()))
+                if isinstance(order, dict):
+                    order = order.get("order", "asc")
+            else:
+                field, order = clause, "desc" if clause == "_score" else "asc"
+            keys.append((field, order == "desc"))
+
+        def sort_values(hit):
+            values = []
+            for field, _ in keys:
+                if field == "_score":
+                    values.append(hit["_score"])
+                elif field in ("_doc", "_shard_doc"):
+                    values.append(hit["_position"])
+                else:
+                    field_values = _field_values(hit["_source"], field)
+                    values.append(field_values[0] if field_values else None)
+            return values
+
+        for position, hit in enumerate(hits):
+            hit["_position"] = position
+            hit["sort"] = sort_values(hit)
+        # stable sorts, from last sort key to first one, missing values last
+        for i, (_, reverse) in reversed(list(enumerate(keys))):
+            present = [h for h in hits if h["sort"][i] is not None]
+            missing = [h for h in hits if h["sort"][i] is None]
+            present.sort(key=lambda h: h["sort"][i], reverse=reverse)
+            hits = present + missing
+        for hit in hits:
+            del hit["_position"]
+        return hits
+
+    def _aggregations(self, index, aggs, doc_count):
+        indices = self._resolve(index)
+        mapping = self._indices[indices[0]]["mappings"] if len(indices) == 1 else None
+        response = {}
+        # one tree per top-level aggregation; composite "size" and "after" parameters are part of clauses, so
+        # that the generator returns requested page
+        for name, clause in iteritems(aggs):
+            response.update(
+                AggsResponseGenerator(
+                    Aggs({name: clause}, mapping=mapping or None),
+                    cardinality=self.aggs_cardinality,
+                    doc_count=doc_count,
+                    seed=self.seed,
+                ).generate()
+            )
+        return response
+
+    @staticmethod
+    def _shards():
+        return {"total": 1, "successful": 1, "skipped": 0, "failed": 0}
+
+    def _search(self, index, body, params):
+        body = body or {}
+        hits = self._matching_hits(index, body.get("query"), body.get("slice"))
+        total = len(hits)
+        if body.get("sort"):
+            hits = self._sort(hits, body["sort"])
+        from_ = int(body.get("from", params.get("from", 0)))
+        size = int(body.get("size", params.get("size", 10)))
+        response = {
+            "took": 0,
+            "timed_out": False,
+            "_shards": self._shards(),
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": 1.0 if total else None,
+                "hits": hits[from_ : from_ + size],
+            },
+        }
+        aggs = body.get("aggs", body.get("aggregations"))
+        if aggs:
+            response["aggregations"] = self._aggregations(index, aggs, total)
+        if params.get("scroll"):
+            scroll_id = uuid.uuid4().hex
+            with self._lock:
+                self._scrolls[scroll_id] = (hits[from_ + size :], size)
+            response["_scroll_id"] = scroll_id
+        return response
+
+    def _scroll(self, scroll_id, body, params):
+        body = body or {}
+        scroll_id = body.get("scroll_id") or params.get("scroll_id") or scroll_id
+        with self._lock:
+            if scroll_id not in self._scrolls:
+                raise RequestError(
+                    404,
+                    "search_context_missing_exception",
+                    "No search context found for id [%s]" % scroll_id,
+                )
+            remaining, size = self._scrolls[scroll_id]
+            self._scrolls[scroll_id] = (remaining[size:], size)
+        return {
+            "_scroll_id": scroll_id,
+            "took": 0,
+            "timed_out": False,
+            "_shards": self._shards(),
+            "hits": {
+                "total": {"value": len(remaining), "relation": "eq"},
+                "max_score": None,
+                "hits": remaining[:size],
+            },
+        }
+
+    def _clear_scroll(self, scroll_id, body, params):
+        scroll_ids = (body or {}).get("scroll_id") or scroll_id or []
+        if isinstance(scroll_ids, string_types):
+            scroll_ids = scroll_ids.split(",")
+        num_freed = 0
+        with self._lock:
+            for scroll_id in scroll_ids:
+                if self._scrolls.pop(scroll_id, None) is not None:
+                    num_freed += 1
+        return {"succeeded": True, "num_freed": num_freed}
+
+    def _count(self, index, body):
+        query = (body or {}).get("query")
+        return {
+            "count": len(self._matching_hits(index, query)),
+            "_shards": self._shards(),
+        }
+
+    def _msearch(self, index, body, params):
+        lines = list(_iter_ndjson(body))
+        responses = []
+        for header, search_body in zip(lines[::2], lines[1::2]):
+            search_index = header.get("index", index)
+            if isinstance(search_index, list):
+                search_index = ",".join(search_index)
+            try:
+                response = self._search(search_index, search_body, header)
+                response["status"] = 200
+            except RequestError as e:
+                response = e.to_dict()
+            responses.append(response)
+        return {"took": 0, "responses": responses}
+
+
+class InMemoryConnection(Connection):
+    """elasticsearch-py connection sending requests to an ``InMemoryCluster`` instead of HTTP. Built by
+    elasticsearch-py transport, use ``InMemoryCluster.client`` to get a client using it."""
+
+    def __init__(self, cluster=None, latency=None, **kwargs):
+        super(InMemoryConnection, self).__init__(**kwargs)
+        self.cluster = cluster
+        self.latency = latency
+
+    def perform_request(
+        self,
+        method,
+        url,
+        params=None,
+        body=None,
+        timeout=None,
+        ignore=(),
+        headers=None,
+    ):
+        full_url = "%s%s" % (self.host, url)
+        start = time.time()
+        status, raw_data = self.cluster.perform_request(
+            method, url, params=params, body=body, latency=self.latency
+        )
+        duration = time.time() - start
+        if not (200 <= status < 300) and status not in ignore:
+            self.log_request_fail(
+                method, full_url, url, body, duration, status, raw_data
+            )
+            self._raise_error(status, raw_data)
+        self.log_request_success(
+            method, full_url, url, body, status, raw_data, duration
+        )
+        return status, dict(RESPONSE_HEADERS), raw_data
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        status, raw_data = self.server.cluster.perform_request(
+            self.command, url.path, params=dict(parse_qsl(url.query)), body=body
+        )
+        data = raw_data.encode("utf-8")
+        self.send_response(status)
+        for header, value in iteritems(RESPONSE_HEADERS):
+            self.send_header(header, value)
+        self.send_header("content-length", "%d" % len(data))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Per-phase timing of searches executions, to tell where time goes between query building, client-side cache,
+transport, JSON decoding, ``Response`` construction and aggregations serialization::
+
+    response = search.execute()
+    response.aggregations.serialize_as_dataframe()
+    response.trace.durations
+    # {"to_dict": 0.0004, "encode": 0.0001, "transport": 0.0215, "decode": 0.0042, "response": 0.0011,
+    #  "serialize_as_dataframe": 0.0173}
+
+Finished traces are also passed to hooks of the global ``hooks`` registry, and collected by ``collect_traces``::
+
+    hooks.register(lambda event, trace: logger.info("%s %s", event, trace.durations))
+    hooks.register(OpenTelemetryHook())
+
+    with collect_traces() as traces:
+        refresh_dashboard()
+
+Executions exceeding thresholds (in milliseconds) can be logged on the "pandagg.slowlog" logger::
+
+    enable_slow_query_log(took=500, overhead=200, serialization=1000)
+"""
+
+from __future__ import unicode_literals
+
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from pandagg.utils import canonical_dumps, fingerprint
+
+try:
+    import collections.abc as collections_abc  # only works on python 3.3+
+except ImportError:
+    import collections as collections_abc
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # python < 3.7
+
+    class ContextVar(object):
+        """Thread-local fallback of ``contextvars.ContextVar``."""
+
+        def __init__(self, name, default=None):
+            self.name = name
+            self._default = default
+            self._local = threading.local()
+
+        def get(self):
+            return getattr(self._local, "value", self._default)
+
+        def set(self, value):
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
+
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("pandagg.slowlog")
+
+# phases of the request itself, as observed by the client
+ROUND_TRIP_PHASES = ("encode", "transport", "decode")
+
+# trace of execution running in current context, filled by instrumented clients
+_current_trace = ContextVar("pandagg_current_trace", default=None)
+# lists collecting traces of executions finished in current context
+_collectors = ContextVar("pandagg_trace_collectors", default=())
+# whether instrumented client is running a request asking for its response body undecoded
+_undecoded_responses = ContextVar("pandagg_undecoded_responses", default=False)
+
+# request parameter asking instrumented clients to return response body undecoded (``UndecodedBody``), consumed
+# client-side (not sent to elasticsearch)::
+#
+#     es.search(index="movies", body=body, params={UNDECODED_RESPONSE_PARAM: True}).raw
+UNDECODED_RESPONSE_PARAM = "pandagg_undecoded_response"
+
+
+class ExecutionTrace(object):
+    """Durations, body sizes and counts of a search execution.
+
+    Phases can be nested, durations being exclusive: time spent in a nested phase (as "decode" inside
+    "transport") isn't counted in its enclosing phase.
+    """
+
+    def __init__(self, operation="search", index=None, body=None):
+        self.operation = operation
+        self.index = index
+        self.body = body
+        self.started_at = time.time()
+        # phase name -> exclusive duration in seconds, accumulated over occurrences
+        self.durations = OrderedDict()
+        # (phase name, start timestamp, end timestamp), in order of completion
+        self.spans = []
+        # "request_body", "response_body" sizes, in bytes
+        self.sizes = {}
+        # "hits", "buckets"
+        self.counts = {}
+        self.cached = False
+        # server-side execution time in milliseconds, as returned by elasticsearch
+        self.took = None
+        # [phase name, time spent in nested phases] of running phases
+        self._running = []
+
+    @contextmanager
+    def phase(self, name):
+        started_at = time.time()
+        start = default_timer()
+        self._running.append([name, 0.0])
+        try:
+            yield self
+        finally:
+            elapsed = default_timer() - start
+            _, nested = self._running.pop()
+            if self._running:
+                self._running[-1][1] += elapsed
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed - nested
+            self.spans.append((name, started_at, started_at + elapsed))
+
+    @property
+    def duration(self):
+        """Cumulated duration of all phases, in seconds."""
+        return sum(self.durations.values())
+
+    @property
+    def round_trip(self):
+        """Client-observed duration of request, from body encoding to response decoding, in seconds."""
+        return sum(self.durations.get(p, 0.0) for p in ROUND_TRIP_PHASES)
+
+    @property
+    def serialization(self):
+        """Cumulated duration of aggregations serializations, in seconds."""
+        return sum(v for k, v in self.durations.items() if k.startswith("serialize"))
+
+    def to_dict(self):
+        return {
+            "operation": self.operation,
+            "index": self.index,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "took": self.took,
+            "round_trip": self.round_trip,
+            "durations": dict(self.durations),
+            "sizes": dict(self.sizes),
+            "counts": dict(self.counts),
+            "cached": self.cached,
+        }
+
+    def __repr__(self):
+        return "<ExecutionTrace> %s %s" % (
+            self.operation,
+            ", ".join("%s: %.2fms" % (k, v * 1000) for k, v in self.durations.items()),
+        )
+
+
+def current_trace():
+    """Return trace of the execution running in current context, or None."""
+    return _current_trace.get()
+
+
+@contextmanager
+def tracing(trace):
+    """Set trace as current one within block."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def collect_traces():
+    """Collect in yielded list traces of executions finished within block, in current context."""
+    traces = []
+    token = _collectors.set(_collectors.get() + (traces,))
+    try:
+        yield traces
+    finally:
+        _collectors.reset(token)
+
+
+class HookRegistry(object):
+    """Callbacks called with ``(event, trace)`` on each finished phase group: "execute" once a search is executed
+    (``Response`` built), "serialize" once aggregations are serialized. Hooks errors are logged, not raised."""
+
+    def __init__(self):
+        self._hooks = []
+
+    def register(self, hook):
+        """Register hook, return it so that it can be used as decorator."""
+        if hook not in self._hooks:
+            self._hooks.append(hook)
+        return hook
+
+    def unregister(self, hook):
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    def clear(self):
+        del self._hooks[:]
+
+    def __len__(self):
+        return len(self._hooks)
+
+    def emit(self, event, trace):
+        if event == "execute":
+            for traces in _collectors.get():
+                traces.append(trace)
+        for hook in list(self._hooks):
+            try:
+                hook(event, trace)
+            except Exception:
+                logger.exception("Tracing hook %r failed on %s event", hook, event)
+
+
+hooks = HookRegistry()
+
+
+class _TracedSerializer(object):
+    """Transport serializer recording encoding time and request body size on current trace."""
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+
+    def dumps(self, data):
+        trace = _current_trace.get()
+        if trace is None:
+            return self.serializer.dumps(data)
+        with trace.phase("encode"):
+            body = self.serializer.dumps(data)
+        trace.sizes["request_body"] = trace.sizes.get("request_body", 0) + len(body)
+        return body
+
+    def __getattr__(self, name):
+        return getattr(self.serializer, name)
+
+
+class UndecodedBody(collections_abc.Mapping):
+    """Response body returned undecoded by instrumented clients, available as ``raw`` (str or bytes) to be parsed
+    incrementally. It is only decoded if accessed as a mapping: responses to requests run by the transport itself
+    while performing the request (product check, sniffing) are read as usual."""
+
+    def __init__(self, raw, deserializer, mimetype=None):
+        self.raw = raw
+        self._deserializer = deserializer
+        self._mimetype = mimetype
+        self._decoded = None
+
+    @property
+    def decoded(self):
+        if self._decoded is None:
+            self._decoded = self._deserializer.loads(self.raw, self._mimetype)
+        return self._decoded
+
+    def __getitem__(self, key):
+        return self.decoded[key]
+
+    def __iter__(self):
+        return iter(self.decoded)
+
+    def __len__(self):
+        return len(self.decoded)
+
+
+class _TracedDeserializer(object):
+    """Transport deserializer recording decoding time and response body size on current trace, and leaving bodies
+    undecoded during requests asking for it (``UNDECODED_RESPONSE_PARAM``)."""
+
+    def __init__(self, deserializer):
+        self.deserializer = deserializer
+
+    def loads(self, s, mimetype=None):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.sizes["response_body"] = trace.sizes.get("response_body", 0) + len(s)
+        if _undecoded_responses.get():
+            return UndecodedBody(s, self.deserializer, mimetype)
+        if trace is None:
+            return self.deserializer.loads(s, mimetype)
+        with trace.phase("decode"):
+            return self.deserializer.loads(s, mimetype)
+
+    def __getattr__(self, name):
+        return getattr(self.deserializer, name)
+
+
+def _undecoded_perform_request(perform_request):
+    """Wrap transport ``perform_request`` so that requests passing ``UNDECODED_RESPONSE_PARAM`` get their response
+    body undecoded, other ones being left untouched."""
+
+    def wrapper(method, url, headers=None, params=None, body=None):
+        if not params or UNDECODED_RESPONSE_PARAM not in params:
+            return perform_request(
+                method, url, headers=headers, params=params, body=body
+            )
+        params = dict(params)
+        token = _undecoded_responses.set(bool(params.pop(UNDECODED_RESPONSE_PARAM)))
+        try:
+            return perform_request(
+                method, url, headers=headers, params=params, body=body
+            )
+        finally:
+            _undecoded_responses.reset(token)
+
+    wrapper.undecoded_responses = True
+    return wrapper
+
+
+def instrument_client(client):
+    """Wrap transport (de)serializers of elasticsearch client so that encoding and decoding are recorded on
+    current trace, instead of being counted in transport time, and so that requests can ask for their response body
+    undecoded (``UNDECODED_RESPONSE_PARAM``). Clients are only instrumented once, and record nothing outside of
+    traced executions."""
+    transport = getattr(client, "transport", None)
+    if transport is None:
+        return client
+    serializer = getattr(transport, "serializer", None)
+    if serializer is not None and not isinstance(serializer, _TracedSerializer):
+        transport.serializer = _TracedSerializer(serializer)
+    deserializer = getattr(transport, "deserializer", None)
+    if deserializer is not None and not isinstance(deserializer, _TracedDeserializer):
+        transport.deserializer = _TracedDeserializer(deserializer)
+    perform_request = transport.perform_request
+    # undecoded responses are only supported by synchronous transports (coroutines exist on python 3.5+)
+    iscoroutinefunction = getattr(inspect, "iscoroutinefunction", lambda func: False)
+    if not (
+        getattr(perform_request, "undecoded_responses", False)
+        or iscoroutinefunction(perform_request)
+    ):
+        transport.perform_request = _undecoded_perform_request(perform_request)
+    return client
+
+
+class OpenTelemetryHook(object):
+    """Hook emitting OpenTelemetry spans: a "pandagg.<event>" span per event, with a child span per phase."""
+
+    EXECUTION_PHASES = ("to_dict", "cache", "encode", "transport", "decode", "response")
+
+    def __init__(self, tracer=None):
+        """
+        :param tracer: OpenTelemetry tracer, defaults to "pandagg" tracer of global tracer provider
+        """
+        try:
+            from opentelemetry import trace as otel_trace
+        except ImportError:
+            raise ImportError(
+                'Emitting OpenTelemetry spans requires to install opentelemetry. Please install "opentelemetry-api".'
+            )
+        self._otel_trace = otel_trace
+        self.tracer = tracer or otel_trace.get_tracer("pandagg")
+
+    @staticmethod
+    def _ns(timestamp):
+        return int(timestamp * 1e9)
+
+    def __call__(self, event, trace):
+        if event == "execute":
+            spans = [s for s in trace.spans if s[0] in self.EXECUTION_PHASES]
+        else:
+            spans = trace.spans[-1:]
+        if not spans:
+            return
+        attributes = {
+            "pandagg.operation": trace.operation,
+            "pandagg.cached": trace.cached,
+        }
+        if trace.index:
+            attributes["pandagg.index"] = ",".join(trace.index)
+        for key, value in trace.sizes.items():
+            attributes["pandagg.size.%s" % key] = value
+        for key, value in trace.counts.items():
+            attributes["pandagg.count.%s" % key] = value
+        parent = self.tracer.start_span(
+            "pandagg.%s" % event,
+            start_time=self._ns(min(s[1] for s in spans)),
+            attributes=attributes,
+        )
+        context = self._otel_trace.set_span_in_context(parent)
+        for name, started_at, ended_at in spans:
+            span = self.tracer.start_span(
+                name, context=context, start_time=self._ns(started_at)
+            )
+            span.end(end_time=self._ns(ended_at))
+        parent.end(end_time=self._ns(max(s[2] for s in spans)))
+
+
+class SlowQueryLogger(object):
+    """Hook logging executions exceeding any of given thresholds, in milliseconds (None disabling a threshold),
+    with their body fingerprint, compact body and phases breakdown, so that cluster slowness (``took``) can be told
+    apart from client-side overhead."""
+
+    def __init__(
+        self,
+        took=None,
+        round_trip=None,
+        overhead=None,
+        serialization=None,
+        logger=None,
+        level=logging.WARNING,
+        max_body_length=2000,
+    ):
+        """
+        :param took: threshold of server-side execution time
+        :param round_trip: threshold of client-observed request time (encoding, transport and decoding)
+        :param overhead: threshold of round-trip time not spent on cluster (network and client-side decoding)
+        :param serialization: threshold of aggregations serialization time
+        :param logger: defaults to "pandagg.slowlog" logger
+        :param max_body_length: logged compact bodies are truncated to this length
+        """
+        self.thresholds = OrderedDict(
+            [
+                ("took", took),
+                ("round_trip", round_trip),
+                ("overhead", overhead),
+                ("serialization", serialization),
+            ]
+        )
+        self.logger = logger or slow_query_logger
+        self.level = level
+        self.max_body_length = max_body_length
+
+    @staticmethod
+    def _metrics(event, trace):
+        """Return metrics checked on given event, in milliseconds."""
+        if event == "serialize":
+            return {"serialization": trace.serialization * 1000}
+        round_trip = trace.round_trip * 1000
+        metrics = {"round_trip": round_trip}
+        if trace.took is not None and not trace.cached:
+            metrics["took"] = trace.took
+            metrics["overhead"] = round_trip - trace.took
+        return metrics
+
+    def exceeded(self, event, trace):
+        """Return names of exceeded thresholds."""
+        metrics = self._metrics(event, trace)
+        return [
+            name
+            for name, threshold in self.thresholds.items()
+            if threshold is not None and name in metrics and metrics[name] > threshold
+        ]
+
+    def __call__(self, event, trace):
+        exceeded = self.exceeded(event, trace)
+        if not exceeded or not self.logger.isEnabledFor(self.level):
+            return
+        body = canonical_dumps(trace.body)
+        if len(body) > self.max_body_length:
+            body = body[: self.max_body_length] + "..."
+        self.logger.log(
+            self.level,
+            "Slow %s on %s (%s exceeded) fingerprint=%s took=%sms round_trip=%.1fms "
+            "serialization=%.1fms phases: %s body: %s",
+            trace.operation,
+            ",".join(trace.index) if trace.index else "_all",
+            ", ".join(exceeded),
+            fingerprint(trace.body),
+            trace.took,
+            trace.round_trip * 1000,
+            trace.serialization * 1000,
+            ", ".join("%s=%.1fms" % (k, v * 1000) for k, v in trace.durations.items()),
+            body,
+            extra={"pandagg_trace": trace.to_dict()},
+        )
+
+
+def enable_slow_query_log(**kwargs):
+    """Register a ``SlowQueryLogger`` with given parameters in global hooks, and return it (to unregister it)."""
+    return hooks.register(SlowQueryLogger(**kwargs))
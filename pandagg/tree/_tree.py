@@ -2,7 +2,9 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import unicode_literals
-from future.utils import python_2_unicode_compatible
+from collections import defaultdict
+
+from future.utils import python_2_unicode_compatible, iteritems, itervalues
 
 from builtins import str as text
 
@@ -11,6 +13,99 @@ from lighttree import Tree as OriginalTree
 
 @python_2_unicode_compatible
 class Tree(OriginalTree):
+    def __init__(self):
+        super(Tree, self).__init__()
+        # memoized computations on subtrees: {computation name: {nid: value}}
+        self._memo = defaultdict(dict)
+        # whether nodes structures are possibly shared with other trees, see `clone`
+        self._shared = False
+        # whether memoized computations are possibly shared with other trees
+        self._memo_shared = False
+
+    def clone(self, with_tree=True, deep=False, new_root=None):
+        """Clone current instance, with or without tree.
+
+        Unless deep or partial (`new_root`), the clone shares nodes structures and memoized computations with
+        current tree (copy-on-write): cloning is done in constant time, but the first of both trees being modified
+        then copies nodes structures, in linear time in the number of nodes, and the first one memoizing or
+        invalidating a computation copies memoized computations.
+        """
+        if not with_tree or deep or new_root is not None:
+            return super(Tree, self).clone(
+                with_tree=with_tree, deep=deep, new_root=new_root
+            )
+        new_tree = self._clone_init(deep)
+        if self.is_empty():
+            return new_tree
+        new_tree.root = self.root
+        new_tree._nodes_map = self._nodes_map
+        new_tree._nodes_parent = self._nodes_parent
+        new_tree._nodes_children = self._nodes_children
+        new_tree._memo = self._memo
+        self._shared = new_tree._shared = True
+        self._memo_shared = new_tree._memo_shared = True
+        return new_tree
+
+    def _ensure_owned(self):
+        """Copy nodes structures if shared with other trees, before modifying them."""
+        if not self._shared:
+            return
+        self._nodes_map = self._nodes_map.copy()
+        nodes_parent = defaultdict(lambda: None)
+        nodes_parent.update(self._nodes_parent)
+        self._nodes_parent = nodes_parent
+        self._nodes_children = defaultdict(
+            set, ((nid, set(cids)) for nid, cids in iteritems(self._nodes_children))
+        )
+        self._shared = False
+
+    def _ensure_memo_owned(self):
+        """Copy memoized computations if shared with other trees, before modifying them."""
+        if not self._memo_shared:
+            return
+        self._memo = defaultdict(
+            dict, ((name, memo.copy()) for name, memo in iteritems(self._memo))
+        )
+        self._memo_shared = False
+
+    def _memoized(self, name, nid, func):
+        """Return result of `func` computed on subtree starting at `nid`, memoized until this subtree is modified.
+        """
+        memo = self._memo.get(name)
+        if memo is not None and nid in memo:
+            return memo[nid]
+        value = func()
+        self._ensure_memo_owned()
+        self._memo[name][nid] = value
+        return value
+
+    def _invalidate_memo(self, nid):
+        """Drop memoized computations on subtrees containing `nid`, ie on node and its ancestors."""
+        if not any(self._memo.values()):
+            return
+        self._ensure_memo_owned()
+        nids = [nid] + self.ancestors(nid)
+        for memo in itervalues(self._memo):
+            for id_ in nids:
+                memo.pop(id_, None)
+
+    def _insert_node_below(self, node, parent_id, with_children=True):
+        self._ensure_owned()
+        if parent_id is None:
+            self._ensure_memo_owned()
+            self._memo.clear()
+        elif parent_id in self:
+            self._invalidate_memo(parent_id)
+        return super(Tree, self)._insert_node_below(
+            node, parent_id=parent_id, with_children=with_children
+        )
+
+    def _drop_node(self, nid):
+        self._ensure_owned()
+        if nid in self:
+            self._invalidate_memo(nid)
+        return super(Tree, self)._drop_node(nid)
+
     def __str__(self):
         return "<{class_}>\n{tree}".format(
             class_=text(self.__class__.__name__), tree=self.show(limit=40)
@@ -8,14 +8,15 @@ import json
 from future.utils import python_2_unicode_compatible
 
 from pandagg.tree._tree import Tree
-from pandagg.tree.mapping import Mapping
+from pandagg.tree.mapping import mappings
+from pandagg.utils import fingerprint, freeze
 
 from pandagg.node.aggs.abstract import (
     BucketAggNode,
     AggNode,
     ShadowRoot,
 )
-from pandagg.node.aggs.bucket import Nested, ReverseNested
+from pandagg.node.aggs.bucket import Nested, ReverseNested, Composite
 from pandagg.node.aggs.pipeline import BucketSelector, BucketSort
 
 # necessary to ensure all agg nodes are registered in meta class
@@ -33,7 +34,7 @@ class Aggs(Tree):
     _crafted_root_name = "root"
 
     def __init__(self, *args, **kwargs):
-        self.mapping = Mapping(kwargs.pop("mapping", None))
+        self.mapping = mappings.get(kwargs.pop("mapping", None))
         super(Aggs, self).__init__()
         if args or kwargs:
             self._fill(*args, **kwargs)
@@ -301,19 +302,84 @@ class Aggs(Tree):
             new_agg.insert(deserialized, parent_id=insert_below)
         return new_agg
 
+    def as_composite(self, size=None, name="composite"):
+        r"""Compile the linear chain of bucket aggregations starting from root into a single composite aggregation,
+        whose buckets can be paginated instead of being truncated by terms ``size``.
+
+        Given the aggregation::
+
+            A──> B──> C1
+                 └──> C2
+
+        Generates::
+
+            composite(A, B)──> C1
+                           └──> C2
+
+        Only terms, histogram and date_histogram aggregations can be compiled into composite sources.
+
+        When serialized as tabular or dataframe, a response grouped by the composite aggregation fetches all
+        following pages using returned ``after_key``, and each source becomes a grouping level.
+
+        :param size: number of composite buckets fetched per page
+        :param name: name of composite aggregation
+        :rtype: pandagg.aggs.Aggs
+        """
+        grouping_name = self.deepest_linear_bucket_agg
+        if grouping_name is None:
+            raise ValueError(
+                "No linear bucket aggregation to compile into a composite aggregation."
+            )
+        chain = self.ancestors(grouping_name, id_only=False, from_root=True) + [
+            self.get(grouping_name)
+        ]
+        composite = Composite(
+            name=name,
+            sources=[Composite.source_from_agg_node(n) for n in chain],
+            size=size,
+        )
+        new_agg = self.clone(with_tree=False)
+        new_agg.insert_node(composite)
+        for child_id in self.children(grouping_name):
+            new_agg.insert_tree(self.subtree(child_id), parent_id=composite.name)
+        return new_agg
+
     def to_dict(self, from_=None, depth=None, with_name=True):
+        """Serialize aggregations clause.
+
+        Complete serialization (`depth` is None) of each subtree is memoized until it is modified: nested
+        structures of returned dict are shared with memoized ones, hence read-only (see
+        ``pandagg.utils.FrozenDict``).
+        """
         if self.root is None:
             return {}
         from_ = self.root if from_ is None else from_
+        if depth is None:
+            return dict(self._to_dict_at(from_, with_name))
+        return self._to_dict(from_, depth, with_name)
+
+    def _to_dict_at(self, nid, with_name):
+        return self._memoized(
+            "to_dict" if with_name else "to_dict_unnamed",
+            nid,
+            lambda: freeze(self._to_dict(nid, None, with_name)),
+        )
+
+    def _to_dict(self, from_, depth, with_name):
         node = self.get(from_)
         children_queries = {}
         if depth is None or depth > 0:
             if depth is not None:
                 depth -= 1
             for child_node in self.children(node.name, id_only=False):
-                children_queries[child_node.name] = self.to_dict(
-                    from_=child_node.name, depth=depth, with_name=False
-                )
+                if depth is None:
+                    children_queries[child_node.name] = self._to_dict_at(
+                        child_node.name, with_name=False
+                    )
+                else:
+                    children_queries[child_node.name] = self._to_dict(
+                        child_node.name, depth=depth, with_name=False
+                    )
         if isinstance(node, ShadowRoot):
             return children_queries
         else:
@@ -324,6 +390,47 @@ class Aggs(Tree):
             return {node.name: node_query_dict}
         return node_query_dict
 
+    def normalized(self):
+        """Return normalized form of aggregations clause, so that equivalent aggregations share the same
+        normalized form, independently of the order in which they were declared (dict keys order is not relevant in
+        serialized form). Memoized until aggregations are modified: nested structures of returned dict are
+        read-only, as in ``to_dict``.
+        """
+        if self.root is None:
+            return {}
+        return dict(self._to_dict_at(self.root, with_name=True))
+
+    def fingerprint(self):
+        """Return stable hash of normalized aggregations clause (see ``normalized``), usable as cache key or to
+        deduplicate aggregations. Memoized until aggregations are modified."""
+        if self.root is None:
+            return fingerprint({})
+        return self._memoized(
+            "fingerprint",
+            self.root,
+            lambda: fingerprint(self._to_dict_at(self.root, with_name=True)),
+        )
+
+    def parse_plan(self):
+        """Return flat plan used to parse responses of these aggregations, as a dict: aggregation name ->
+        (aggregation node, children aggregation nodes, buckets extractor, bucket value extractor), so that responses
+        are parsed without tree lookups. Memoized until aggregations are modified.
+        """
+        if self.root is None:
+            return {}
+        return self._memoized("parse_plan", self.root, self._build_parse_plan)
+
+    def _build_parse_plan(self):
+        plan = {}
+        for node in self.list():
+            plan[node.name] = (
+                node,
+                tuple(self.children(node.name, id_only=False)),
+                node.extract_buckets,
+                node.extract_bucket_value,
+            )
+        return plan
+
     def applied_nested_path_at_node(self, nid):
         # from current node to root
         for id_ in [nid] + self.ancestors(nid):
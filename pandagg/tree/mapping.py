@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import threading
+
+from future.utils import iteritems, string_types
 from lighttree.exceptions import NotFoundNodeError
 
 from pandagg.node.mapping.abstract import Field, ShadowRoot, StringField, ComplexField
@@ -14,6 +17,7 @@ from pandagg.exceptions import (
     InvalidOperationMappingFieldError,
 )
 from pandagg.tree._tree import Tree
+from pandagg.utils import fingerprint
 
 
 class Mapping(Tree):
@@ -22,6 +26,8 @@ class Mapping(Tree):
 
     def __init__(self, *args, **kwargs):
         super(Mapping, self).__init__()
+        # frozen mappings cannot be modified, and are shared instead of being cloned, see `freeze`
+        self._frozen = False
         if (args and kwargs) or len(args) > 1:
             raise ValueError(
                 "Invalid mapping declaration. Got:\n*args: %s\n**kwargs: %s"
@@ -44,6 +50,39 @@ class Mapping(Tree):
 
     __bool__ = __nonzero__
 
+    def freeze(self):
+        """Make mapping immutable. A frozen mapping can be safely shared: cloning it returns the mapping itself.
+        """
+        self._frozen = True
+        return self
+
+    @property
+    def frozen(self):
+        return self._frozen
+
+    def clone(self, with_tree=True, deep=False, new_root=None):
+        if self._frozen and with_tree and not deep and new_root is None:
+            return self
+        return super(Mapping, self).clone(
+            with_tree=with_tree, deep=deep, new_root=new_root
+        )
+
+    def _ensure_not_frozen(self):
+        if self._frozen:
+            raise ValueError(
+                "Frozen mapping cannot be modified, modify a deep clone of it instead."
+            )
+
+    def _insert_node_below(self, node, parent_id, with_children=True):
+        self._ensure_not_frozen()
+        return super(Mapping, self)._insert_node_below(
+            node, parent_id, with_children=with_children
+        )
+
+    def _drop_node(self, nid):
+        self._ensure_not_frozen()
+        return super(Mapping, self)._drop_node(nid)
+
     def serialize(self, from_=None, depth=None):
         if self.root is None:
             return None
@@ -65,19 +104,58 @@ class Mapping(Tree):
                 serialized_node["properties"] = children_queries
         return serialized_node
 
+    def _path_index(self):
+        """Return index of mapping fields, as a dict: dotted path -> (node id, field type, nested paths at this
+        field as returned by `list_nesteds_at_field`). Built in a single traversal, and memoized until mapping is
+        modified.
+        """
+        if self.root is None:
+            return {}
+        return self._memoized("path_index", self.root, self._build_path_index)
+
+    def _node_paths(self):
+        """Return dict: node id -> dotted path."""
+        if self.root is None:
+            return {}
+        return self._memoized(
+            "node_paths",
+            self.root,
+            lambda: {
+                nid: path for path, (nid, _, _) in iteritems(self._path_index())
+            },
+        )
+
+    def _build_path_index(self):
+        index = {}
+        # (node id, dotted path, nested paths of strict ancestors, from deepest to highest)
+        stack = [(cid, None, ()) for cid in self.children(self.root)]
+        while stack:
+            nid, parent_path, ancestors_nesteds = stack.pop()
+            node = super(Mapping, self).get(nid)
+            if parent_path is None:
+                path = node.name
+            else:
+                path = "%s.%s" % (parent_path, node.name)
+            nesteds = ancestors_nesteds
+            if node.KEY == "nested":
+                nesteds = ancestors_nesteds + (path,)
+            index[path] = (nid, node.KEY, nesteds)
+            children_ancestors_nesteds = (
+                (path,) + ancestors_nesteds
+                if node.KEY == "nested"
+                else ancestors_nesteds
+            )
+            stack.extend(
+                (cid, path, children_ancestors_nesteds) for cid in self.children(nid)
+            )
+        return index
+
     def resolve_path_to_id(self, path):
-        if path in self._nodes_map:
+        # paths first: a field name must never be mistaken for a node identifier
+        entry = self._path_index().get(path)
+        if entry is None:
             return path
-        nid = self.root
-        names = path.split(".")
-        for name in names:
-            matching_children = [
-                c for c in self.children(nid, id_only=False) if c.name == name
-            ]
-            if len(matching_children) != 1:
-                return path
-            nid = matching_children[0].identifier
-        return nid
+        return entry[0]
 
     def get(self, key):
         return super(Mapping, self).get(self.resolve_path_to_id(key))
@@ -134,14 +212,26 @@ class Mapping(Tree):
 
     def list_nesteds_at_field(self, field_path):
         path_nid = self.resolve_path_to_id(field_path)
+        entry = self._path_index().get(self.node_path(path_nid))
+        if entry is None:
+            # not indexed: fall back to tree walk
+            return [
+                self.node_path(nid)
+                for nid in self.ancestors(path_nid) + [path_nid]
+                if self.get(nid).KEY == "nested"
+            ]
         # from deepest to highest
-        return [
-            self.node_path(nid)
-            for nid in self.ancestors(path_nid) + [path_nid]
-            if self.get(nid).KEY == "nested"
-        ]
+        return list(entry[2])
 
     def node_path(self, nid):
+        if nid == self.root:
+            return ""
+        path = self._node_paths().get(nid)
+        if path is not None:
+            return path
+        # raises NotFoundNodeError if not a node id (dotted paths included)
+        self._ensure_present(nid)
+        # not indexed: fall back to tree walk
         return ".".join(
             [
                 self.get(id_).name
@@ -149,3 +239,67 @@ class Mapping(Tree):
                 if id_ != self.root
             ]
         )
+
+
+class MappingRegistry(object):
+    """
+    Registry of parsed mappings, keyed by index and mapping hash. Used as a singleton in this module, so that
+    searches on a same index share a single frozen ``Mapping`` instead of each parsing and cloning its own.
+    """
+
+    def __init__(self):
+        # index key -> (mapping hash, frozen Mapping)
+        self._mappings = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._mappings)
+
+    @staticmethod
+    def _index_key(index):
+        if index is None or isinstance(index, string_types):
+            return index
+        return ",".join(sorted(index))
+
+    def get(self, mapping, index=None):
+        """
+        Return ``Mapping`` for given mapping declaration:
+
+        - None: empty mapping
+        - ``Mapping`` instance: returned as is if frozen, else (copy-on-write) clone of it
+        - raw mapping dict: registered frozen ``Mapping`` of this index, parsed only if absent from registry or
+          if mapping changed since registration
+
+        :param mapping: mapping declaration
+        :param index: index, or list of indices, the mapping belongs to
+        """
+        if mapping is None:
+            return Mapping()
+        if isinstance(mapping, Mapping):
+            return mapping.clone()
+        key = self._index_key(index)
+        hash_ = fingerprint(mapping)
+        entry = self._mappings.get(key)
+        if entry is not None and entry[0] == hash_:
+            return entry[1]
+        # parse outside of lock, in case of concurrent registrations last one wins
+        parsed = Mapping(mapping).freeze()
+        with self._lock:
+            self._mappings[key] = (hash_, parsed)
+        return parsed
+
+    def refresh(self, index=None):
+        """
+        Drop registered mapping of given index (or of all indices if None), so that it is parsed again on next
+        request.
+        """
+        with self._lock:
+            if index is None:
+                self._mappings.clear()
+                return
+            self._mappings.pop(self._index_key(index), None)
+
+
+mappings = MappingRegistry()
+get_mapping = mappings.get
+refresh_mappings = mappings.refresh
@@ -13,7 +13,11 @@ from pandagg.node.query._parameter_clause import (
     ParameterClause,
     ParentParameterClause,
 )
-from pandagg.node.query.abstract import QueryClause, LeafQueryClause
+from pandagg.node.query.abstract import (
+    QueryClause,
+    LeafQueryClause,
+    KeyFieldQueryClause,
+)
 from pandagg.node.query.compound import (
     CompoundClause,
     Bool,
@@ -32,7 +36,8 @@ import pandagg.node.query.shape as shape  # noqa
 import pandagg.node.query.span as span  # noqa
 import pandagg.node.query.specialized as specialized  # noqa
 import pandagg.node.query.term_level as term_level  # noqa
-from pandagg.tree.mapping import Mapping
+from pandagg.tree.mapping import mappings
+from pandagg.utils import canonical_dumps, fingerprint, freeze
 
 ADD = "add"
 REPLACE = "replace"
@@ -50,7 +55,7 @@ class Query(Tree):
     node_class = QueryClause
 
     def __init__(self, *args, **kwargs):
-        self.mapping = Mapping(kwargs.pop("mapping", None))
+        self.mapping = mappings.get(kwargs.pop("mapping", None))
         super(Query, self).__init__()
         if args or kwargs:
             self._fill(*args, **kwargs)
@@ -117,19 +122,33 @@ class Query(Tree):
 
     def to_dict(self, from_=None, with_name=True):
         """Return None if no query clause.
+
+        Serialization of each subtree is memoized until it is modified: nested structures of returned dict are
+        shared with memoized ones, hence read-only (see ``pandagg.utils.FrozenDict``).
         """
         if self.root is None:
             return None
         from_ = self.root if from_ is None else from_
-        node = self.get(from_)
+        serialized = self._to_dict_at(from_, with_name)
+        if serialized is None:
+            return None
+        return dict(serialized)
+
+    def _to_dict_at(self, nid, with_name):
+        return self._memoized(
+            "to_dict" if with_name else "to_dict_unnamed",
+            nid,
+            lambda: freeze(self._to_dict(nid, with_name)),
+        )
+
+    def _to_dict(self, nid, with_name):
+        node = self.get(nid)
         if isinstance(node, (LeafQueryClause, SimpleParameter)):
             return node.serialize(with_name=True)
         serialized_children = []
         should_yield = False
         for child_node in self.children(node.identifier, id_only=False):
-            serialized_child = self.to_dict(
-                from_=child_node.identifier, with_name=with_name
-            )
+            serialized_child = self._to_dict_at(child_node.identifier, with_name)
             if serialized_child is not None:
                 serialized_children.append(serialized_child)
                 if not isinstance(child_node, SimpleParameter):
@@ -149,6 +168,92 @@ class Query(Tree):
             return {node.KEY: serialized_children}
         return {node.KEY: serialized_children[0]}
 
+    def normalized(self, from_=None):
+        """Return normalized form of query, as a dict, such that equivalent queries share the same normalized form:
+
+        - clauses of bool parameters are sorted, and deduplicated in non-scoring "filter" and "must_not" clauses
+        - redundant nesting is flattened: bool clauses nested in a "must" or "filter" clause of another bool clause
+          are merged in it, and a bool clause only made of a single "must" clause is replaced by this clause
+        - default parameters (boost of 1) are stripped
+        - names generated for unnamed compound clauses are omitted
+
+        Normalized forms of subtrees are memoized until they are modified: nested structures of returned dict are
+        read-only, as in ``to_dict``.
+        Return None if no query clause.
+        """
+        if self.root is None:
+            return None
+        from_ = self.root if from_ is None else from_
+        normalized = self._normalized_at(from_)
+        if normalized is None:
+            return None
+        return dict(normalized)
+
+    def _normalized_at(self, nid):
+        return self._memoized(
+            "normalized", nid, lambda: freeze(self._normalize(nid))
+        )
+
+    def _normalize(self, nid):
+        node = self.get(nid)
+        if isinstance(node, SimpleParameter):
+            if node.KEY == "boost" and node.body["value"] == 1:
+                return None
+            return node.serialize()
+        if isinstance(node, LeafQueryClause):
+            return _strip_default_boost(node)
+        if isinstance(node, ParentParameterClause):
+            serialized_children = [
+                serialized_child
+                for serialized_child in (
+                    self._normalized_at(child_id) for child_id in self.children(nid)
+                )
+                if serialized_child is not None
+            ]
+            if not serialized_children:
+                return None
+            if not node.MULTIPLE:
+                return {node.KEY: serialized_children[0]}
+            clauses = {}
+            for clause in serialized_children:
+                for sub_clause in _flatten_bool_clause(node.KEY, clause):
+                    key = canonical_dumps(sub_clause)
+                    if key in clauses and node.KEY not in ("filter", "must_not"):
+                        # duplicate clauses contribute to score, keep them all
+                        key = "%s|%d" % (key, len(clauses))
+                    clauses[key] = sub_clause
+            return {node.KEY: [clauses[k] for k in sorted(clauses)]}
+
+        # compound clause
+        body = {}
+        should_yield = False
+        for child_node in self.children(nid, id_only=False):
+            serialized_child = self._normalized_at(child_node.identifier)
+            if serialized_child is None:
+                continue
+            body.update(serialized_child)
+            if not isinstance(child_node, SimpleParameter):
+                should_yield = True
+        if not should_yield:
+            return None
+        if node._named:
+            body["_name"] = node.name
+        elif isinstance(node, Bool) and list(body) == ["must"]:
+            if len(body["must"]) == 1:
+                return body["must"][0]
+        return {node.KEY: body}
+
+    def fingerprint(self):
+        """Return stable hash of normalized query (see ``normalized``), usable as cache key or to deduplicate
+        queries. Memoized until query is modified."""
+        if self.root is None:
+            return fingerprint(None)
+        return self._memoized(
+            "fingerprint",
+            self.root,
+            lambda: fingerprint(self._normalized_at(self.root)),
+        )
+
     def query(self, *args, **kwargs):
         mode = kwargs.pop("mode", ADD)
         parent = kwargs.pop("parent", None)
@@ -451,3 +556,39 @@ class Query(Tree):
 
     def __str__(self):
         return "<Query>\n%s" % text(self.show())
+
+
+def _strip_default_boost(node):
+    """Return serialized leaf clause without boost of 1 (default value). Boost is only removed from clause
+    parameters: from field body for clauses keyed by field (as term), else from clause body, so that fields named
+    "boost" are kept."""
+    key, body = next(iter(node.serialize(with_name=True).items()))
+    if isinstance(node, KeyFieldQueryClause):
+        body = {
+            k: _without_default_boost(v) if k == node.field else v
+            for k, v in body.items()
+        }
+    else:
+        body = _without_default_boost(body)
+    return {key: body}
+
+
+def _without_default_boost(params):
+    if not isinstance(params, dict):
+        return params
+    return {k: v for k, v in params.items() if not (k == "boost" and v == 1)}
+
+
+def _flatten_bool_clause(param_key, clause):
+    """Return clauses to insert in `param_key` bool parameter instead of normalized `clause`: if it is an unnamed
+    bool clause made of a single "must" or "filter" parameter, its clauses can be merged in parent parameter,
+    as long as it doesn't change scoring."""
+    if param_key not in ("must", "filter") or list(clause) != ["bool"]:
+        return [clause]
+    body = clause["bool"]
+    if len(body) != 1:
+        return [clause]
+    inner_key, inner_clauses = next(iter(body.items()))
+    if inner_key == param_key or (param_key == "filter" and inner_key == "must"):
+        return inner_clauses
+    return [clause]
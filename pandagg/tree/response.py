@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from array import array
 from collections import OrderedDict, defaultdict
+from itertools import chain
 
-from future.utils import iteritems
+from builtins import str as text
+from future.utils import iteritems, python_2_unicode_compatible
+from lighttree import Tree as OriginalTree
 
 from pandagg.node.query.joining import Nested
 from pandagg.tree._tree import Tree
@@ -124,12 +128,17 @@ class AggsResponseTree(Tree):
               └── Nested_B              <- filter on B
 
         """
-        tree_mapping = self.__aggs.mapping
+        return self._bucket_properties_filter(
+            self.__aggs, self.bucket_properties(self.get(nid))
+        )
+
+    @classmethod
+    def _bucket_properties_filter(cls, aggs, bucket_properties):
+        """Build query filtering documents of bucket with given properties ('level' -> 'key')."""
+        tree_mapping = aggs.mapping
 
-        selected_bucket = self.get(nid)
-        bucket_properties = self.bucket_properties(selected_bucket)
         agg_node_key_tuples = [
-            (self.__aggs.get(level), key) for level, key in iteritems(bucket_properties)
+            (aggs.get(level), key) for level, key in iteritems(bucket_properties)
         ]
 
         filters_per_nested_level = defaultdict(list)
@@ -138,9 +147,7 @@ class AggsResponseTree(Tree):
             level_agg_filter = agg_node.get_filter(key)
             # remove unnecessary match_all filters
             if level_agg_filter is not None and "match_all" not in level_agg_filter:
-                current_nested = self.__aggs.applied_nested_path_at_node(
-                    agg_node.identifier
-                )
+                current_nested = aggs.applied_nested_path_at_node(agg_node.identifier)
                 filters_per_nested_level[current_nested].append(level_agg_filter)
 
         nested_with_conditions = [n for n in filters_per_nested_level.keys() if n]
@@ -160,8 +167,221 @@ class AggsResponseTree(Tree):
             )
             nearest_nested_parent = next(iter(nested_with_parents[1:]), None)
             nid_to_children[nearest_nested_parent].add(nested)
-        return self._build_filter(nid_to_children, filters_per_nested_level).to_dict()
+        return cls._build_filter(nid_to_children, filters_per_nested_level).to_dict()
 
     def show(self, **kwargs):
         kwargs["key"] = kwargs.get("key", lambda x: x.line_repr(depth=0))
         return super(AggsResponseTree, self).show(**kwargs)
+
+
+@python_2_unicode_compatible
+class ColumnarAggsResponseTree(object):
+    """Columnar representation of an ES response, scaling to millions of buckets: instead of one node per bucket,
+    buckets are stored in depth-first order in parallel arrays of parent position, level id, key and value.
+
+    Exposes same `show`, `bucket_properties` and `get_bucket_filter` API as :class:`AggsResponseTree`, buckets
+    identifiers being their positions (as strings). Buckets are only materialized as
+    :class:`~pandagg.node.response.bucket.Bucket` instances when accessed through `get`.
+    """
+
+    def __init__(self, aggs, index):
+        """
+        :param aggs: instance of pandagg.agg.Agg from which this ES response originates
+        """
+        self._aggs = aggs
+        self._index = index
+        # level name per level id
+        self._level_names = []
+        self._level_ids = {}
+        # bucket attributes, per bucket position
+        self._parents = array("l")
+        self._levels = array("l")
+        self._keys = []
+        self._values = []
+        # position following last bucket of subtree, per bucket position
+        self._ends = array("l")
+
+    def __len__(self):
+        return len(self._parents)
+
+    @property
+    def root(self):
+        return "0" if self._parents else None
+
+    def _level_id(self, level):
+        level_id = self._level_ids.get(level)
+        if level_id is None:
+            level_id = self._level_ids[level] = len(self._level_names)
+            self._level_names.append(level)
+        return level_id
+
+    def _append(self, pos, level_id, key, value):
+        self._parents.append(pos)
+        self._levels.append(level_id)
+        self._keys.append(key)
+        self._values.append(value)
+        return len(self._parents) - 1
+
+    def parse(self, raw_response):
+        """Build response tree from ElasticSearch aggregation response
+        :param raw_response: ElasticSearch aggregation response
+        :return: self
+
+        Note: if the root aggregation node can generate multiple buckets, a response root is crafted to avoid having
+        multiple roots.
+        """
+        root_node = self._aggs.get(self._aggs.root)
+        pos = -1
+        if not isinstance(root_node, UniqueBucketAgg):
+            pos = self._append(-1, self._level_id(Bucket.ROOT_NAME), None, None)
+
+        # children agg nodes, and level id, per agg name, computed once
+        children = {}
+        for agg_node in self._aggs.list():
+            children[agg_node.name] = (
+                self._level_id(agg_node.name),
+                self._aggs.children(agg_node.name, id_only=False),
+            )
+
+        # stack of buckets iterators, depth-first: buckets of a bucket's sub-aggregations are all inserted before
+        # its following sibling buckets
+        stack = [self._iter_buckets(root_node, raw_response, pos)]
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+                continue
+            agg_node, parent_pos, key, raw_value = item
+            level_id, sub_agg_nodes = children[agg_node.name]
+            bucket_pos = self._append(
+                parent_pos, level_id, key, agg_node.extract_bucket_value(raw_value)
+            )
+            if sub_agg_nodes:
+                stack.append(
+                    chain.from_iterable(
+                        [
+                            self._iter_buckets(sub_agg_node, raw_value, bucket_pos)
+                            for sub_agg_node in sub_agg_nodes
+                        ]
+                    )
+                )
+        self._compute_ends()
+        return self
+
+    @staticmethod
+    def _iter_buckets(agg_node, raw_response, pos):
+        agg_raw_response = (
+            raw_response
+            if isinstance(agg_node, ShadowRoot)
+            else raw_response.get(agg_node.name)
+        )
+        for key, raw_value in agg_node.extract_buckets(agg_raw_response):
+            yield agg_node, pos, key, raw_value
+
+    def _compute_ends(self):
+        parents = self._parents
+        ends = array("l", range(1, len(parents) + 1))
+        for pos in range(len(parents) - 1, -1, -1):
+            pid = parents[pos]
+            if pid >= 0 and ends[pos] > ends[pid]:
+                ends[pid] = ends[pos]
+        self._ends = ends
+
+    def get(self, nid):
+        pos = int(nid)
+        bucket = Bucket(
+            value=self._values[pos],
+            key=self._keys[pos],
+            level=self._level_names[self._levels[pos]],
+        )
+        bucket.identifier = text(pos)
+        return bucket
+
+    def parent(self, nid, id_only=True):
+        pid = self._parents[int(nid)]
+        if pid < 0:
+            return None
+        return text(pid) if id_only else self.get(pid)
+
+    def children(self, nid, id_only=True):
+        pos = int(nid)
+        end = self._ends[pos]
+        cids = []
+        child_pos = pos + 1
+        while child_pos < end:
+            cids.append(text(child_pos))
+            child_pos = self._ends[child_pos]
+        if id_only:
+            return cids
+        return [self.get(cid) for cid in cids]
+
+    def bucket_properties(self, bucket, properties=None, end_level=None, depth=None):
+        """Return a given bucket's properties in the form of an ordered dictionnary, travelling from current bucket
+        through all ancestors until reaching root.
+        :param bucket: instance of pandagg.buckets.buckets.Bucket, or bucket identifier
+        :param properties: OrderedDict accumulator of 'level' -> 'key'
+        :param end_level: optional parameter to specify until which level properties are fetched
+        :param depth: optional parameter to specify a limit number of levels which are fetched
+        :return: OrderedDict of structure 'level' -> 'key'
+        """
+        if properties is None:
+            properties = OrderedDict()
+        pos = int(getattr(bucket, "identifier", bucket))
+        while pos >= 0:
+            level = self._level_names[self._levels[pos]]
+            if level != Bucket.ROOT_NAME:
+                properties[level] = self._keys[pos]
+            if depth is not None:
+                depth -= 1
+            if level == end_level or depth == 0:
+                break
+            pos = self._parents[pos]
+        return properties
+
+    def get_bucket_filter(self, nid):
+        """Build query filtering documents belonging to that bucket, see `AggsResponseTree.get_bucket_filter`."""
+        return AggsResponseTree._bucket_properties_filter(
+            self._aggs, self.bucket_properties(nid)
+        )
+
+    def show(self, nid=None, key=None, reverse=False, line_type="ascii-ex", limit=None):
+        """Return tree structure in hierarchy style, see `AggsResponseTree.show`.
+        """
+        key = key or (lambda x: x.line_repr(depth=0))
+        if nid is None:
+            nid = self.root
+        output = ""
+        if nid is None:
+            return output
+        # (bucket, is_last_list)
+        stack = [(self.get(nid), [])]
+        while stack:
+            bucket, is_last_list = stack.pop()
+            output += "%s%s\n" % (
+                OriginalTree._prefix_repr(line_type, is_last_list),
+                bucket.line_repr(depth=len(is_last_list)),
+            )
+            if limit is not None:
+                limit -= 1
+                if limit == 0:
+                    output += "...\n(truncated, total number of nodes: %d)\n" % len(
+                        self
+                    )
+                    return output
+            children = sorted(
+                self.children(bucket.identifier, id_only=False),
+                key=key,
+                reverse=reverse,
+            )
+            idxlast = len(children) - 1
+            for idx, child in reversed(list(enumerate(children))):
+                stack.append((child, is_last_list + [idx == idxlast]))
+        return output
+
+    def __str__(self):
+        return "<{class_}>\n{tree}".format(
+            class_=text(self.__class__.__name__), tree=self.show(limit=40)
+        )
+
+    def __repr__(self):
+        return self.__str__()
@@ -2,6 +2,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import copy
+import hashlib
+import json
+
+from future.utils import iteritems
+
 
 # adapted from https://github.com/elastic/elasticsearch-dsl-py/blob/master/elasticsearch_dsl/utils.py#L162
 class DslMeta(type):
@@ -58,3 +64,80 @@ def equal_queries(d1, d2):
     """Compares if two queries are equivalent (do not consider nested list orders).
     """
     return ordered(d1) == ordered(d2)
+
+
+def canonical_dumps(obj):
+    """Serialize JSON-compatible object, with sorted keys and without whitespace, so that equal objects give the
+    same string."""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def fingerprint(obj):
+    """Return stable hash of JSON-compatible object (insensitive to dict keys ordering)."""
+    return hashlib.sha1(canonical_dumps(obj).encode("utf-8")).hexdigest()
+
+
+_FROZEN_MESSAGE = (
+    "Serialized clauses are shared with memoized ones and can't be modified in place, copy them first "
+    "(copy.deepcopy)."
+)
+
+
+class FrozenDict(dict):
+    """Read-only dict, returned in serialized clauses so that memoized serializations can be shared without being
+    corrupted. Copies (``copy.copy``, ``copy.deepcopy``, ``dict.copy``) and unpickled instances are regular
+    dicts."""
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(_FROZEN_MESSAGE)
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def copy(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+    def __deepcopy__(self, memo):
+        return {k: copy.deepcopy(v, memo) for k, v in iteritems(self)}
+
+
+class FrozenList(list):
+    """Read-only list, see ``FrozenDict``."""
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(_FROZEN_MESSAGE)
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
+
+    def copy(self):
+        return list(self)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(v, memo) for v in self]
+
+
+_FROZEN_TYPES = (FrozenDict, FrozenList)
+
+
+def freeze(obj):
+    """Return read-only version of JSON-compatible object: dicts and lists are converted into ``FrozenDict`` and
+    ``FrozenList`` recursively, already frozen ones being returned as is (so that freezing a structure built
+    from frozen ones only walks its new parts)."""
+    if isinstance(obj, _FROZEN_TYPES):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict({k: freeze(v) for k, v in iteritems(obj)})
+    if isinstance(obj, list):
+        return FrozenList([freeze(v) for v in obj])
+    return obj
@@ -17,15 +17,24 @@ tests_require = [
     "pytest",
     "mock",
     "pandas>=0.24.2",
+    "pyarrow>=1.0.0",
+    "ijson>=3.0",
 ]
 
 install_requires = [
     "future",
     "lighttree==0.0.2",
     "elasticsearch>=7.1.0,<8.0.0",
+    "futures;python_version<'3.2'",
 ]
 
-extras_require = {"test": tests_require, "pandas": ["pandas>=0.24.2"]}
+extras_require = {
+    "test": tests_require,
+    "pandas": ["pandas>=0.24.2"],
+    "async": ["elasticsearch[async]>=7.8.0,<8.0.0"],
+    "arrow": ["pyarrow>=1.0.0"],
+    "streaming": ["ijson>=3.0"],
+}
 
 
 setup(
@@ -38,7 +47,7 @@ setup(
     author_email="leonardbinet@gmail.com",
     url="https://github.com/alkemics/pandagg",
     keywords="elasticsearch aggregation pandas",
-    packages=find_packages(),
+    packages=find_packages(exclude=("benchmarks", "benchmarks.*")),
     include_package_data=True,
     test_suite="pandagg.tests",
     zip_safe=False,
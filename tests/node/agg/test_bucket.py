@@ -1,7 +1,7 @@
 from unittest import TestCase
 
 from pandagg.aggs import Terms, Filter, Filters, DateHistogram, Nested, Range
-from pandagg.node.aggs.bucket import Histogram
+from pandagg.node.aggs.bucket import Histogram, Composite
 from pandagg.utils import ordered
 
 
@@ -384,3 +384,75 @@ class BucketAggNodesTestCase(TestCase):
                 ),
             ],
         )
+
+    def test_composite(self):
+        agg = Composite(
+            name="name",
+            sources=[
+                {"type": {"terms": {"field": "type"}}},
+                {"price": {"histogram": {"field": "price", "interval": 10}}},
+            ],
+            size=2,
+            after={"type": "book", "price": 10},
+        )
+        self.assertEqual(agg.source_names, ["type", "price"])
+        self.assertEqual(
+            agg.to_dict(),
+            {
+                "composite": {
+                    "sources": [
+                        {"type": {"terms": {"field": "type"}}},
+                        {"price": {"histogram": {"field": "price", "interval": 10}}},
+                    ],
+                    "size": 2,
+                    "after": {"type": "book", "price": 10},
+                }
+            },
+        )
+
+        es_raw_response = {
+            "after_key": {"type": "dvd", "price": 0},
+            "buckets": [
+                {"key": {"type": "book", "price": 20}, "doc_count": 4},
+                {"key": {"type": "dvd", "price": 0}, "doc_count": 2},
+            ],
+        }
+        buckets = list(agg.extract_buckets(es_raw_response))
+        self.assertEqual(
+            buckets,
+            [
+                (
+                    {"type": "book", "price": 20},
+                    {"key": {"type": "book", "price": 20}, "doc_count": 4},
+                ),
+                (
+                    {"type": "dvd", "price": 0},
+                    {"key": {"type": "dvd", "price": 0}, "doc_count": 2},
+                ),
+            ],
+        )
+        self.assertEqual(agg.extract_bucket_value(buckets[0][1]), 4)
+
+        self.assertEqual(
+            agg.get_filter({"type": "book", "price": 20}),
+            {
+                "bool": {
+                    "filter": [
+                        {"term": {"type": {"value": "book"}}},
+                        {"range": {"price": {"gte": 20.0, "lt": 30.0}}},
+                    ]
+                }
+            },
+        )
+
+    def test_composite_source_from_agg_node(self):
+        self.assertEqual(
+            Composite.source_from_agg_node(
+                Terms("type", field="type", size=10, order={"_count": "desc"})
+            ),
+            {"type": {"terms": {"field": "type"}}},
+        )
+        with self.assertRaises(ValueError):
+            Composite.source_from_agg_node(
+                Range("price", field="price", ranges=[{"to": 10}])
+            )
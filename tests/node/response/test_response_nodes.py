@@ -8,3 +8,8 @@ class ResponseBucketTestCase(TestCase):
             Bucket(level="windows.color", key="green", value=32).line_repr(depth=5),
             "windows.color=green                   32",
         )
+
+    def test_bucket_slots(self):
+        bucket = Bucket(level="windows.color", key="green", value=32)
+        # attributes are stored in slots, instance __dict__ (inherited from lighttree Node) stays empty
+        self.assertEqual(bucket.__dict__, {})
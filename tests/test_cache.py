@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+from unittest import TestCase
+
+from elasticsearch import Elasticsearch
+from mock import patch
+
+from pandagg.cache import cache_key, client_identity, MemoryCache, DiskCache
+
+
+class CacheTestCase(TestCase):
+    def test_cache_key(self):
+        self.assertEqual(
+            cache_key("search", ["b", "a"], {"query": {"x": 1}, "size": 0}),
+            cache_key("search", ["a", "b"], {"size": 0, "query": {"x": 1}}),
+        )
+        self.assertNotEqual(
+            cache_key("search", "a", {"size": 0}),
+            cache_key("count", "a", {"size": 0}),
+        )
+        self.assertNotEqual(
+            cache_key("search", "a", {"size": 0}),
+            cache_key("search", "a", {"size": 0}, params={"routing": "1"}),
+        )
+        self.assertNotEqual(
+            cache_key("search", "a", {"size": 0}, client=["localhost:9200"]),
+            cache_key("search", "a", {"size": 0}, client=["other:9200"]),
+        )
+
+    def test_client_identity(self):
+        self.assertEqual(
+            client_identity(Elasticsearch(["host1:9200", "host2:9200"])),
+            client_identity(Elasticsearch(["host2:9200", "host1:9200"])),
+        )
+        self.assertNotEqual(
+            client_identity(Elasticsearch(["host1:9200"])),
+            client_identity(Elasticsearch(["host2:9200"])),
+        )
+
+    def test_memory_cache_lru(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("k1", {"v": 1})
+        cache.set("k2", {"v": 2})
+        # k1 becomes most recently used
+        self.assertEqual(cache.get("k1"), {"v": 1})
+        cache.set("k3", {"v": 3})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("k2"))
+        self.assertIn("k1", cache)
+        self.assertIn("k3", cache)
+
+    def test_memory_cache_isolation(self):
+        cache = MemoryCache()
+        value = {"hits": {"hits": [{"_id": "1"}]}}
+        cache.set("k1", value)
+        value["hits"]["hits"].append({"_id": "2"})
+        cached = cache.get("k1")
+        cached["took"] = 3
+        # nested structures are shared with entry, and read-only
+        with self.assertRaises(TypeError):
+            cached["hits"]["hits"].append({"_id": "3"})
+        self.assertEqual(cache.get("k1"), {"hits": {"hits": [{"_id": "1"}]}})
+
+    def test_memory_cache_size(self):
+        cache = MemoryCache(max_size=30)
+        cache.set("k1", {"v": "a" * 10})
+        cache.set("k2", {"v": "b" * 10})
+        self.assertNotIn("k1", cache)
+        self.assertIn("k2", cache)
+        self.assertLessEqual(cache.size, 30)
+        # larger than cache
+        cache.set("k3", {"v": "c" * 100})
+        self.assertNotIn("k3", cache)
+        self.assertIn("k2", cache)
+
+    def test_memory_cache_ttl(self):
+        cache = MemoryCache(ttl=10)
+        with patch("pandagg.cache.time.time", return_value=100):
+            cache.set("k1", {"v": 1})
+        with patch("pandagg.cache.time.time", return_value=105):
+            self.assertEqual(cache.get("k1"), {"v": 1})
+        with patch("pandagg.cache.time.time", return_value=111):
+            self.assertIsNone(cache.get("k1"))
+        self.assertEqual(len(cache), 0)
+
+    def test_memory_cache_invalidate(self):
+        cache = MemoryCache()
+        cache.set("k1", {"v": 1}, index="logs-2020")
+        cache.set("k2", {"v": 2}, index=["logs-*"])
+        cache.set("k3", {"v": 3}, index="users")
+        cache.set("k4", {"v": 4}, index=None)
+
+        cache.invalidate(index="logs-2020")
+        self.assertEqual([k for k in ("k1", "k2", "k3", "k4") if k in cache], ["k3"])
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+    def test_disk_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = DiskCache(directory, ttl=10)
+            with patch("pandagg.cache.time.time", return_value=100):
+                cache.set("k1", {"v": 1}, index="logs")
+                cache.set("k2", {"v": 2}, index="users")
+            # shared between instances
+            other_cache = DiskCache(directory, ttl=10)
+            with patch("pandagg.cache.time.time", return_value=105):
+                self.assertEqual(other_cache.get("k1"), {"v": 1})
+                other_cache.invalidate(index="logs")
+                self.assertIsNone(cache.get("k1"))
+                self.assertEqual(cache.get("k2"), {"v": 2})
+            with patch("pandagg.cache.time.time", return_value=111):
+                self.assertIsNone(cache.get("k2"))
+        finally:
+            shutil.rmtree(directory)
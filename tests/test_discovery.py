@@ -25,24 +25,69 @@ indices_mock = {
 }
 
 
+aliases_mock = {
+    "classification_report_one": {"aliases": {}},
+    "classification_report_two": {"aliases": {"report": {}}},
+}
+
+
 class WrapperTestCase(TestCase):
     @patch.object(IndicesClient, "get")
-    def test_pandagg_wrapper(self, indice_get_mock):
+    @patch.object(IndicesClient, "get_alias")
+    def test_pandagg_wrapper(self, indice_get_alias_mock, indice_get_mock):
+        indice_get_alias_mock.return_value = aliases_mock
         indice_get_mock.return_value = indices_mock
 
         # fetch indices
         p = Elasticsearch()
         indices = discover(using=p, index="*report*")
-        indice_get_mock.assert_called_once_with(index="*report*")
+        indice_get_alias_mock.assert_called_once_with(index="*report*")
+        # mappings and settings aren't fetched yet
+        indice_get_mock.assert_not_called()
 
         # ensure indices presence
         self.assertTrue(hasattr(indices, "classification_report_one"))
+        self.assertTrue(hasattr(indices, "classification_report_two"))
         report_index = indices.classification_report_one
         self.assertIsInstance(report_index, Index)
         self.assertEqual(
             report_index.__str__(), "<Index 'classification_report_one'>",
         )
         self.assertEqual(report_index.name, "classification_report_one")
+        self.assertEqual(indices.classification_report_two.aliases, {"report": {}})
+        self.assertFalse(report_index.loaded)
 
-        # ensure mapping presence
+        # ensure mapping presence, fetched on first access only
         self.assertIsInstance(report_index.mapping, IMapping)
+        indice_get_mock.assert_called_once_with(index="classification_report_one")
+        self.assertEqual(report_index.settings, SETTINGS)
+        report_index.search()
+        indice_get_mock.assert_called_once()
+        self.assertFalse(indices.classification_report_two.loaded)
+
+    @patch.object(IndicesClient, "get")
+    @patch.object(IndicesClient, "get_alias")
+    def test_discover_prefetch(self, indice_get_alias_mock, indice_get_mock):
+        names = ["index_%d" % i for i in range(5)]
+        indice_get_alias_mock.return_value = {name: {"aliases": {}} for name in names}
+        indice_get_mock.side_effect = lambda index: {
+            name: {"aliases": {}, "mappings": MAPPING, "settings": SETTINGS}
+            for name in index.split(",")
+        }
+
+        indices = discover(
+            using=Elasticsearch(), prefetch=True, batch_size=2, max_concurrent=2
+        )
+        self.assertEqual(indice_get_mock.call_count, 3)
+        self.assertEqual(
+            sorted(
+                name
+                for call in indice_get_mock.call_args_list
+                for name in call[1]["index"].split(",")
+            ),
+            names,
+        )
+        for name in names:
+            self.assertTrue(indices[name].loaded)
+            self.assertIsInstance(indices[name].mapping, IMapping)
+        self.assertEqual(indice_get_mock.call_count, 3)
@@ -1,14 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from elasticsearch import Elasticsearch
+from mock import patch
 
+from pandagg.cache import MemoryCache
 from pandagg.search import Search
 from pandagg.tree.response import AggsResponseTree
 from pandagg.response import Response, Hits, Hit, Aggregations
 from pandagg.tree.aggs import Aggs
+from pandagg.tree.query import Query
+from pandagg.tree.mapping import Mapping
 
 import tests.testing_samples.data_sample as sample
 from pandagg.utils import ordered
@@ -65,6 +76,111 @@ class ResponseTestCase(TestCase):
             self.assertIsInstance(h, Hit)
         self.assertEqual(hits.__repr__(), "<Hits> total: 34, contains 2 hits")
 
+    def test_hits_lazy(self):
+        raw_hits = [
+            {"_index": "my_index_01", "_id": str(i), "_source": {"field_23": i}}
+            for i in range(3)
+        ]
+        hits = Hits(
+            {
+                "total": {"value": 3, "relation": "eq"},
+                "max_score": None,
+                "hits": raw_hits,
+            }
+        )
+        self.assertEqual(hits.ids(), ["0", "1", "2"])
+        self.assertEqual(hits.sources(), [{"field_23": i} for i in range(3)])
+        self.assertIsNone(hits._hits)
+
+        self.assertEqual(hits[1]._id, "1")
+        self.assertEqual([h._id for h in hits[1:]], ["1", "2"])
+        self.assertEqual([h._source for h in hits], hits.sources())
+        self.assertIsNone(hits._hits)
+
+        self.assertEqual([h._id for h in hits.hits], hits.ids())
+        self.assertIs(hits[0], hits.hits[0])
+        with self.assertRaises(AttributeError):
+            hits[0].other = 1
+
+    def test_hits_to_dataframe(self):
+        raw_hits = {
+            "total": {"value": 2, "relation": "eq"},
+            "max_score": 1.0,
+            "hits": [
+                {
+                    "_id": "1",
+                    "_source": {
+                        "classification_type": "multiclass",
+                        "global_metrics": {"dataset": {"nb_classes": 3}},
+                        "local_metrics": [
+                            {"field_class": {"id": 1, "name": "a"}},
+                            {"field_class": {"id": 2, "name": "b"}},
+                        ],
+                    },
+                },
+                {
+                    "_id": "2",
+                    "_source": {
+                        "classification_type": "multilabel",
+                        "local_metrics": [],
+                    },
+                },
+            ],
+        }
+        fields = [
+            "classification_type",
+            "global_metrics.dataset.nb_classes",
+            "local_metrics.field_class",
+        ]
+        hits = Hits(raw_hits, mapping=Mapping(MAPPING))
+
+        df = hits.to_dataframe(fields=fields)
+        self.assertEqual(df.index.name, "_id")
+        self.assertEqual(df.index.to_list(), ["1", "2"])
+        self.assertEqual(
+            df.columns.to_list(),
+            [
+                "classification_type",
+                "global_metrics.dataset.nb_classes",
+                "local_metrics.field_class.id",
+                "local_metrics.field_class.name",
+            ],
+        )
+        self.assertEqual(
+            str(df["global_metrics.dataset.nb_classes"].dtype), "Int64"
+        )
+        self.assertTrue(pd.isna(df.loc["2", "global_metrics.dataset.nb_classes"]))
+        self.assertEqual(df.loc["1", "local_metrics.field_class.name"], ["a", "b"])
+
+        df = hits.to_dataframe(fields=fields, explode_nested="local_metrics")
+        self.assertEqual(df.index.to_list(), ["1", "1", "2"])
+        self.assertEqual(
+            df["classification_type"].to_list(),
+            ["multiclass", "multiclass", "multilabel"],
+        )
+        self.assertEqual(str(df["local_metrics.field_class.id"].dtype), "Int64")
+        self.assertEqual(
+            df["local_metrics.field_class.name"].to_list()[:2], ["a", "b"]
+        )
+        with self.assertRaises(ValueError):
+            hits.to_dataframe(explode_nested="global_metrics")
+
+        # without mapping, columns are discovered from documents
+        df = Hits(raw_hits).to_dataframe(explode_nested="local_metrics")
+        self.assertEqual(
+            sorted(df.columns.to_list()),
+            [
+                "classification_type",
+                "global_metrics.dataset.nb_classes",
+                "local_metrics.field_class.id",
+                "local_metrics.field_class.name",
+            ],
+        )
+        self.assertEqual(len(df), 3)
+
+        table = hits.to_arrow(fields=["classification_type"])
+        self.assertEqual(table.column_names, ["classification_type", "_id"])
+
     def test_response(self):
         r = Response(
             {
@@ -251,3 +367,310 @@ class AggregationsResponseTestCase(TestCase):
                 {"avg_f1_micro": 0.93, "avg_nb_classes": 211.12, "doc_count": 198},
             ],
         )
+
+    def test_parse_composite_pages(self):
+        my_agg = (
+            Aggs()
+            .groupby(["classification_type", "global_metrics.field.name"])
+            .aggs({"avg_nb_classes": {"avg": {"field": "nb_classes"}}})
+            .as_composite(size=2)
+        )
+
+        def page(*rows):
+            buckets = [
+                {
+                    "key": {"classification_type": c, "global_metrics.field.name": f},
+                    "doc_count": doc_count,
+                    "avg_nb_classes": {"value": avg},
+                }
+                for c, f, doc_count, avg in rows
+            ]
+            raw = {"buckets": buckets}
+            if buckets:
+                raw["after_key"] = buckets[-1]["key"]
+            return {"composite": raw}
+
+        first_page = page(
+            ("multiclass", "gpc", 198, 211.12), ("multiclass", "kind", 370, 206.5)
+        )
+        next_pages = [
+            {"aggregations": page(("multilabel", "gpc", 119, 183.21))},
+            {"aggregations": page()},
+        ]
+        client = Elasticsearch()
+        with patch.object(client, "search", side_effect=next_pages) as search_mock:
+            df = Aggregations(
+                data=first_page,
+                aggs=my_agg,
+                index="my_index",
+                client=client,
+                query=Query({"term": {"some_field": 1}}),
+            ).serialize_as_dataframe()
+
+        self.assertEqual(search_mock.call_count, 2)
+        first_call_body = search_mock.call_args_list[0][1]["body"]
+        self.assertEqual(first_call_body["size"], 0)
+        self.assertEqual(
+            first_call_body["query"], {"term": {"some_field": {"value": 1}}}
+        )
+        self.assertEqual(
+            first_call_body["aggs"]["composite"]["composite"]["after"],
+            {"classification_type": "multiclass", "global_metrics.field.name": "kind"},
+        )
+        # aggregation clause is not modified in place
+        self.assertNotIn("after", my_agg.to_dict()["composite"]["composite"])
+
+        self.assertEqual(
+            list(df.index.names), ["classification_type", "global_metrics.field.name"]
+        )
+        self.assertEqual(
+            df.index.to_list(),
+            [("multiclass", "gpc"), ("multiclass", "kind"), ("multilabel", "gpc")],
+        )
+        self.assertEqual(df["doc_count"].to_list(), [198, 370, 119])
+        self.assertEqual(df["avg_nb_classes"].to_list(), [211.12, 206.5, 183.21])
+
+    def test_parse_composite_pages_from_search(self):
+        client = Elasticsearch()
+        cache = MemoryCache()
+        search = (
+            Search.from_dict({"post_filter": {"term": {"some_field": 1}}})
+            .using(client)
+            .params(request_cache=True)
+            .cache(cache)
+            .aggs(
+                {
+                    "composite": {
+                        "composite": {"sources": [{"a": {"terms": {"field": "a"}}}]}
+                    }
+                }
+            )
+        )
+
+        def response(*keys, **kwargs):
+            buckets = [{"key": {"a": k}, "doc_count": 1} for k in keys]
+            raw = {"buckets": buckets}
+            if buckets:
+                raw["after_key"] = kwargs.get("after_key", buckets[-1]["key"])
+            return {
+                "took": 1,
+                "timed_out": False,
+                "_shards": {},
+                "hits": {"total": {"value": 1}, "max_score": None, "hits": []},
+                "aggregations": {"composite": raw},
+            }
+
+        first_response = Response(response("x", "y"), search=search)
+        with patch.object(
+            client, "search", side_effect=[response("z"), response()]
+        ) as search_mock:
+            _, rows = first_response.aggregations.serialize_as_tabular()
+        self.assertEqual(
+            [key for key, _ in rows], [{"a": "x"}, {"a": "y"}, {"a": "z"}]
+        )
+        self.assertEqual(search_mock.call_count, 2)
+        body = search_mock.call_args_list[0][1]["body"]
+        self.assertEqual(body["size"], 0)
+        self.assertEqual(body["request_cache"], True)
+        self.assertEqual(body["post_filter"], {"term": {"some_field": {"value": 1}}})
+        self.assertEqual(body["aggs"]["composite"]["composite"]["after"], {"a": "y"})
+
+        # pages are served from search cache
+        cached_response = Response(response("x", "y"), search=search)
+        with patch.object(client, "search") as search_mock:
+            _, cached_rows = cached_response.aggregations.serialize_as_tabular()
+        search_mock.assert_not_called()
+        self.assertEqual(cached_rows, rows)
+
+        # pagination stops if after_key doesn't change
+        stuck_response = Response(response("x", "y"), search=search.cache(None))
+        with patch.object(
+            client, "search", side_effect=[response("z", after_key={"a": "y"})] * 3
+        ) as search_mock:
+            stuck_response.aggregations.serialize_as_tabular()
+        self.assertEqual(search_mock.call_count, 1)
+
+        # and after max_pages pages
+        capped_response = Response(response("x"), search=search.cache(None))
+        capped_response.aggregations.max_pages = 3
+        with patch.object(
+            client, "search", side_effect=[response(k) for k in "abcdef"]
+        ) as search_mock:
+            _, rows = capped_response.aggregations.serialize_as_tabular()
+        self.assertEqual(search_mock.call_count, 2)
+        self.assertEqual(len(rows), 3)
+
+    def test_parse_streamed(self):
+        search = Search().aggs(sample.EXPECTED_AGG_QUERY)
+        raw = json.dumps(
+            {
+                "took": 12,
+                "timed_out": False,
+                "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+                "aggregations": sample.ES_AGG_RESPONSE,
+                "hits": {"total": {"value": 1035}, "max_score": None, "hits": []},
+            }
+        )
+        response = Response(data=None, search=search, raw=raw)
+        self.assertEqual(response.took, 12)
+        self.assertTrue(response.success)
+        self.assertEqual(response.hits.total, {"value": 1035})
+        self.assertEqual(list(response.aggregations.keys()), ["classification_type"])
+        self.assertNotIn("aggregations", response.data)
+
+        aggregations = Aggregations(
+            data=sample.ES_AGG_RESPONSE,
+            aggs=search._aggs,
+            index=None,
+            client=None,
+            query=None,
+        )
+        for grouped_by in ("classification_type", "global_metrics.field.name"):
+            self.assertEqual(
+                response.aggregations.serialize_as_tabular(grouped_by=grouped_by),
+                aggregations.serialize_as_tabular(grouped_by=grouped_by),
+            )
+        self.assertEqual(
+            response.aggregations.serialize_as_dataframe().to_dict(),
+            aggregations.serialize_as_dataframe().to_dict(),
+        )
+
+        # aggregations are materialized on demand
+        self.assertEqual(response.aggregations.data, sample.ES_AGG_RESPONSE)
+
+    def test_parse_streamed_key_after_sub_aggs(self):
+        my_agg = Aggs(
+            {
+                "by_type": {
+                    "filters": {"filters": {"a": {"term": {"t": 1}}}},
+                    "aggs": {
+                        "by_range": {
+                            "range": {"field": "v", "ranges": [{"to": 5}, {"from": 5}]},
+                            "aggs": {"by_user": {"terms": {"field": "user"}}},
+                        }
+                    },
+                }
+            }
+        )
+        raw_response = {
+            "by_type": {
+                "buckets": {
+                    "a": {
+                        "by_range": {
+                            "buckets": [
+                                {
+                                    "by_user": {
+                                        "buckets": [{"doc_count": 2, "key": "bob"}]
+                                    },
+                                    "to": 5.0,
+                                    "doc_count": 2,
+                                },
+                                {
+                                    "from": 5.0,
+                                    "doc_count": 1,
+                                    "by_user": {
+                                        "buckets": [{"key": "alice", "doc_count": 1}]
+                                    },
+                                },
+                            ]
+                        },
+                        "doc_count": 3,
+                    }
+                }
+            }
+        }
+        index_names, index_values = Aggregations(
+            data=None,
+            aggs=my_agg,
+            index=None,
+            client=None,
+            query=None,
+            raw=json.dumps({"aggregations": raw_response}).encode("utf-8"),
+        ).serialize_as_tabular(row_as_tuple=True)
+        self.assertEqual(index_names, ["by_type", "by_range", "by_user"])
+        self.assertEqual(
+            index_values,
+            [
+                (("a", "*-5.0", "bob"), {"doc_count": 2}),
+                (("a", "5.0-*", "alice"), {"doc_count": 1}),
+            ],
+        )
+
+    def test_parse_as_dataframe_expanded_columns(self):
+        my_agg = Aggs().groupby("classification_type").aggs("field_type")
+        raw_response = {
+            "classification_type": {
+                "buckets": [
+                    {
+                        "key": "multiclass",
+                        "doc_count": 439,
+                        "field_type": {
+                            "buckets": [
+                                {"key": "text", "doc_count": 400},
+                                {"key": "keyword", "doc_count": 39},
+                            ]
+                        },
+                    },
+                    {
+                        "key": "multilabel",
+                        "doc_count": 433,
+                        "field_type": {"buckets": [{"key": "date", "doc_count": 433}]},
+                    },
+                ]
+            }
+        }
+        df = Aggregations(
+            data=raw_response, aggs=my_agg, index=None, client=None, query=None,
+        ).serialize_as_dataframe(grouped_by="classification_type")
+        self.assertEqual(list(df.index.names), ["classification_type"])
+        self.assertEqual(df.index.to_list(), [("multiclass",), ("multilabel",)])
+        self.assertEqual(
+            list(df.columns),
+            ["doc_count", "field_type|text", "field_type|keyword", "field_type|date"],
+        )
+        self.assertEqual(df["doc_count"].to_list(), [439, 433])
+        self.assertEqual(df["field_type|text"].to_list()[0], 400)
+        self.assertTrue(pd.isna(df["field_type|text"].to_list()[1]))
+        self.assertTrue(pd.isna(df["field_type|date"].to_list()[0]))
+        self.assertEqual(df["field_type|date"].to_list()[1], 433)
+
+    def test_parse_as_arrow(self):
+        my_agg = Aggs(sample.EXPECTED_AGG_QUERY, mapping=MAPPING)
+        aggregations = Aggregations(
+            data=sample.ES_AGG_RESPONSE,
+            aggs=my_agg,
+            index=None,
+            client=None,
+            query=None,
+        )
+        table = aggregations.serialize(output="arrow")
+        self.assertIsInstance(table, pa.Table)
+        self.assertEqual(
+            table.column_names[:3],
+            ["classification_type", "global_metrics.field.name", "doc_count"],
+        )
+        # metrics columns order follows aggregation children order, which is not guaranteed
+        self.assertEqual(
+            set(table.column_names[3:]), {"avg_f1_micro", "avg_nb_classes"}
+        )
+        self.assertTrue(pa.types.is_dictionary(table.schema.field(0).type))
+        self.assertTrue(pa.types.is_integer(table.schema.field("doc_count").type))
+        self.assertTrue(pa.types.is_floating(table.schema.field("avg_f1_micro").type))
+        self.assertEqual(
+            table.column("global_metrics.field.name").to_pylist(),
+            ["ispracticecompatible", "gpc", "preservationmethods", "kind", "gpc"],
+        )
+        self.assertEqual(
+            table.column("doc_count").to_pylist(), [128, 119, 76, 370, 198]
+        )
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "aggs.parquet")
+            aggregations.to_parquet(path)
+            self.assertEqual(
+                pq.read_table(path).column("doc_count").to_pylist(),
+                [128, 119, 76, 370, 198],
+            )
+        finally:
+            shutil.rmtree(tmp_dir)
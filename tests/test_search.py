@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import time
+from unittest import TestCase
+
+from elasticsearch import ConnectionError, Elasticsearch, TransportError
+from mock import AsyncMock, patch
+
+from pandagg.cache import MemoryCache
+from pandagg.connections import Connections
+from pandagg.response import Response
+from pandagg.search import Search, MultiSearch
+from pandagg.tracing import SlowQueryLogger, collect_traces, hooks
+
+RAW_RESPONSE = {
+    "took": 3,
+    "timed_out": False,
+    "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+    "hits": {
+        "total": {"value": 1, "relation": "eq"},
+        "max_score": 1.0,
+        "hits": [
+            {
+                "_index": "my_index",
+                "_type": "_doc",
+                "_id": "1",
+                "_score": 1.0,
+                "_source": {"user": "kimchy"},
+            }
+        ],
+    },
+}
+
+
+class SearchTestCase(TestCase):
+    @patch("pandagg.search.scan")
+    def test_scan(self, scan_mock):
+        scan_mock.return_value = iter(RAW_RESPONSE["hits"]["hits"])
+        s = Search(using=Elasticsearch(), index="my_index")
+        self.assertEqual(list(s.scan()), RAW_RESPONSE["hits"]["hits"])
+        scan_mock.assert_called_once()
+
+    @patch("pandagg.search.scan")
+    def test_sliced_scan(self, scan_mock):
+        def fake_scan(client, query, index):
+            slice_id = query["slice"]["id"]
+            for i in range(50):
+                yield {"_id": "%d-%d" % (slice_id, i)}
+
+        scan_mock.side_effect = fake_scan
+        s = Search(using=Elasticsearch(), index="my_index").filter(
+            "term", user="kimchy"
+        )
+        hits = list(s.scan(slices=4, workers=2, buffer_size=5))
+
+        self.assertEqual(len(hits), 200)
+        self.assertEqual(
+            {h["_id"] for h in hits},
+            {"%d-%d" % (slice_id, i) for slice_id in range(4) for i in range(50)},
+        )
+        self.assertEqual(scan_mock.call_count, 4)
+        for call in scan_mock.call_args_list:
+            query = call[1]["query"]
+            self.assertEqual(query["slice"]["max"], 4)
+            self.assertEqual(query["query"], s.to_dict()["query"])
+
+    @patch("pandagg.search.scan")
+    def test_sliced_scan_error(self, scan_mock):
+        def fake_scan(client, query, index):
+            yield {"_id": "1"}
+            if query["slice"]["id"] == 1:
+                raise ValueError("slice failure")
+
+        scan_mock.side_effect = fake_scan
+        s = Search(using=Elasticsearch(), index="my_index")
+        with self.assertRaises(ValueError):
+            list(s.scan(slices=2))
+
+    @patch("pandagg.search.scan")
+    def test_sliced_scan_early_stop(self, scan_mock):
+        def fake_scan(client, query, index):
+            for i in range(10000):
+                yield {"_id": i}
+
+        scan_mock.side_effect = fake_scan
+        s = Search(using=Elasticsearch(), index="my_index")
+        hits = s.scan(slices=3, buffer_size=2)
+        self.assertEqual(len([next(hits) for _ in range(5)]), 5)
+        hits.close()
+
+        # pending slices don't open scroll contexts once consumer stopped
+        scan_mock.reset_mock()
+        hits = s.scan(slices=6, workers=1, buffer_size=2)
+        next(hits)
+        hits.close()
+        time.sleep(0.3)
+        self.assertEqual(scan_mock.call_count, 1)
+
+    def test_execute_stream(self):
+        client = Elasticsearch()
+        raw_response = dict(
+            RAW_RESPONSE,
+            aggregations={
+                "user": {
+                    "buckets": [
+                        {"key": "kimchy", "doc_count": 1},
+                        {"key": "bob", "doc_count": 3},
+                    ]
+                }
+            },
+        )
+        s = Search(using=client, index=["my_index", "other"]).groupby("user")
+        headers = {"x-elastic-product": "Elasticsearch"}
+        info = {"version": {"number": "7.17.0", "build_flavor": "default"}}
+        connection = client.transport.get_connection()
+        with patch.object(
+            client.transport, "get_connection", return_value=connection
+        ), patch.object(
+            connection,
+            "perform_request",
+            side_effect=[
+                (200, headers, json.dumps(info)),
+                ConnectionError("N/A", "connection refused", None),
+                (200, headers, json.dumps(raw_response)),
+                (200, headers, json.dumps(raw_response)),
+            ],
+        ) as request_mock:
+            response = s.execute(stream=True)
+            # other requests of the client are still decoded
+            self.assertEqual(s.execute().took, 3)
+
+        # product check, then search request retried by transport
+        self.assertEqual(request_mock.call_count, 4)
+        method, path, params, body = request_mock.call_args_list[2][0]
+        self.assertEqual((method, path), ("POST", "/my_index,other/_search"))
+        # undecoded response option isn't sent to cluster
+        self.assertEqual(params, {})
+        self.assertEqual(json.loads(body), s.to_dict())
+        self.assertEqual(response.took, 3)
+        self.assertEqual(len(response.hits), 1)
+        self.assertEqual(
+            response.aggregations.serialize_as_tabular(row_as_tuple=True),
+            (
+                ["user"],
+                [(("kimchy",), {"doc_count": 1}), (("bob",), {"doc_count": 3})],
+            ),
+        )
+
+    def test_execute_cache(self):
+        client = Elasticsearch()
+        cache = MemoryCache()
+        s = Search(using=client, index="my_index").cache(cache)
+        with patch.object(
+            client, "search", return_value=RAW_RESPONSE
+        ) as search_mock, patch.object(
+            client, "count", return_value={"count": 42}
+        ) as count_mock:
+            for _ in range(3):
+                self.assertEqual(s.filter("term", user="kimchy").execute().took, 3)
+                self.assertEqual(s.count(), 42)
+            self.assertEqual(search_mock.call_count, 1)
+            self.assertEqual(count_mock.call_count, 1)
+
+            # different body
+            s.filter("term", user="bob").execute()
+            self.assertEqual(search_mock.call_count, 2)
+
+            cache.invalidate(index="my_index")
+            s.filter("term", user="kimchy").execute()
+            self.assertEqual(search_mock.call_count, 3)
+
+            # cache disabled
+            s.cache(None).filter("term", user="kimchy").execute()
+            self.assertEqual(search_mock.call_count, 4)
+
+        # other cluster
+        other_client = Elasticsearch(["other:9200"])
+        with patch.object(
+            other_client, "search", return_value=RAW_RESPONSE
+        ) as search_mock:
+            s.using(other_client).filter("term", user="kimchy").execute()
+            self.assertEqual(search_mock.call_count, 1)
+
+    def _paginated_client(self, total):
+        client = Elasticsearch()
+        docs = [{"_id": str(i), "sort": [i]} for i in range(total)]
+
+        def fake_search(body):
+            start = body["search_after"][0] + 1 if "search_after" in body else 0
+            return {
+                "pit_id": "pit-%d" % start,
+                "hits": {"hits": docs[start : start + body["size"]]},
+            }
+
+        return client, docs, fake_search
+
+    def test_iterate(self):
+        client, docs, fake_search = self._paginated_client(total=25)
+        s = Search(using=client, index="my_index").sort("-date").filter(
+            "term", user="kimchy"
+        )
+        with patch.object(
+            client, "open_point_in_time", return_value={"id": "pit-init"}
+        ) as open_mock, patch.object(
+            client, "close_point_in_time"
+        ) as close_mock, patch.object(
+            client, "search", side_effect=fake_search
+        ) as search_mock:
+            for prefetch in (True, False):
+                search_mock.reset_mock()
+                hits = list(s.iterate(page_size=10, prefetch=prefetch))
+                self.assertEqual(hits, docs)
+                self.assertEqual(search_mock.call_count, 3)
+                first_body = search_mock.call_args_list[0][1]["body"]
+                self.assertEqual(
+                    first_body["sort"],
+                    [{"date": {"order": "desc"}}, {"_shard_doc": "asc"}],
+                )
+                self.assertEqual(
+                    first_body["pit"], {"id": "pit-init", "keep_alive": "1m"}
+                )
+                self.assertNotIn("search_after", first_body)
+                last_body = search_mock.call_args_list[2][1]["body"]
+                self.assertEqual(last_body["search_after"], [19])
+                self.assertEqual(last_body["pit"]["id"], "pit-10")
+
+            open_mock.assert_called_with(index=["my_index"], keep_alive="1m")
+            close_mock.assert_called_with(body={"id": "pit-20"})
+
+    def test_iterate_early_stop(self):
+        client, docs, fake_search = self._paginated_client(total=100)
+        s = Search(using=client, index="my_index")
+        with patch.object(
+            client, "open_point_in_time", return_value={"id": "pit-init"}
+        ), patch.object(client, "close_point_in_time") as close_mock, patch.object(
+            client, "search", side_effect=fake_search
+        ):
+            hits = s.iterate(page_size=10)
+            self.assertEqual([next(hits) for _ in range(3)], docs[:3])
+            hits.close()
+            close_mock.assert_called_once_with(body={"id": "pit-0"})
+
+
+class MultiSearchTestCase(TestCase):
+    def test_execute(self):
+        client = Elasticsearch()
+        searches = [
+            Search(index="my_index")
+            .filter("term", user="user_%d" % i)
+            .groupby("user")
+            for i in range(5)
+        ]
+        ms = MultiSearch(using=client)
+        for s in searches:
+            ms = ms.add(s)
+
+        def fake_msearch(index, body):
+            # one response per search, its took being the searched user number
+            responses = []
+            for query in body[1::2]:
+                user = query["query"]["bool"]["filter"][0]["term"]["user"]["value"]
+                responses.append(
+                    dict(
+                        RAW_RESPONSE,
+                        took=int(user[len("user_") :]),
+                        aggregations={"user": {"buckets": []}},
+                    )
+                )
+            return {"responses": responses}
+
+        with patch.object(
+            client, "msearch", side_effect=fake_msearch
+        ) as msearch_mock:
+            responses = ms.execute(batch_size=2, max_concurrent=2)
+            self.assertEqual(msearch_mock.call_count, 3)
+            self.assertEqual(
+                sorted(len(call[1]["body"]) for call in msearch_mock.call_args_list),
+                [2, 4, 4],
+            )
+            self.assertEqual([r.took for r in responses], list(range(5)))
+            for response in responses:
+                self.assertIsInstance(response, Response)
+                self.assertEqual(list(response.aggregations.keys()), ["user"])
+
+            msearch_mock.reset_mock()
+            self.assertEqual(len(ms.execute()), 5)
+            msearch_mock.assert_called_once()
+
+    def test_execute_error(self):
+        client = Elasticsearch()
+        ms = MultiSearch(using=client).add(Search()).add(Search())
+        error = {"error": {"type": "index_not_found_exception"}, "status": 404}
+        with patch.object(
+            client, "msearch", return_value={"responses": [RAW_RESPONSE, error]}
+        ):
+            with self.assertRaises(TransportError):
+                ms.execute()
+            responses = ms.execute(raise_on_error=False)
+        self.assertIsInstance(responses[0], Response)
+        self.assertIsNone(responses[1])
+
+
+class AsyncSearchTestCase(TestCase):
+    def test_execute_async(self):
+        client = AsyncMock()
+        client.search.return_value = RAW_RESPONSE
+        s = Search(using=client, index="my_index").filter("term", user="kimchy")
+
+        response = asyncio.run(s.execute_async())
+        self.assertIsInstance(response, Response)
+        self.assertEqual(response.took, 3)
+        client.search.assert_awaited_once_with(index=["my_index"], body=s.to_dict())
+
+    def test_async_traces(self):
+        client = AsyncMock()
+        client.search.return_value = RAW_RESPONSE
+        client.count.return_value = {"count": 42}
+        client.msearch.return_value = {"responses": [RAW_RESPONSE]}
+        s = Search(using=client, index="my_index")
+        slow_query_logger = SlowQueryLogger(round_trip=0)
+
+        with collect_traces() as traces, patch.object(
+            slow_query_logger, "logger"
+        ) as logger_mock:
+            hooks.register(slow_query_logger)
+            try:
+                response = asyncio.run(s.execute_async())
+                asyncio.run(s.count_async())
+                asyncio.run(MultiSearch(using=client).add(s).execute_async())
+            finally:
+                hooks.unregister(slow_query_logger)
+
+        self.assertEqual(
+            [(t.operation, t.counts) for t in traces],
+            [
+                ("search", {"hits": 1}),
+                ("count", {"hits": 42}),
+                ("msearch", {"hits": 1}),
+            ],
+        )
+        self.assertIs(traces[0], response.trace)
+        self.assertEqual(response.trace.took, 3)
+        for trace in traces:
+            self.assertIn("transport", trace.durations)
+        # slow query logger sees every execution
+        self.assertEqual(logger_mock.log.call_count, 3)
+
+    def test_count_async(self):
+        client = AsyncMock()
+        client.count.return_value = {"count": 42}
+        s = Search(using=client, index="my_index").filter("term", user="kimchy")
+
+        self.assertEqual(asyncio.run(s.count_async()), 42)
+        client.count.assert_awaited_once_with(
+            index=["my_index"], body=s.to_dict(count=True)
+        )
+
+    def test_scan_async(self):
+        async def fake_async_scan(client, query, index):
+            for hit in RAW_RESPONSE["hits"]["hits"]:
+                yield hit
+
+        async def consume(s):
+            return [hit async for hit in s.scan_async()]
+
+        s = Search(using=AsyncMock(), index="my_index")
+        with patch("elasticsearch.helpers.async_scan", fake_async_scan):
+            hits = asyncio.run(consume(s))
+        self.assertEqual(hits, RAW_RESPONSE["hits"]["hits"])
+
+    def test_multisearch_execute_async(self):
+        client = AsyncMock()
+        client.msearch.return_value = {"responses": [RAW_RESPONSE]}
+        ms = MultiSearch(using=client).add(Search(index="my_index"))
+
+        responses = asyncio.run(ms.execute_async())
+        self.assertEqual(len(responses), 1)
+        self.assertIsInstance(responses[0], Response)
+        self.assertEqual(responses[0].took, 3)
+        client.msearch.assert_awaited_once_with(index=None, body=ms.to_dict())
+
+        error = {"error": {"type": "index_not_found_exception"}}
+        results = [{"responses": [RAW_RESPONSE]}, {"responses": [error]}]
+        client.msearch.reset_mock()
+        client.msearch.side_effect = results
+        ms = ms.add(Search(index="absent"))
+        responses = asyncio.run(
+            ms.execute_async(batch_size=1, max_concurrent=1, raise_on_error=False)
+        )
+        self.assertEqual(client.msearch.await_count, 2)
+        self.assertIsInstance(responses[0], Response)
+        self.assertIsNone(responses[1])
+
+        client.msearch.side_effect = results
+        with self.assertRaises(TransportError):
+            asyncio.run(ms.execute_async(batch_size=1))
+
+    def test_connections_client_class(self):
+        class FakeClient(object):
+            def __init__(self, **kwargs):
+                self.kwargs = kwargs
+
+        connections = Connections(elasticsearch_class=FakeClient)
+        connections.configure(default={"hosts": ["localhost"]})
+        conn = connections.get_connection()
+        self.assertIsInstance(conn, FakeClient)
+        self.assertEqual(conn.kwargs, {"hosts": ["localhost"]})
+
+        missing = Connections(elasticsearch_class=None)
+        with self.assertRaises(ImportError):
+            missing.create_connection(hosts=["localhost"])
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pandagg.response import Aggregations
+from pandagg.synthetic import AggsResponseGenerator, generate_aggs_response
+from pandagg.tree.aggs import Aggs
+
+from tests.testing_samples.data_sample import EXPECTED_AGG_QUERY
+from tests.testing_samples.mapping_example import MAPPING
+
+
+class SyntheticTestCase(TestCase):
+    def test_generate_terms_response(self):
+        aggs = Aggs(EXPECTED_AGG_QUERY, mapping=MAPPING)
+        data = generate_aggs_response(
+            aggs,
+            cardinality={"classification_type": 3, "global_metrics.field.name": 4},
+            seed=0,
+        )
+        # reproducible
+        self.assertEqual(
+            data,
+            generate_aggs_response(
+                aggs,
+                cardinality={"classification_type": 3, "global_metrics.field.name": 4},
+                seed=0,
+            ),
+        )
+        buckets = data["classification_type"]["buckets"]
+        self.assertEqual(len(buckets), 3)
+        self.assertEqual(
+            [b["doc_count"] for b in buckets],
+            sorted((b["doc_count"] for b in buckets), reverse=True),
+        )
+        for bucket in buckets:
+            sub_buckets = bucket["global_metrics.field.name"]["buckets"]
+            self.assertEqual(len(sub_buckets), 4)
+            self.assertLessEqual(
+                sum(b["doc_count"] for b in sub_buckets), bucket["doc_count"]
+            )
+            self.assertIn("value", sub_buckets[0]["avg_f1_micro"])
+
+        index_names, rows = Aggregations(
+            data=data, aggs=aggs, query=None, index=None, client=None
+        ).serialize_as_tabular()
+        self.assertEqual(
+            index_names, ["classification_type", "global_metrics.field.name"]
+        )
+        self.assertEqual(len(rows), 12)
+
+    def test_generate_typed_buckets(self):
+        aggs = Aggs(
+            {
+                "global": {
+                    "global": {},
+                    "aggs": {
+                        "week": {
+                            "date_histogram": {
+                                "field": "date",
+                                "calendar_interval": "week",
+                            },
+                            "aggs": {
+                                "nb_classes": {
+                                    "range": {
+                                        "field": "global_metrics.dataset.nb_classes",
+                                        "ranges": [{"to": 10}, {"from": 10}],
+                                    },
+                                    "aggs": {
+                                        "stats_f1": {
+                                            "stats": {
+                                                "field": "global_metrics.performance.test.micro.f1_score"
+                                            }
+                                        }
+                                    },
+                                }
+                            },
+                        },
+                        "nb_tests": {
+                            "histogram": {
+                                "field": "global_metrics.dataset.nb_classes",
+                                "interval": 5,
+                            }
+                        },
+                    },
+                }
+            },
+            mapping=MAPPING,
+        )
+        data = generate_aggs_response(aggs, cardinality=2, seed=0)
+        week_buckets = data["global"]["week"]["buckets"]
+        self.assertEqual(len(week_buckets), 2)
+        self.assertEqual(week_buckets[0]["key_as_string"], "2020-01-01T00:00:00.000Z")
+        self.assertEqual(
+            week_buckets[1]["key"] - week_buckets[0]["key"], 7 * 24 * 3600 * 1000
+        )
+        range_buckets = week_buckets[0]["nb_classes"]["buckets"]
+        self.assertEqual([b["key"] for b in range_buckets], ["*-10", "10-*"])
+        stats = range_buckets[0]["stats_f1"]
+        self.assertEqual(stats["count"], range_buckets[0]["doc_count"])
+        self.assertLessEqual(stats["min"], stats["avg"])
+        self.assertLessEqual(stats["avg"], stats["max"])
+        self.assertEqual(
+            [b["key"] for b in data["global"]["nb_tests"]["buckets"]], [0.0, 5.0]
+        )
+
+        index_names, rows = Aggregations(
+            data=data, aggs=aggs, query=None, index=None, client=None
+        ).serialize_as_tabular(grouped_by="nb_classes")
+        self.assertEqual(index_names, ["week", "nb_classes"])
+        self.assertEqual(len(rows), 4)
+
+    def test_generate_composite_pages(self):
+        def page(after=None):
+            composite = {
+                "sources": [
+                    {"type": {"terms": {"field": "classification_type"}}},
+                    {
+                        "classes": {
+                            "terms": {"field": "global_metrics.dataset.nb_classes"}
+                        }
+                    },
+                ],
+                "size": 4,
+            }
+            if after is not None:
+                composite["after"] = after
+            aggs = Aggs({"by_type": {"composite": composite}}, mapping=MAPPING)
+            return generate_aggs_response(aggs, cardinality=10, seed=0)["by_type"]
+
+        keys = []
+        response = page()
+        while response["buckets"]:
+            keys.extend(b["key"] for b in response["buckets"])
+            self.assertEqual(response["after_key"], keys[-1])
+            response = page(after=response["after_key"])
+        # last page is empty, without after_key
+        self.assertNotIn("after_key", response)
+        self.assertEqual(len(keys), 10)
+        self.assertEqual(keys[0], {"type": "type_0", "classes": 0})
+        self.assertEqual(keys[-1], {"type": "type_9", "classes": 9})
+
+    def test_write(self):
+        aggs = Aggs(EXPECTED_AGG_QUERY, mapping=MAPPING)
+        generator = AggsResponseGenerator(aggs, cardinality=5, seed=1)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "response.json")
+            generator.write(path)
+            with open(path) as f:
+                response = json.load(f)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(response["hits"]["total"]["value"], generator.doc_count)
+        self.assertEqual(response["aggregations"], generator.generate())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import time
+from unittest import TestCase
+
+from elasticsearch import Elasticsearch, NotFoundError
+
+from pandagg.discovery import discover
+from pandagg.search import MultiSearch, Search
+from pandagg.testing import InMemoryCluster
+from pandagg.tracing import collect_traces
+
+MAPPING = {
+    "properties": {
+        "genre": {"type": "keyword"},
+        "year": {"type": "integer"},
+        "title": {"type": "text"},
+    }
+}
+
+
+class InMemoryClusterTestCase(TestCase):
+    def setUp(self):
+        self.cluster = InMemoryCluster()
+        self.cluster.create_index("movies", mapping=MAPPING, aliases=["films"])
+        self.cluster.index_documents(
+            "movies",
+            [
+                {
+                    "genre": ["Drama", "Comedy"][i % 2],
+                    "year": 1990 + i % 30,
+                    "title": "movie %d" % i,
+                }
+                for i in range(100)
+            ],
+        )
+        self.client = self.cluster.client()
+        self.search = Search(using=self.client, index="movies", mapping=MAPPING)
+
+    def test_search(self):
+        response = (
+            self.search.filter("term", genre="Drama")
+            .filter("range", year={"gte": 2010})
+            .sort("-year")
+            .size(3)
+            .execute()
+        )
+        self.assertEqual(response.hits.total, {"value": 15, "relation": "eq"})
+        self.assertEqual([h._source["year"] for h in response.hits], [2018] * 3)
+        self.assertEqual(
+            self.search.query("match", title="movie 3").count(), self.search.count()
+        )
+        self.assertEqual(
+            self.search.query(
+                "bool",
+                should=[{"ids": {"values": ["1", "2"]}}],
+                must_not=[{"ids": {"values": ["2"]}}],
+            ).count(),
+            1,
+        )
+
+        with self.assertRaises(NotFoundError):
+            Search(using=self.client, index="absent").execute()
+        self.assertEqual(Search(using=self.client, index="abs*").count(), 0)
+
+    def test_aggregations(self):
+        response = self.search.groupby("genre").execute()
+        index_names, rows = response.aggregations.serialize_as_tabular()
+        self.assertEqual(index_names, ["genre"])
+        self.assertEqual(len(rows), 10)
+        self.assertLessEqual(sum(row["doc_count"] for _, row in rows), 100)
+
+        streamed = self.search.groupby("genre").execute(stream=True)
+        self.assertEqual(
+            streamed.aggregations.serialize_as_tabular(), (index_names, rows)
+        )
+
+    def test_composite_pages(self):
+        search = self.search.groupby("genre").as_composite(size=3).size(0)
+        # serialized clauses are read-only
+        body = copy.deepcopy(search.to_dict())
+        keys = []
+        while True:
+            response = self.client.search(index="movies", body=body)
+            agg_response = response["aggregations"]["composite"]
+            if not agg_response["buckets"]:
+                break
+            keys.extend(b["key"]["genre"] for b in agg_response["buckets"])
+            self.assertLessEqual(len(agg_response["buckets"]), 3)
+            body["aggs"]["composite"]["composite"]["after"] = agg_response["after_key"]
+        # paging ends with an empty page, without after_key
+        self.assertNotIn("after_key", agg_response)
+        self.assertEqual(keys, ["genre_%d" % i for i in range(10)])
+
+        # all pages are fetched on serialization
+        with collect_traces() as traces:
+            _, rows = search.execute().aggregations.serialize_as_tabular()
+        self.assertEqual([key for key, _ in rows], [{"genre": k} for k in keys])
+        self.assertEqual(len(traces), 5)
+
+    def test_scan(self):
+        self.assertEqual(
+            len(list(self.search.filter("term", genre="Comedy").scan())), 50
+        )
+        ids = [hit["_id"] for hit in self.search.scan(slices=3)]
+        self.assertEqual(sorted(ids, key=int), ["%d" % i for i in range(100)])
+        # scroll contexts are cleared
+        self.assertEqual(self.cluster._scrolls, {})
+
+    def test_multisearch(self):
+        responses = (
+            MultiSearch(using=self.client)
+            .add(self.search.filter("term", genre="Drama"))
+            .add(Search(using=self.client, index="films"))
+            .add(Search(using=self.client, index="absent"))
+            .execute(raise_on_error=False)
+        )
+        self.assertEqual(responses[0].hits.total["value"], 50)
+        self.assertEqual(responses[1].hits.total["value"], 100)
+        self.assertIsNone(responses[2])
+
+    def test_mapping(self):
+        self.assertEqual(
+            self.client.indices.get_mapping(index="films"),
+            {"movies": {"mappings": MAPPING}},
+        )
+        indices = discover(self.client, "mov*")
+        self.assertFalse(indices.movies.loaded)
+        self.assertEqual(indices.movies.aliases, {"films": {}})
+        self.assertIn("genre", indices.movies.mapping)
+
+    def test_latency(self):
+        client = self.cluster.client(latency=0.05)
+        start = time.time()
+        Search(using=client, index="movies").count()
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+    def test_serve(self):
+        server = self.cluster.serve()
+        try:
+            client = Elasticsearch([server.url])
+            search = Search(using=client, index="films")
+            self.assertEqual(search.filter("term", genre="Drama").count(), 50)
+            self.assertEqual(len(list(search.scan())), 100)
+        finally:
+            server.shutdown()
+            server.server_close()
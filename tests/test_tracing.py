@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import sys
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from pandagg.cache import MemoryCache
+from pandagg.search import MultiSearch, Search
+from pandagg.testing import InMemoryCluster
+from pandagg.tracing import (
+    UNDECODED_RESPONSE_PARAM,
+    ExecutionTrace,
+    OpenTelemetryHook,
+    SlowQueryLogger,
+    collect_traces,
+    current_trace,
+    enable_slow_query_log,
+    hooks,
+    instrument_client,
+    tracing,
+    UndecodedBody,
+)
+from pandagg.utils import canonical_dumps, fingerprint
+
+
+class TracingTestCase(TestCase):
+    def setUp(self):
+        cluster = InMemoryCluster()
+        cluster.index_documents(
+            "movies", [{"genre": "genre_%d" % (i % 3)} for i in range(30)]
+        )
+        self.search = Search(using=cluster.client(), index="movies")
+
+    def tearDown(self):
+        hooks.clear()
+
+    def test_nested_phases(self):
+        trace = ExecutionTrace()
+        with trace.phase("transport"):
+            with trace.phase("decode"):
+                pass
+        self.assertEqual(list(trace.durations), ["decode", "transport"])
+        self.assertEqual([s[0] for s in trace.spans], ["decode", "transport"])
+        transport_span = trace.spans[1]
+        self.assertAlmostEqual(
+            trace.duration, transport_span[2] - transport_span[1], places=3
+        )
+
+        self.assertIsNone(current_trace())
+        with tracing(trace):
+            self.assertIs(current_trace(), trace)
+        self.assertIsNone(current_trace())
+
+    def test_execute_trace(self):
+        response = self.search.size(5).groupby("genre").execute()
+        trace = response.trace
+        self.assertEqual(
+            set(trace.durations),
+            {"to_dict", "encode", "transport", "decode", "response"},
+        )
+        self.assertGreater(trace.sizes["request_body"], 0)
+        self.assertGreater(trace.sizes["response_body"], 0)
+        self.assertEqual(trace.counts, {"hits": 5})
+        self.assertFalse(trace.cached)
+
+        response.aggregations.serialize(output="dict_rows")
+        self.assertIn("serialize_as_tabular", trace.durations)
+        self.assertEqual(trace.counts["buckets"], 10)
+
+        streamed = self.search.groupby("genre").execute(stream=True)
+        self.assertEqual(
+            set(streamed.trace.durations),
+            {"to_dict", "encode", "transport", "response"},
+        )
+        self.assertGreater(streamed.trace.sizes["response_body"], 0)
+
+    def test_undecoded_response(self):
+        client = instrument_client(self.search._using)
+        body = {"size": 0}
+        undecoded = client.search(
+            index="movies", body=body, params={UNDECODED_RESPONSE_PARAM: True}
+        )
+        self.assertIsInstance(undecoded, UndecodedBody)
+        self.assertEqual(json.loads(undecoded.raw)["hits"]["total"]["value"], 30)
+        # decoded on access, as bodies read by transport itself
+        self.assertEqual(undecoded["hits"]["total"]["value"], 30)
+        decoded = client.search(index="movies", body=body)
+        self.assertEqual(decoded["hits"]["total"]["value"], 30)
+
+    def test_cached_execute_trace(self):
+        search = self.search.cache(MemoryCache())
+        response = search.execute()
+        self.assertFalse(response.trace.cached)
+        self.assertIsNotNone(response.overhead_ms)
+        response = search.execute()
+        trace = response.trace
+        self.assertTrue(trace.cached)
+        # cache lookup isn't counted as transport
+        self.assertEqual(set(trace.durations), {"to_dict", "cache", "response"})
+        self.assertIsNone(response.overhead_ms)
+
+    def test_count_and_multisearch_traces(self):
+        with collect_traces() as traces:
+            self.assertEqual(self.search.count(), 30)
+            ms = MultiSearch(using=self.search._using).add(self.search.size(2))
+            ms.add(self.search.size(3)).execute()
+            ms.add(self.search.size(3)).execute(batch_size=1)
+
+        self.assertEqual([t.operation for t in traces], ["count", "msearch", "msearch"])
+        count_trace, msearch_trace, concurrent_trace = traces
+        self.assertEqual(
+            set(count_trace.durations),
+            {"to_dict", "encode", "transport", "decode"},
+        )
+        self.assertEqual(count_trace.counts, {"hits": 30})
+        self.assertEqual(
+            set(msearch_trace.durations),
+            {"to_dict", "encode", "transport", "decode", "response"},
+        )
+        self.assertEqual(msearch_trace.counts, {"hits": 5})
+        self.assertEqual(len(msearch_trace.body), 4)
+        # batches run in other threads
+        self.assertEqual(
+            set(concurrent_trace.durations), {"to_dict", "transport", "response"}
+        )
+
+    def test_hooks(self):
+        events = []
+        failing_hook = MagicMock(side_effect=ValueError())
+        hooks.register(lambda event, trace: events.append((event, trace)))
+        hooks.register(failing_hook)
+        self.assertEqual(len(hooks), 2)
+
+        with collect_traces() as traces:
+            response = self.search.groupby("genre").execute()
+            response.aggregations.serialize_as_tabular()
+        self.search.execute()
+
+        self.assertEqual(traces, [response.trace])
+        self.assertEqual(
+            events[:2], [("execute", response.trace), ("serialize", response.trace)]
+        )
+        self.assertEqual(len(events), 3)
+        # hooks errors don't break executions
+        self.assertEqual(failing_hook.call_count, 3)
+
+        hooks.unregister(failing_hook)
+        self.assertEqual(len(hooks), 1)
+
+    def test_opentelemetry_hook(self):
+        with patch.dict(sys.modules, {"opentelemetry": None}):
+            with self.assertRaises(ImportError):
+                OpenTelemetryHook()
+
+        otel = MagicMock()
+        tracer = MagicMock()
+        with patch.dict(sys.modules, {"opentelemetry": otel}):
+            hook = OpenTelemetryHook(tracer=tracer)
+        hooks.register(hook)
+        response = self.search.execute()
+
+        parent_call = tracer.start_span.call_args_list[0]
+        self.assertEqual(parent_call[0], ("pandagg.execute",))
+        self.assertEqual(parent_call[1]["attributes"]["pandagg.index"], "movies")
+        self.assertEqual(
+            [c[0][0] for c in tracer.start_span.call_args_list[1:]],
+            [name for name, _, _ in response.trace.spans],
+        )
+        otel.trace.set_span_in_context.assert_called_once_with(
+            tracer.start_span.return_value
+        )
+
+    def test_response_timings(self):
+        response = self.search.groupby("genre").execute()
+        self.assertEqual(response.trace.took, response.took)
+        self.assertGreater(response.round_trip_ms, 0)
+        self.assertLessEqual(response.decode_ms, response.round_trip_ms)
+        self.assertEqual(response.overhead_ms, response.round_trip_ms - response.took)
+        self.assertEqual(response.serialization_ms, 0)
+        response.aggregations.serialize_as_tabular()
+        self.assertGreater(response.serialization_ms, 0)
+
+    def test_slow_query_log(self):
+        logger = MagicMock()
+        logger.isEnabledFor.return_value = True
+        slow_log = enable_slow_query_log(round_trip=0, logger=logger)
+        self.assertIn(slow_log, hooks._hooks)
+
+        search = self.search.groupby("genre")
+        search.execute()
+        logger.log.assert_called_once()
+        args = logger.log.call_args[0]
+        self.assertEqual(args[0], logging.WARNING)
+        self.assertEqual(args[2:5], ("search", "movies", "round_trip"))
+        self.assertEqual(args[5], fingerprint(search.to_dict()))
+        self.assertEqual(args[-1], canonical_dumps(search.to_dict()))
+        self.assertIn("pandagg_trace", logger.log.call_args[1]["extra"])
+
+        trace = ExecutionTrace()
+        trace.took = 50
+        with trace.phase("transport"):
+            pass
+        self.assertEqual(
+            SlowQueryLogger(took=10, overhead=10, round_trip=100).exceeded(
+                "execute", trace
+            ),
+            ["took"],
+        )
+        trace.cached = True
+        self.assertEqual(SlowQueryLogger(took=10).exceeded("execute", trace), [])
+        self.assertEqual(
+            SlowQueryLogger(took=10, serialization=0).exceeded("serialize", trace),
+            [],
+        )
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from unittest import TestCase
-from pandagg.utils import equal_queries
+from pandagg.utils import equal_queries, fingerprint
 
 
 class UtilsTestCase(TestCase):
@@ -14,3 +14,10 @@ class UtilsTestCase(TestCase):
         }
         self.assertTrue(equal_queries(q1, q2))
         self.assertFalse(equal_queries(q1, non_equal_q))
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint({"a": 1, "b": [1, {"c": 2, "d": 3}]}),
+            fingerprint({"b": [1, {"d": 3, "c": 2}], "a": 1}),
+        )
+        self.assertNotEqual(fingerprint({"a": [1, 2]}), fingerprint({"a": [2, 1]}))
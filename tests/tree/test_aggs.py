@@ -5,6 +5,8 @@
 #                                   IMPORTS
 # =============================================================================
 
+import copy
+from itertools import count
 from unittest import TestCase
 from lighttree.exceptions import MultipleRootError, NotFoundNodeError
 from mock import patch
@@ -28,7 +30,7 @@ def to_id_set(nodes):
 
 class AggTestCase(TestCase):
     def setUp(self):
-        patcher = patch("uuid.uuid4", side_effect=range(1000))
+        patcher = patch("pandagg.node._node._ids", count())
         patcher.start()
         self.addCleanup(patcher.stop)
 
@@ -983,3 +985,202 @@ class AggTestCase(TestCase):
         )
         agg2 = Aggs(node_hierarchy_2, mapping=MAPPING)
         self.assertEqual(agg2.deepest_linear_bucket_agg, "week")
+
+    def test_as_composite(self):
+        agg = (
+            Aggs(mapping=MAPPING)
+            .groupby(
+                [
+                    Terms("classification_type", field="classification_type", size=5),
+                    DateHistogram("week", field="date", interval="1w"),
+                ]
+            )
+            .aggs(Avg("avg_nb_classes", field="global_metrics.dataset.nb_classes"))
+        )
+        composite_agg = agg.as_composite(size=100)
+        self.assertEqual(
+            composite_agg.to_dict(),
+            {
+                "composite": {
+                    "composite": {
+                        "sources": [
+                            {
+                                "classification_type": {
+                                    "terms": {"field": "classification_type"}
+                                }
+                            },
+                            {
+                                "week": {
+                                    "date_histogram": {
+                                        "field": "date",
+                                        "interval": "1w",
+                                    }
+                                }
+                            },
+                        ],
+                        "size": 100,
+                    },
+                    "aggs": {
+                        "avg_nb_classes": {
+                            "avg": {"field": "global_metrics.dataset.nb_classes"}
+                        }
+                    },
+                }
+            },
+        )
+        # initial aggregation is not modified
+        self.assertIn("classification_type", agg)
+
+        # not possible on non-compatible bucket aggregations
+        with self.assertRaises(ValueError):
+            Aggs(
+                Filter("some_filter", filter={"term": {"some_field": 1}})
+            ).as_composite()
+
+    def test_fingerprint(self):
+        agg = Aggs(
+            {
+                "classification_type": {
+                    "terms": {"field": "classification_type"},
+                    "aggs": {
+                        "avg_f1": {"avg": {"field": "f1_score"}},
+                        "avg_nb_classes": {"avg": {"field": "nb_classes"}},
+                    },
+                }
+            }
+        )
+        same_agg = (
+            Aggs()
+            .groupby(
+                {"classification_type": {"terms": {"field": "classification_type"}}}
+            )
+            .aggs({"avg_nb_classes": {"avg": {"field": "nb_classes"}}})
+            .aggs(
+                {"avg_f1": {"avg": {"field": "f1_score"}}},
+                insert_below="classification_type",
+            )
+        )
+        self.assertEqual(agg.normalized(), agg.to_dict())
+        self.assertEqual(agg.fingerprint(), same_agg.fingerprint())
+
+        other_agg = agg.aggs(
+            {"max_f1": {"max": {"field": "f1_score"}}},
+            insert_below="classification_type",
+        )
+        self.assertNotEqual(agg.fingerprint(), other_agg.fingerprint())
+        self.assertEqual(agg.fingerprint(), Aggs(agg.to_dict()).fingerprint())
+
+    def test_to_dict_memoized(self):
+        agg = Aggs(
+            {
+                "week": {
+                    "date_histogram": {"field": "date", "interval": "1w"},
+                    "aggs": {
+                        "nested_below_week": {
+                            "nested": {"path": "local_metrics"},
+                            "aggs": {
+                                "local_metrics.field_class.name": {
+                                    "terms": {
+                                        "field": "local_metrics.field_class.name",
+                                        "size": 10,
+                                    }
+                                }
+                            },
+                        },
+                        "avg_nb_classes": {
+                            "avg": {"field": "global_metrics.dataset.nb_classes"}
+                        },
+                    },
+                }
+            }
+        )
+        expected = agg.to_dict()
+        with patch.object(Aggs, "_to_dict", wraps=agg._to_dict) as to_dict_mock:
+            self.assertEqual(agg.to_dict(), expected)
+            to_dict_mock.assert_not_called()
+
+        new_agg = agg.aggs(
+            {
+                "max_nb_classes": {
+                    "max": {"field": "global_metrics.dataset.nb_classes"}
+                }
+            },
+            insert_below="nested_below_week",
+        )
+        with patch.object(Aggs, "_to_dict", wraps=new_agg._to_dict) as to_dict_mock:
+            serialized = new_agg.to_dict()
+        # only inserted node and its ancestors are serialized again
+        self.assertEqual(
+            {c[0][0] for c in to_dict_mock.call_args_list},
+            {"max_nb_classes", "nested_below_week", "week"},
+        )
+        nested_aggs = serialized["week"]["aggs"]["nested_below_week"]["aggs"]
+        self.assertEqual(
+            nested_aggs["max_nb_classes"],
+            {"max": {"field": "global_metrics.dataset.nb_classes"}},
+        )
+        # initial aggregation is not modified
+        self.assertEqual(agg.to_dict(), expected)
+
+    def test_to_dict_read_only(self):
+        agg = Aggs(
+            {
+                "user": {
+                    "terms": {"field": "user"},
+                    "aggs": {"avg_age": {"avg": {"field": "age"}}},
+                }
+            }
+        )
+        expected = {
+            "user": {
+                "terms": {"field": "user"},
+                "aggs": {"avg_age": {"avg": {"field": "age"}}},
+            }
+        }
+        serialized = agg.to_dict()
+        # top-level dict is a fresh one
+        serialized["other"] = {}
+        # nested structures are shared with memoized serialization
+        with self.assertRaises(TypeError):
+            serialized["user"]["terms"]["field"] = "other"
+        with self.assertRaises(TypeError):
+            serialized["user"]["aggs"].clear()
+        self.assertEqual(agg.to_dict(), expected)
+        self.assertEqual(agg.normalized(), expected)
+
+        # copies are regular dicts
+        copied = copy.deepcopy(serialized)
+        copied["user"]["terms"]["field"] = "other"
+        self.assertEqual(agg.clone().to_dict(), expected)
+
+    def test_parse_plan(self):
+        agg = Aggs(
+            {
+                "week": {
+                    "date_histogram": {"field": "date", "interval": "1w"},
+                    "aggs": {
+                        "avg_nb_classes": {
+                            "avg": {"field": "global_metrics.dataset.nb_classes"}
+                        }
+                    },
+                }
+            }
+        )
+        plan = agg.parse_plan()
+        self.assertEqual(set(plan.keys()), {"week", "avg_nb_classes"})
+        week, week_children, _, _ = plan["week"]
+        self.assertIsInstance(week, DateHistogram)
+        self.assertEqual([c.name for c in week_children], ["avg_nb_classes"])
+        self.assertEqual(plan["avg_nb_classes"][1], ())
+        # memoized
+        self.assertIs(agg.parse_plan(), plan)
+
+        new_agg = agg.aggs(
+            {"min_nb_classes": {"min": {"field": "global_metrics.dataset.nb_classes"}}},
+            insert_below="week",
+        )
+        self.assertEqual(
+            {c.name for c in new_agg.parse_plan()["week"][1]},
+            {"avg_nb_classes", "min_nb_classes"},
+        )
+        self.assertIs(agg.parse_plan(), plan)
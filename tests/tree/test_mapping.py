@@ -1,14 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from itertools import count
 from unittest import TestCase
 
+from lighttree.exceptions import NotFoundNodeError
 from mock import patch
 
 from pandagg.exceptions import AbsentMappingFieldError
 from pandagg.node.mapping.abstract import Field
 from pandagg.node.mapping.field_datatypes import Keyword, Object, Text, Nested, Integer
-from pandagg.tree.mapping import Mapping
+from pandagg.tree.mapping import Mapping, MappingRegistry
 from tests.testing_samples.mapping_example import MAPPING, EXPECTED_MAPPING_TREE_REPR
 
 
@@ -117,9 +119,9 @@ _
             ["local_metrics"],
         )
 
-    @patch("uuid.uuid4")
-    def test_resolve_path_to_id(self, uuid_mock):
-        uuid_mock.side_effect = range(100)
+    @patch("pandagg.node._node._PROCESS_TOKEN", "token")
+    @patch("pandagg.node._node._ids", count())
+    def test_resolve_path_to_id(self):
         mapping_tree = Mapping(MAPPING)
         # do not resolve
         self.assertEqual(
@@ -129,13 +131,30 @@ _
         # resolve
         self.assertEqual(
             mapping_tree.resolve_path_to_id("classification_type"),
-            "classification_type0",
+            "classification_type.token.0",
         )
         self.assertEqual(
             mapping_tree.resolve_path_to_id("local_metrics.dataset.support_test"),
-            "support_test23",
+            "support_test.token.23",
         )
 
+    def test_resolve_path_to_id_collision(self):
+        # field names never resolve to another field node, whatever its identifier
+        mapping_tree = Mapping(
+            {
+                "properties": {
+                    "user": {"type": "keyword"},
+                    "user2": {"type": "integer"},
+                    "user0": {"type": "integer"},
+                }
+            }
+        )
+        for field in ("user", "user2", "user0"):
+            self.assertEqual(mapping_tree.get(field).name, field)
+        self.assertEqual(mapping_tree.mapping_type_of_field("user0"), "integer")
+        node = mapping_tree.get("user")
+        self.assertIs(mapping_tree.get(node.identifier), node)
+
     def test_mapping_type_of_field(self):
         mapping_tree = Mapping(MAPPING)
         with self.assertRaises(AbsentMappingFieldError):
@@ -162,3 +181,67 @@ _
             mapping_tree.node_path(node.identifier),
             "local_metrics.dataset.support_test",
         )
+        with self.assertRaises(NotFoundNodeError):
+            mapping_tree.node_path("local_metrics.dataset.support_test")
+        with self.assertRaises(NotFoundNodeError):
+            mapping_tree.node_path("absent")
+
+        # fields absent from path index are resolved by walking the tree
+        with patch.object(Mapping, "_path_index", return_value={}), patch.object(
+            Mapping, "_node_paths", return_value={}
+        ):
+            self.assertEqual(
+                mapping_tree.node_path(node.identifier),
+                "local_metrics.dataset.support_test",
+            )
+            self.assertEqual(
+                mapping_tree.list_nesteds_at_field(node.identifier), ["local_metrics"]
+            )
+
+    def test_path_index_invalidation(self):
+        mapping_tree = Mapping(MAPPING)
+        with self.assertRaises(NotFoundNodeError):
+            mapping_tree.list_nesteds_at_field("local_metrics.new_field")
+
+        # index is rebuilt once mapping is modified
+        local_metrics_id = mapping_tree.resolve_path_to_id("local_metrics")
+        mapping_tree.insert_node(Keyword("new_field"), parent_id=local_metrics_id)
+        self.assertEqual(
+            mapping_tree.list_nesteds_at_field("local_metrics.new_field"),
+            ["local_metrics"],
+        )
+        new_field = mapping_tree.get("local_metrics.new_field")
+        self.assertEqual(new_field.name, "new_field")
+        self.assertEqual(
+            mapping_tree.node_path(new_field.identifier), "local_metrics.new_field"
+        )
+
+    def test_mapping_registry(self):
+        registry = MappingRegistry()
+        mapping = registry.get(MAPPING, index="my_index")
+        self.assertTrue(mapping.frozen)
+        # shared, neither parsed again nor cloned
+        self.assertIs(registry.get(MAPPING, index="my_index"), mapping)
+        self.assertIs(mapping.clone(), mapping)
+        self.assertIs(registry.get(mapping), mapping)
+        with self.assertRaises(ValueError):
+            mapping.insert_node(Keyword("new_field"), parent_id=mapping.root)
+        deep_clone = mapping.clone(deep=True)
+        self.assertFalse(deep_clone.frozen)
+        deep_clone.insert_node(Keyword("new_field"), parent_id=deep_clone.root)
+
+        # other index
+        self.assertIsNot(registry.get(MAPPING, index="other_index"), mapping)
+        self.assertEqual(len(registry), 2)
+
+        # updated mapping
+        updated_mapping = dict(MAPPING, dynamic=True)
+        updated = registry.get(updated_mapping, index="my_index")
+        self.assertIsNot(updated, mapping)
+        self.assertIs(registry.get(updated_mapping, index="my_index"), updated)
+        self.assertEqual(len(registry), 2)
+
+        registry.refresh(index="my_index")
+        self.assertIsNot(registry.get(updated_mapping, index="my_index"), updated)
+        registry.refresh()
+        self.assertEqual(len(registry), 0)
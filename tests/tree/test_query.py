@@ -3,6 +3,10 @@
 
 from __future__ import unicode_literals
 
+import copy
+import pickle
+from itertools import count
+
 from mock import patch
 
 from pandagg.node.query._parameter_clause import Filter, Must
@@ -18,7 +22,7 @@ from pandagg.utils import equal_queries, ordered
 
 class QueryTestCase(TestCase):
     def setUp(self):
-        patcher = patch("uuid.uuid4", side_effect=range(1000))
+        patcher = patch("pandagg.node._node._ids", count())
         patcher.start()
         self.addCleanup(patcher.stop)
 
@@ -1153,3 +1157,175 @@ bool
                 },
             )
         )
+
+    def test_fingerprint(self):
+        q1 = Query(
+            {
+                "bool": {
+                    "filter": [
+                        {"term": {"user": "bob"}},
+                        {"bool": {"filter": [{"range": {"rank": {"gte": 7}}}]}},
+                    ],
+                    "boost": 1,
+                }
+            }
+        )
+        q2 = Query(
+            {
+                "bool": {
+                    "filter": [
+                        {"range": {"rank": {"gte": 7}}},
+                        {"term": {"user": {"value": "bob", "boost": 1}}},
+                        {"term": {"user": "bob"}},
+                    ]
+                }
+            }
+        )
+        self.assertEqual(
+            q1.normalized(),
+            {
+                "bool": {
+                    "filter": [
+                        {"range": {"rank": {"gte": 7}}},
+                        {"term": {"user": {"value": "bob"}}},
+                    ]
+                }
+            },
+        )
+        self.assertEqual(q1.fingerprint(), q2.fingerprint())
+
+        # single must clause is equivalent to clause itself
+        self.assertEqual(
+            Query({"bool": {"must": [{"term": {"user": "bob"}}]}}).fingerprint(),
+            Query({"term": {"user": "bob"}}).fingerprint(),
+        )
+        # scoring clauses are not deduplicated
+        self.assertNotEqual(
+            Query(
+                {"bool": {"should": [{"term": {"a": 1}}, {"term": {"a": 1}}]}}
+            ).fingerprint(),
+            Query({"bool": {"should": [{"term": {"a": 1}}]}}).fingerprint(),
+        )
+        self.assertNotEqual(
+            q1.fingerprint(), q1.filter("term", user="alice").fingerprint()
+        )
+        self.assertEqual(Query().fingerprint(), Query().fingerprint())
+
+    def test_fingerprint_boost_field(self):
+        # default boost is only stripped from clauses parameters, not from fields named "boost"
+        self.assertEqual(
+            Query({"term": {"boost": {"value": 1, "boost": 1}}}).normalized(),
+            {"term": {"boost": {"value": 1}}},
+        )
+        self.assertNotEqual(
+            Query({"term": {"boost": 1}}).fingerprint(),
+            Query({"term": {"boost": 2}}).fingerprint(),
+        )
+        self.assertEqual(
+            Query(
+                {"percolate": {"field": "query", "document": {"boost": 1}, "boost": 1}}
+            ).normalized(),
+            {"percolate": {"field": "query", "document": {"boost": 1}}},
+        )
+
+    def test_fingerprint_memoized(self):
+        q = Query({"bool": {"filter": [{"term": {"a": 1}}, {"term": {"b": 2}}]}})
+        fingerprint = q.fingerprint()
+        with patch.object(Query, "_normalize") as normalize_mock:
+            self.assertEqual(q.fingerprint(), fingerprint)
+            normalize_mock.assert_not_called()
+
+        # in-place modification invalidates memoized computations
+        term_b = next(
+            n.identifier
+            for n in q.list()
+            if n.KEY == "term" and n.serialize()["term"].get("b")
+        )
+        q.drop_node(term_b)
+        self.assertEqual(
+            q.normalized(), {"bool": {"filter": [{"term": {"a": {"value": 1}}}]}}
+        )
+        self.assertNotEqual(q.fingerprint(), fingerprint)
+
+    def test_to_dict_read_only(self):
+        q = Query({"bool": {"filter": [{"term": {"user": "kimchy"}}]}})
+        expected = {"bool": {"filter": [{"term": {"user": {"value": "kimchy"}}}]}}
+        serialized = q.to_dict()
+        # nested structures are shared with memoized serialization
+        with self.assertRaises(TypeError):
+            serialized["bool"]["filter"].append({"term": {"user": "bob"}})
+        with self.assertRaises(TypeError):
+            serialized["bool"]["filter"][0]["term"]["user"] = "bob"
+        with self.assertRaises(TypeError):
+            q.normalized()["bool"]["filter"].pop()
+        self.assertEqual(q.to_dict(), expected)
+
+        # copies are regular dicts
+        copied = copy.deepcopy(serialized)
+        copied["bool"]["filter"].append({"term": {"user": "bob"}})
+        self.assertEqual(q.clone().to_dict(), expected)
+        self.assertEqual(pickle.loads(pickle.dumps(serialized)), expected)
+
+    def test_copy_on_write_clone(self):
+        q = Query({"bool": {"filter": [{"term": {"a": 1}}]}})
+        q_clone = q.clone()
+        # structures are shared until modification
+        self.assertIs(q._nodes_map, q_clone._nodes_map)
+
+        q2 = q.filter("term", b=2)
+        q3 = q.filter("term", c=3)
+        self.assertEqual(
+            q.to_dict(), {"bool": {"filter": [{"term": {"a": {"value": 1}}}]}}
+        )
+        self.assertTrue(
+            equal_queries(
+                q2.to_dict(),
+                {
+                    "bool": {
+                        "filter": [
+                            {"term": {"a": {"value": 1}}},
+                            {"term": {"b": {"value": 2}}},
+                        ]
+                    }
+                },
+            )
+        )
+        self.assertTrue(
+            equal_queries(
+                q3.to_dict(),
+                {
+                    "bool": {
+                        "filter": [
+                            {"term": {"a": {"value": 1}}},
+                            {"term": {"c": {"value": 3}}},
+                        ]
+                    }
+                },
+            )
+        )
+
+        # in-place modification of clone doesn't impact original
+        term_a = next(n.identifier for n in q_clone.list() if n.KEY == "term")
+        q_clone.drop_node(term_a)
+        self.assertIsNot(q._nodes_map, q_clone._nodes_map)
+        self.assertIn(term_a, q)
+        self.assertEqual(q_clone.to_dict(), None)
+
+    def test_copy_on_write_memo(self):
+        q = Query({"bool": {"filter": [{"term": {"a": 1}}]}})
+        serialized = q.to_dict()
+        q_clone = q.clone()
+        # memoized computations are shared until memoization or modification
+        self.assertIs(q._memo, q_clone._memo)
+        self.assertEqual(q_clone.to_dict(), serialized)
+        self.assertIs(q._memo, q_clone._memo)
+
+        q_clone.normalized()
+        self.assertIsNot(q._memo, q_clone._memo)
+        self.assertNotIn("normalized", q._memo)
+
+        q_clone = q.clone()
+        term_a = next(n.identifier for n in q_clone.list() if n.KEY == "term")
+        q_clone.drop_node(term_a)
+        self.assertEqual(q_clone.to_dict(), None)
+        self.assertEqual(q.to_dict(), serialized)
@@ -1,9 +1,10 @@
+from itertools import count
 from collections import OrderedDict
 from unittest import TestCase
 from mock import Mock, patch
 
 from pandagg.tree.aggs import Aggs
-from pandagg.tree.response import AggsResponseTree
+from pandagg.tree.response import AggsResponseTree, ColumnarAggsResponseTree
 from pandagg.interactive.response import IResponse
 from pandagg.utils import equal_queries
 from tests.testing_samples.mapping_example import MAPPING
@@ -11,9 +12,8 @@ import tests.testing_samples.data_sample as sample
 
 
 class ResponseTestCase(TestCase):
-    @patch("uuid.uuid4")
-    def test_response_tree(self, uuid_mock):
-        uuid_mock.side_effect = range(1000)
+    @patch("pandagg.node._node._ids", count())
+    def test_response_tree(self):
         my_agg = Aggs(sample.EXPECTED_AGG_QUERY, mapping=MAPPING)
         response_tree = AggsResponseTree(aggs=my_agg, index=None).parse(
             sample.ES_AGG_RESPONSE
@@ -42,9 +42,8 @@ class ResponseTestCase(TestCase):
 
 
 class ClientBoundResponseTestCase(TestCase):
-    @patch("lighttree.node.uuid.uuid4")
-    def test_client_bound_response(self, uuid_mock):
-        uuid_mock.side_effect = range(1000)
+    @patch("pandagg.node._node._ids", count())
+    def test_client_bound_response(self):
         client_mock = Mock(spec=["search"])
 
         my_agg = Aggs(sample.EXPECTED_AGG_QUERY, mapping=MAPPING)
@@ -88,3 +87,34 @@ class ClientBoundResponseTestCase(TestCase):
                 },
             )
         )
+
+    def test_columnar_response_tree(self):
+        my_agg = Aggs(sample.EXPECTED_AGG_QUERY, mapping=MAPPING)
+        tree = AggsResponseTree(aggs=my_agg, index=None).parse(sample.ES_AGG_RESPONSE)
+        columnar_tree = ColumnarAggsResponseTree(aggs=my_agg, index=None).parse(
+            sample.ES_AGG_RESPONSE
+        )
+        self.assertEqual(len(columnar_tree), 18)
+        self.assertEqual(columnar_tree.show(), tree.show())
+        self.assertEqual(columnar_tree.show(limit=5), tree.show(limit=5))
+
+        for bucket in tree.list():
+            columnar_bucket = next(
+                b
+                for b in map(columnar_tree.get, range(len(columnar_tree)))
+                if (b.level, b.key, b.value) == (bucket.level, bucket.key, bucket.value)
+            )
+            self.assertEqual(
+                columnar_tree.bucket_properties(columnar_bucket),
+                tree.bucket_properties(bucket),
+            )
+            self.assertEqual(
+                columnar_tree.bucket_properties(columnar_bucket, depth=1),
+                tree.bucket_properties(bucket, depth=1),
+            )
+            self.assertTrue(
+                equal_queries(
+                    columnar_tree.get_bucket_filter(columnar_bucket.identifier),
+                    tree.get_bucket_filter(bucket.identifier),
+                )
+            )